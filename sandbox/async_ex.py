@@ -5,7 +5,8 @@ from kivy.properties import ObjectProperty
 from kivy.uix.progressbar import ProgressBar
 
 import threading
-from src.image_hashing import async_open_and_hash
+from src import image_table
+from src.image_hashing import async_open_and_hashes
 from multiprocessing import Pool
 from imutils import paths
 
@@ -41,13 +42,14 @@ class ExampleApp(App):
 
     def do_100_things(self):
         # loop over our image paths and make hashes
-        with Pool(processes=4) as pool:
-            multiple_results = [pool.apply_async(async_open_and_hash, (image_path, 16)) 
-                                for image_path in self.image_paths]
+        with Pool(processes=4, initializer=image_table.init_worker, initargs=(self.image_paths,)) as pool:
+            multiple_results = [pool.apply_async(async_open_and_hashes, (image_id, 16))
+                                for image_id in range(len(self.image_paths))]
             for res in multiple_results:
                 result = res.get()
                 if result is not None:
-                    h,image_path = result
+                    hashes, image_id, _, _ = result
+                    h, image_path = hashes[0], self.image_paths[image_id]
                     # grab all image paths with that hash, add the current image
                     # path to it, and store the list back in the hashes dictionary
                     p = self.hashes.get(h, [])
@@ -0,0 +1,129 @@
+import numpy as np
+
+
+def ratio_bands(ratios, tolerance=0.05):
+    """
+    Assigns each image ratio to a band, bands are ``tolerance`` wide in relative terms so any two ratios within a
+    factor of (1 + tolerance) of each other are in the same or adjacent bands
+
+    Args:
+        ratios: array of width / height ratios
+        tolerance: relative width of a band
+
+    Returns:
+        int64 array of the band of each ratio
+    """
+    if tolerance <= 0:
+        raise ValueError("Ratio tolerance must be greater than 0")
+    return np.floor(np.log(np.asarray(ratios, dtype=np.float64)) / np.log1p(tolerance)).astype(np.int64)
+
+
+def size_bands(sizes):
+    """
+    Assigns each file size to its order of magnitude
+
+    Args:
+        sizes: array of file sizes in bytes
+
+    Returns:
+        int64 array of floor(log10(size))
+    """
+    return np.floor(np.log10(np.maximum(np.asarray(sizes, dtype=np.float64), 1))).astype(np.int64)
+
+
+class Blocking:
+    """
+    Partitions images into blocks by ratio band (and optionally file size order of magnitude) so similarity only
+    has to be computed within a block and between neighbouring blocks instead of between every pair of images.
+
+    Usage:
+    >>> blocking = Blocking(ratios=[1.5, 1.5, 0.66, 1.52])
+    >>> [(rows.tolist(), other) for rows, other in blocking.block_pairs()]
+    [([2], None), ([0, 1, 3], None)]
+    """
+    def __init__(self, ratios, tolerance=0.05, overlap=1, sizes=None, size_overlap=1):
+        """
+
+        Args:
+            ratios: array of width / height ratios, one per row
+            tolerance: relative width of a ratio band
+            overlap: number of neighbouring ratio bands on each side a block is compared with
+            sizes: array of file sizes in bytes, one per row, None to not block by size
+            size_overlap: number of neighbouring orders of magnitude on each side a block is compared with
+        """
+        if overlap < 0 or size_overlap < 0:
+            raise ValueError("Block overlap cannot be negative")
+
+        self.overlap = overlap
+        self.size_overlap = size_overlap if sizes is not None else 0
+        self.num_rows = len(ratios)
+
+        bands = ratio_bands(ratios, tolerance)
+        magnitudes = size_bands(sizes) if sizes is not None else np.zeros_like(bands)
+
+        # Group the rows of each (ratio band, size magnitude) key together
+        keys = np.stack([bands, magnitudes], axis=1).reshape(-1, 2)
+        unique_keys, block_of_row = np.unique(keys, axis=0, return_inverse=True)
+        block_of_row = block_of_row.ravel()
+        order = np.argsort(block_of_row, kind='stable')
+        offsets = np.searchsorted(block_of_row[order], np.arange(len(unique_keys) + 1))
+
+        self.keys = [tuple(int(value) for value in key) for key in unique_keys]
+        self._block_index = {key: i for i, key in enumerate(self.keys)}
+        self.block_of_row = block_of_row
+        self.blocks = [order[offsets[i]:offsets[i + 1]] for i in range(len(unique_keys))]
+
+    def _neighbours(self, block):
+        """
+        Returns: the indices of the blocks after ``block`` which it has to be compared with
+        """
+        band, magnitude = self.keys[block]
+
+        neighbours = []
+        for band_offset in range(-self.overlap, self.overlap + 1):
+            for magnitude_offset in range(-self.size_overlap, self.size_overlap + 1):
+                other = self._block_index.get((band + band_offset, magnitude + magnitude_offset))
+                if other is not None and other > block:
+                    neighbours.append(other)
+        return sorted(neighbours)
+
+    def block_pairs(self):
+        """
+        Yields the row sets which have to be compared, each pair of compared rows is in exactly one of them
+
+        Yields:
+            (rows, None) to compare the pairs within rows or (rows, other_rows) to compare rows against other_rows
+        """
+        for block, rows in enumerate(self.blocks):
+            yield rows, None
+            for other in self._neighbours(block):
+                yield rows, self.blocks[other]
+
+    def num_pairs(self):
+        """
+        Returns: the number of pairs compared when comparing every row set from block_pairs
+        """
+        total = 0
+        for rows, other_rows in self.block_pairs():
+            total += len(rows) * (len(rows) - 1) // 2 if other_rows is None else len(rows) * len(other_rows)
+        return total
+
+    def skipped_fraction(self):
+        """
+        Returns: the fraction of all pairs of rows which blocking skips comparing
+        """
+        all_pairs = self.num_rows * (self.num_rows - 1) // 2
+        if all_pairs == 0:
+            return 0
+        return 1 - self.num_pairs() / all_pairs
+
+    def comparable_mask(self):
+        """
+        Returns: (num_rows, num_rows) boolean matrix, True where the two rows are compared
+        """
+        mask = np.zeros((self.num_rows, self.num_rows), dtype=bool)
+        for rows, other_rows in self.block_pairs():
+            other_rows = rows if other_rows is None else other_rows
+            mask[np.ix_(rows, other_rows)] = True
+            mask[np.ix_(other_rows, rows)] = True
+        return mask
@@ -4,7 +4,7 @@ import platform
 import functools
 import time
 import cv2
-from python_algorithms.basic.union_find import UF
+import numpy as np
 
 from kivy.properties import ObjectProperty, ListProperty, AliasProperty, StringProperty, NumericProperty
 from kivy.event import EventDispatcher
@@ -13,8 +13,16 @@ from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.relativelayout import RelativeLayout
 from kivy.clock import Clock
 from kivy.factory import Factory
-from src import image_hashing, image_gradient, running_average
+from kivy.logger import Logger
+from src import image_hashing, image_gradient, image_hog, image_table, running_average, hash_grouping
 from src.stoppable_pool import StoppablePool
+from src.feature_store import FeatureStore
+from src.blocking import Blocking
+from src.union_find import UnionFind
+from src.hash_grouping import HashGrouper
+
+ALL_PAIRS_GROUP_SIZE = 16  # Largest hash group whose pairs are all verified, larger ones use representatives
+THUMBNAIL_EVICT_INTERVAL = 1000  # Thumbnails a search writes between evictions of the thumbnail cache
 
 # Features
 # TODO: Improve estimate time algorithm
@@ -22,7 +30,6 @@ from src.stoppable_pool import StoppablePool
 # TODO: Fix this stuff so the pool gets terminated on application close
 # TODO: Fix pooling so errors thrown in pool get handled (pop up for user or dismissed)
 # TODO: Add caching of info in duplicate controllers for if we cancel, change a param and re-run
-# TODO: Create a HOG based duplicate finder
 # TODO: Create n-dimensional neighbor/percentage based spatial tree for efficient neighbor checking
 
 
@@ -251,14 +258,18 @@ class DuplicateFinderController(RelativeLayout):
     layout = ObjectProperty(baseclass=DuplicateFinderLayout)
     duplicate_images = ListProperty([])
     progress = ObjectProperty(DuplicateFinderProgress())
+    verifier = ObjectProperty(None, allownone=True)  # Optional CandidateVerifier re-checking the found pairs
+    thumbnail_cache = ObjectProperty(None, allownone=True)  # Optional ThumbnailCache the workers write thumbnails to
 
-    __events__ = ('on_start', 'on_stop', 'on_cancel', 'on_resume', 'on_finish')
+    __events__ = ('on_start', 'on_stop', 'on_cancel', 'on_resume', 'on_finish', 'on_group_created', 'on_group_grew')
 
     def __init__(self, **kwargs):
         super(DuplicateFinderController, self).__init__(**kwargs)
 
         # Member variables
         self.thread = None
+        self.image_table = image_table.ImageTable([])  # Table of the images being searched, indexed by image id
+        self._unevicted_thumbnails = 0  # Thumbnails written since the thumbnail cache was last evicted
         self._state_options = ['rest', 'running', 'stopped', 'canceled', 'finished']
         # rest -> running
         # running -> stopped, canceled, finished
@@ -292,6 +303,12 @@ class DuplicateFinderController(RelativeLayout):
         # Set max progress
         self.progress = DuplicateFinderProgress(index=0, total=len(image_paths))
 
+        # Give every image an id, the rest of the search only passes around ids
+        self.image_table = image_table.ImageTable(image_paths)
+        self._unevicted_thumbnails = 0
+        if self.verifier is not None:
+            self.verifier.reset(len(image_paths))
+
         # Start the duplicate finding thread
         self.duplicate_images = []
 
@@ -305,13 +322,137 @@ class DuplicateFinderController(RelativeLayout):
         self.state = 'running'
 
         # Start thread
-        self.thread = threading.Thread(target=self._find_duplicates, args=(image_paths,))
+        self.thread = threading.Thread(target=self._search, args=(image_paths,))
         self.thread.start()
 
+    def _search(self, image_paths):
+        """ Runs the search on the finder thread and frees what it used however it ended
+
+        Args:
+            image_paths (list[str]): A list of paths to images
+        """
+        try:
+            self._find_duplicates(image_paths)
+        finally:
+            if self.verifier is not None:
+                self.verifier.close()
+
+    def _create_pool(self, fn):
+        """
+        Creates a StoppablePool mapping fn over the ids of every image in ``self.image_table``,
+        the image paths are given to each worker once instead of with every task
+
+        Args:
+            fn: function taking an image id as its first argument
+
+        Returns:
+            StoppablePool
+        """
+        return StoppablePool(fn=fn, args=[(image_id,) for image_id in range(len(self.image_table))],
+                             num_workers=self.num_threads, initializer=image_table.init_worker,
+                             initargs=(self.image_table.paths,))
+
+    def _verify_size(self):
+        """
+        Returns: the side of the thumbnails the workers should return for verification, None without a verifier
+        """
+        return self.verifier.thumbnail_size if self.verifier is not None else None
+
+    def _record_image(self, image_id, image_record, image_thumbnail):
+        """ Stores what a worker found out about an image besides its features
+
+        Args:
+            image_id: id of the image
+            image_record: ImageRecord of the image
+            image_thumbnail: verification thumbnail of the image or None
+        """
+        self.image_table.record(image_id, image_record)
+        if image_thumbnail is not None:
+            self.verifier.add(image_id, image_thumbnail)
+        if self.thumbnail_cache is not None and image_record.digest is not None:
+            # Keep the cache bounded while a large search writes its thumbnails instead of only once it finishes
+            self._unevicted_thumbnails += 1
+            if self._unevicted_thumbnails >= THUMBNAIL_EVICT_INTERVAL:
+                self._unevicted_thumbnails = 0
+                self._evict_thumbnails()
+
+    def _verify_pairs(self, ids_a, ids_b):
+        """ Re-checks candidate pairs with the verifier
+
+        Args:
+            ids_a: array of image ids
+            ids_b: array of image ids of the same length
+
+        Returns:
+            boolean array, True for the pairs which are accepted (all of them without a verifier)
+        """
+        if self.verifier is None:
+            return np.ones(len(ids_a), dtype=bool)
+        return self.verifier.verify(ids_a, ids_b)
+
+    def _verify_groups(self, groups):
+        """ Re-checks the members of each group with the verifier and regroups the accepted pairs
+
+        Groups of up to ALL_PAIRS_GROUP_SIZE images verify every pair. Larger groups verify each member against the
+        group's first image, the members it rejects are verified against the first of them and so on, so a bucket
+        of thousands of near blank images costs a few checks per image instead of one per pair.
+
+        Args:
+            groups: list of lists of image ids
+
+        Returns:
+            list of lists of image ids which are connected by accepted pairs
+        """
+        if self.verifier is None or not groups:
+            return groups
+
+        pairs = [np.empty((0, 2), dtype=np.int64)]
+        pending = []
+        for group in groups:
+            group = np.asarray(group, dtype=np.int64)
+            if len(group) <= ALL_PAIRS_GROUP_SIZE:
+                rows_i, rows_j = np.triu_indices(len(group), k=1)
+                pairs.append(np.stack([group[rows_i], group[rows_j]], axis=1))
+            else:
+                pending.append(group)
+        pairs = np.concatenate(pairs)
+        accepted = [pairs[self._verify_pairs(pairs[:, 0], pairs[:, 1])]]
+
+        # Every round verifies the remaining members of all large groups against their representatives at once
+        while pending:
+            stars = np.concatenate([np.stack([np.full(len(group) - 1, group[0]), group[1:]], axis=1)
+                                    for group in pending])
+            star_accepted = self._verify_pairs(stars[:, 0], stars[:, 1])
+            accepted.append(stars[star_accepted])
+            offsets = np.cumsum([0] + [len(group) - 1 for group in pending])
+            pending = [group[1:][~star_accepted[start:stop]] for group, start, stop in
+                       zip(pending, offsets[:-1], offsets[1:])]
+            pending = [group for group in pending if len(group) > 1]
+        self.verifier.log_stats()
+
+        union_find = UnionFind(len(self.image_table))
+        union_find.union_many(np.concatenate(accepted))
+        return [component.tolist() for component in union_find.components(min_size=2)]
+
+    def _evict_thumbnails(self):
+        """ Bounds the size of the thumbnail cache, the thumbnails of the grouped images are marked as used first so
+        the ones the manager is about to show are evicted last. During a search the groups are not known yet and the
+        least recently used thumbnails, those of earlier searches first, are evicted
+        """
+        if self.thumbnail_cache is not None:
+            for group in self.duplicate_images:
+                for image_id in group:
+                    digest = self.image_table.digest(image_id)
+                    if digest is not None:
+                        self.thumbnail_cache.get(digest)
+            removed = self.thumbnail_cache.evict()
+            if removed:
+                Logger.info(f"Thumbnail cache: evicted {removed / 2 ** 20:.1f}MB of least recently used thumbnails")
+
     def _find_duplicates(self, image_paths, **kwargs):
         """
         Finds all of the duplicate items in the image list and stores them in ``self.duplicate_images``
-        in the form of List[List[(str,ratio)].
+        in the form of List[List[image_id]], where image ids index into ``self.image_table``.
 
         Called internally as a separate thread, should react to and set ``self.state``:
             ``stopped`` -> pause current action and resume when state changes to ``running``
@@ -371,6 +512,16 @@ class DuplicateFinderController(RelativeLayout):
         # change state
         self.state = 'running'
 
+    @mainthread
+    def _dispatch_group_event(self, event, *args):
+        """ Dispatches a group event from the finder thread on the main thread
+
+        Args:
+            event: name of the group event (``on_group_created`` or ``on_group_grew``)
+            *args: arguments passed to the event handlers
+        """
+        self.dispatch(event, *args)
+
     # Getters and Setters #
     def get_state(self):
         return self._state
@@ -429,13 +580,55 @@ class DuplicateFinderController(RelativeLayout):
         if self.thread:
             self.thread.join()
 
+    def on_group_created(self, group_id, images):
+        """ Default group created handler, called as soon as a second image is found to be a duplicate
+
+        Args:
+            group_id: integer id of the group, ids are given out in creation order starting at 0
+            images: list of image ids in the group
+        """
+        pass
+
+    def on_group_grew(self, group_id, image):
+        """ Default group grew handler, called when another image is added to an existing group
+
+        Args:
+            group_id: integer id of the group given in ``on_group_created``
+            image: image id added to the group
+        """
+        pass
+
 
 class HashDuplicateFinderController(DuplicateFinderController):
-    def __init__(self, hash_size=16, num_threads=4, **kwargs):
+    def __init__(self, hash_size=16, num_threads=4, grouping='dict', algorithms=('dhash',), match=None, votes=None,
+                 invariant=False, **kwargs):
         super().__init__(**kwargs)
+        if grouping not in ('dict', 'sort'):
+            raise ValueError(f"Invalid grouping {grouping}, expected 'dict' or 'sort'")
+        algorithms = tuple(algorithms)
+        if not algorithms or any(algorithm not in image_hashing.HASH_ALGORITHMS for algorithm in algorithms):
+            raise ValueError(f"Invalid algorithms {algorithms}, expected some of {list(image_hashing.HASH_ALGORITHMS)}")
+        match = algorithms[0] if match is None else match
+        if match != 'vote' and match not in algorithms:
+            raise ValueError(f"Invalid match {match}, expected 'vote' or one of {algorithms}")
+
         self.hashes = dict()
+        self.group_ids = dict()  # Hash value to group id for every hash with more than one image
         self.num_threads = num_threads
         self.hash_size = hash_size
+        # 'dict' groups into self.hashes as results come in and streams the groups,
+        # 'sort' packs the hashes into self.hash_groupers and groups them once at the end using far less memory
+        self.grouping = grouping
+        # Every algorithm is computed from the same decode of the image
+        self.algorithms = algorithms
+        # Images match on equal hashes of one algorithm, or with 'vote' on equal hashes under at least votes algorithms
+        self.match = match
+        self.votes = len(algorithms) // 2 + 1 if votes is None else votes
+        if not 1 <= self.votes <= len(algorithms):
+            raise ValueError(f"Invalid votes {self.votes}, expected between 1 and {len(algorithms)}")
+        self.hash_groupers = dict()  # Algorithm name to the HashGrouper holding its hashes, rows aligned by image
+        # Keep the smallest hash over every rotation and mirror image so rotated and mirrored copies match
+        self.invariant = invariant
 
     def _find_duplicates(self, image_paths, **kwargs):
         # TODO: Add error handling for improper images or improper paths
@@ -443,12 +636,18 @@ class HashDuplicateFinderController(DuplicateFinderController):
 
         # clear old data
         self.hashes = dict()
+        self.group_ids = dict()
+        self.hash_groupers = dict()
+        if self._packs_hashes():
+            self.hash_groupers = {algorithm: HashGrouper(self.hash_size, capacity=max(1, len(image_paths)))
+                                  for algorithm in self.algorithms}
         self.progress.total = len(image_paths)
 
         # Compute hashes
-        partial_hash = functools.partial(image_hashing.async_open_and_hash, hash_size=self.hash_size)
-        pool = StoppablePool(fn=partial_hash, args=[(image_path,) for image_path in image_paths],
-                             num_workers=self.num_threads)
+        partial_hash = functools.partial(image_hashing.async_open_and_hashes, hash_size=self.hash_size,
+                                         algorithms=self.algorithms, invariant=self.invariant,
+                                         verify_size=self._verify_size(), thumbnail_cache=self.thumbnail_cache)
+        pool = self._create_pool(partial_hash)
 
         for result in pool:
             if self._should_stop_loop():
@@ -456,62 +655,230 @@ class HashDuplicateFinderController(DuplicateFinderController):
                 break
             else:
                 if result is not None:
-                    hash_val, image_path, ratio = result
-                    # grab all image paths with that hash_val, add the current image
-                    # path to it, and store the list back in the hashes dictionary
-                    p = self.hashes.get(hash_val, [])
-                    p.append((image_path, ratio))
-                    self.hashes[hash_val] = p
+                    hashes, image_id, image_record, image_thumbnail = result
+                    self._record_image(image_id, image_record, image_thumbnail)
+                    self._add_hashes(hashes, image_id)
 
                     # update progress path
-                    self.progress.path = image_path
+                    self.progress.path = self.image_table.path(image_id)
 
                 # update progress index
                 self.progress.index += 1
 
         else:
             # Completed duplicate image search
-            # set duplicates
-            self.duplicate_images = [images for images in self.hashes.values() if len(images) > 1]
+            self.duplicate_images = self._verify_groups(self._hash_groups())
+            self._evict_thumbnails()
             # set state to finished and call finished event
             # wait to set finished if user paused the operation
             while self.state == 'stopped':
                 continue
             self.state = 'finished'
 
+    def _packs_hashes(self):
+        """
+        Returns: True if the hashes of every algorithm are stored side by side in hash_groupers
+        """
+        return not self._streams_groups() or len(self.algorithms) > 1
+
+    def _streams_groups(self):
+        """
+        Returns: True if groups are built in self.hashes and emitted as the hashes come in
+        """
+        # Verified groups are only known once every thumbnail is in
+        return self.grouping == 'dict' and self.match != 'vote' and self.verifier is None
+
+    def _add_hashes(self, hashes, image_id):
+        """ Adds the hashes of an image to the grouping backend
+
+        Args:
+            hashes: tuple of the hash of the image for each of self.algorithms
+            image_id: id of the image
+        """
+        if self.hash_groupers:
+            for algorithm, hash_val in zip(self.algorithms, hashes):
+                self.hash_groupers[algorithm].add(hash_val, image_id)
+
+        if not self._streams_groups():
+            return
+
+        # grab all image ids with that hash_val, add the current image
+        # id to it, and store the list back in the hashes dictionary
+        hash_val = hashes[self.algorithms.index(self.match)]
+        p = self.hashes.get(hash_val, [])
+        p.append(image_id)
+        self.hashes[hash_val] = p
+        # emit the group as soon as it exists so it can be reviewed while the search continues
+        self._emit_group_events(hash_val, p)
+
+    def _hash_groups(self):
+        """
+        Returns: list of lists of the image ids with matching hashes
+        """
+        if self.match == 'vote':
+            groupers = [self.hash_groupers[algorithm] for algorithm in self.algorithms]
+            return [group.tolist() for group in hash_grouping.vote_groups(groupers, self.votes)]
+        if not self._streams_groups():
+            return [group.tolist() for group in self.hash_groupers[self.match].groups()]
+        # ordered by group id so they line up with the emitted group events
+        return [self.hashes[hash_val] for hash_val in self.group_ids]
+
+    def _emit_group_events(self, hash_val, images):
+        """ Emits ``on_group_created`` when a hash bucket gets its second image and ``on_group_grew`` afterwards
+
+        Args:
+            hash_val: hash value of the bucket which was just added to
+            images: list of image ids in the bucket
+        """
+        if len(images) == 2:
+            group_id = self.group_ids[hash_val] = len(self.group_ids)
+            self._dispatch_group_event('on_group_created', group_id, list(images))
+        elif len(images) > 2:
+            self._dispatch_group_event('on_group_grew', self.group_ids[hash_val], images[-1])
+
 
 class GradientDuplicateFinderController(DuplicateFinderController):
-    def __init__(self, vector_size=8, similarity_threshold=.90, num_threads=4, **kwargs):
+    feature_name = "gradients"
+
+    def __init__(self, vector_size=8, similarity_threshold=.90, num_threads=4, quantize=False, ram_budget=None,
+                 block_size=1024, cascade=False, coarse_vector_size=8, coarse_threshold=None, blocking=False,
+                 ratio_tolerance=0.05, ratio_overlap=1, size_blocking=False, **kwargs):
         super().__init__(**kwargs)
         self.num_threads = num_threads
         self.vector_size = vector_size
         self.similarity_threshold = similarity_threshold
+        self.quantize = quantize  # Store the gradients as int8 instead of float32
+        self.ram_budget = ram_budget  # Bytes of gradients kept in memory before spilling to a memory-mapped file
+        self.block_size = block_size  # Number of gradients compared against each other at a time
+        # Cascade: screen every pair with a cheap coarse gradient and verify the survivors with the vector_size one
+        self.cascade = cascade
+        self.coarse_vector_size = coarse_vector_size
+        # Relaxed threshold for the coarse screen, None uses similarity_threshold - 0.1
+        self.coarse_threshold = coarse_threshold
+        self.cascade_stats = dict()  # Number of pairs compared and kept by each stage of the last cascade
+        # Blocking: only compare images with similar ratios (and optionally file sizes of the same magnitude)
+        self.blocking = blocking
+        self.ratio_tolerance = ratio_tolerance  # Relative width of a ratio band
+        self.ratio_overlap = ratio_overlap  # Number of neighbouring ratio bands each band is compared with
+        self.size_blocking = size_blocking  # Also block by the order of magnitude of the file size
+        self.blocking_stats = dict()  # Number of pairs compared and skipped by the last blocking
+
+    def _vector_sizes(self):
+        if self.cascade:
+            return self.coarse_vector_size, self.vector_size
+        return (self.vector_size,)
+
+    def _feature_function(self):
+        """
+        Returns: function run in the pool for each image id, returning (vectors, image_id, image_record) with one
+            unit length vector per size in _vector_sizes, or None if the image could not be read
+        """
+        return functools.partial(image_gradient.async_open_and_gradients, vector_sizes=self._vector_sizes(),
+                                 verify_size=self._verify_size(), thumbnail_cache=self.thumbnail_cache)
 
     def _calculate_gradients(self, image_paths):
-        image_gradients = []
+        image_gradients = None
 
-        partial_gradient = functools.partial(image_gradient.async_open_and_gradient, vector_size=8)
-        pool = StoppablePool(fn=partial_gradient, args=[(image_path,) for image_path in image_paths],
-                             num_workers=self.num_threads)
+        pool = self._create_pool(self._feature_function())
 
         for result in pool:
             if self._should_stop_loop():
                 pool.terminate()
-                return []
+                return None
             elif result is not None:
-                # add gradient to list
-                _, image_path, _ = result
+                # add gradients to the stores, one store per vector size with matching rows
+                gradients, image_id, image_record, image_thumbnail = result
+                self._record_image(image_id, image_record, image_thumbnail)
 
-                image_gradients.append(result)
+                if image_gradients is None:
+                    image_gradients = [FeatureStore(dim=len(gradient), capacity=len(image_paths),
+                                                    quantize=self.quantize, ram_budget=self.ram_budget)
+                                       for gradient in gradients]
+                for store, gradient in zip(image_gradients, gradients):
+                    store.add(image_id, gradient)
 
                 # update progress path
-                self.progress.path = "Calculating gradients: " + image_path
+                self.progress.path = f"Calculating {self.feature_name}: " + self.image_table.path(image_id)
 
             # update progress index
             self.progress.index += 1
 
         return image_gradients
 
+    def _create_blocking(self, store):
+        """
+        Blocks the rows of a store by the ratio (and size) of their images
+
+        Args:
+            store: FeatureStore whose rows to block
+
+        Returns:
+            Blocking of the rows of store
+        """
+        ids = store.ids
+        sizes = self.image_table.sizes[ids] if self.size_blocking else None
+        blocking = Blocking(self.image_table.ratios[ids], tolerance=self.ratio_tolerance,
+                            overlap=self.ratio_overlap, sizes=sizes)
+
+        all_pairs = len(ids) * (len(ids) - 1) // 2
+        compared_pairs = blocking.num_pairs()
+        self.blocking_stats = dict(pairs=all_pairs, compared=compared_pairs, blocks=len(blocking.blocks),
+                                   skipped_fraction=blocking.skipped_fraction())
+        Logger.info(f"Gradient blocking: {len(blocking.blocks)} blocks skip {all_pairs - compared_pairs} "
+                    f"of {all_pairs} pairs ({100 * self.blocking_stats['skipped_fraction']:.1f}%)")
+        return blocking
+
+    def _store_pairs(self, store, threshold):
+        """
+        Yields the pairs of rows of a store with a similarity > threshold a tile at a time, only comparing rows in
+        the same or neighbouring blocks when blocking, see FeatureStore.similar_pairs
+
+        Args:
+            store: FeatureStore to compare the rows of
+            threshold: similarity a pair must be greater than
+        """
+        if not self.blocking:
+            yield from store.similar_pairs(threshold, self.block_size)
+            return
+
+        blocking = self._create_blocking(store)
+        # Only the compared pairs count towards the progress
+        self.progress.total = self.progress.index + blocking.num_pairs()
+        for rows, other_rows in blocking.block_pairs():
+            yield from store.similar_pairs(threshold, self.block_size, rows, other_rows)
+
+    def _similar_pairs(self, image_gradients):
+        """
+        Yields the similar pairs of rows a tile at a time, see FeatureStore.similar_pairs
+
+        Args:
+            image_gradients: list of FeatureStores from _calculate_gradients
+        """
+        if not self.cascade:
+            yield from self._store_pairs(image_gradients[0], self.similarity_threshold)
+            return
+
+        coarse_gradients, fine_gradients = image_gradients
+        coarse_threshold = self.coarse_threshold
+        if coarse_threshold is None:
+            coarse_threshold = self.similarity_threshold - 0.1
+
+        self.cascade_stats = dict(pairs=0, coarse_kept=0, fine_kept=0)
+        for rows_i, rows_j, num_compared in self._store_pairs(coarse_gradients, coarse_threshold):
+            # Only the pairs which survive the coarse screen are compared with the fine gradients
+            keep = fine_gradients.pair_similarities(rows_i, rows_j) > self.similarity_threshold
+
+            self.cascade_stats['pairs'] += num_compared
+            self.cascade_stats['coarse_kept'] += len(rows_i)
+            self.cascade_stats['fine_kept'] += int(keep.sum())
+
+            yield rows_i[keep], rows_j[keep], num_compared
+
+        stats = self.cascade_stats
+        Logger.info(f"Gradient cascade: coarse stage pruned {stats['pairs'] - stats['coarse_kept']} "
+                    f"of {stats['pairs']} pairs, fine stage pruned {stats['coarse_kept'] - stats['fine_kept']} "
+                    f"of {stats['coarse_kept']} pairs")
+
     def _get_duplicates_from_gradients(self, image_gradients):
         # Add error handling for gradients param
         if not image_gradients:
@@ -521,39 +888,29 @@ class GradientDuplicateFinderController(DuplicateFinderController):
         self.progress.path = "Calculating similarities..."
 
         # Create a union find data structure
-        union_find = UF(len(image_gradients))
-        # Run over all the image pairings (O(n^2))
+        union_find = UnionFind(len(image_gradients[0]))
+        ids = image_gradients[0].ids
+        # Run over all the image pairings (O(n^2)) a tile at a time
         # Calculate the % similarity in their image gradients
-        # If they have a similarity > some factor
+        # If they have a similarity > some factor (and pass verification)
         #   perform union on the two images
-        # TODO: look into if
-        #  for i,_ in enum(lst): for j,_ in enum(lst[i+1:]):
-        #  or for i,_ in enum(lst): for j,_ in enum(lst): if j>i:
-        #  is better practice
-        for i, (image1_gradient, image1_path, image1_ratio) in enumerate(image_gradients):
-            for j, (image2_gradient, image2_path, image2_ratio) in enumerate(image_gradients[i + 1:]):
-                if self._should_stop_loop():
-                    return []
-
-                percentage = image_gradient.gradient_similarity(image1_gradient, image2_gradient)
-                if percentage > self.similarity_threshold:
-                    union_find.union(i, i + 1 + j)
-
-                # update progress index
-                self.progress.index += 1
-
-        # Create list of duplicates from union_find data structure
-        sets_of_images = dict()
-        for i, (_, path, image_ratio) in enumerate(image_gradients):
+        for rows_i, rows_j, num_compared in self._similar_pairs(image_gradients):
             if self._should_stop_loop():
                 return []
 
-            set_id = union_find.find(i)
-            p = sets_of_images.get(set_id, [])
-            p.append((path, image_ratio))
-            sets_of_images[set_id] = p
+            if self.verifier is not None:
+                accepted = self._verify_pairs(ids[rows_i], ids[rows_j])
+                rows_i, rows_j = rows_i[accepted], rows_j[accepted]
+            union_find.union_many(np.stack([rows_i, rows_j], axis=1))
+
+            # update progress index
+            self.progress.index += num_compared
+
+        if self.verifier is not None:
+            self.verifier.log_stats()
 
-        return [images for images in sets_of_images.values() if len(images) > 1]
+        # Create list of duplicates from the components of the union_find data structure
+        return [ids[rows].tolist() for rows in union_find.components(min_size=2)]
 
     def _find_duplicates(self, image_paths, **kwargs):
         # TODO: Add error handling for improper images or improper paths
@@ -573,8 +930,28 @@ class GradientDuplicateFinderController(DuplicateFinderController):
 
         # Find similarities
         self.duplicate_images = self._get_duplicates_from_gradients(image_gradients)
+        self._evict_thumbnails()
 
         # Check state logic
         if self._should_stop_loop():
             return
         self.state = 'finished'
+
+
+class HOGDuplicateFinderController(GradientDuplicateFinderController):
+    """
+    Finds duplicates by the similarity of the HOG descriptors of square, contrast normalized thumbnails.
+    The descriptors go through the same feature stores, tiled comparison, cascade and blocking as the gradients,
+    the cascade screens with a coarse_thumbnail_size descriptor.
+    """
+    feature_name = "HOG descriptors"
+
+    def __init__(self, thumbnail_size=64, similarity_threshold=.85, coarse_thumbnail_size=32, **kwargs):
+        image_hog.check_thumbnail_size(thumbnail_size)
+        image_hog.check_thumbnail_size(coarse_thumbnail_size)
+        super().__init__(vector_size=thumbnail_size, similarity_threshold=similarity_threshold,
+                         coarse_vector_size=coarse_thumbnail_size, **kwargs)
+
+    def _feature_function(self):
+        return functools.partial(image_hog.async_open_and_hogs, thumbnail_sizes=self._vector_sizes(),
+                                 verify_size=self._verify_size(), thumbnail_cache=self.thumbnail_cache)
@@ -18,13 +18,22 @@ class DuplicateFinderScreen(Screen):
         # Bind events for controller
         self.controller.bind(on_finish=self.search_finished)
         self.controller.bind(on_cancel=self.search_canceled)
+        self.controller.bind(on_group_created=self.group_created)
+        self.controller.bind(on_group_grew=self.group_grew)
         self.add_widget(self.controller)
 
     def start_search(self, images):
         self.controller.find(images)
+        return self.controller.image_table
 
     def search_canceled(self, *args):
         self.manager.cancel_search()
 
+    def group_created(self, instance, group_id, images):
+        self.manager.group_created(group_id, images)
+
+    def group_grew(self, instance, group_id, image):
+        self.manager.group_grew(group_id, image)
+
     def search_finished(self, instance, *args):
-        self.manager.search_finished(instance.duplicate_images)
+        self.manager.search_finished(instance.duplicate_images, instance.image_table)
@@ -5,7 +5,7 @@ from kivy.uix.recycleview import RecycleView
 from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.relativelayout import RelativeLayout
 from kivy.uix.stacklayout import StackLayout
-from kivy.properties import BooleanProperty, ObjectProperty, ListProperty
+from kivy.properties import BooleanProperty, ObjectProperty, ListProperty, OptionProperty
 from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.uix.behaviors import FocusBehavior
 from kivy.uix.recycleview.layout import LayoutSelectionBehavior
@@ -14,20 +14,19 @@ from kivy.properties import StringProperty, NumericProperty
 from kivy.factory import Factory
 from kivy import Logger
 
+from src.group_adapter import GroupDataAdapter, SORT_KEYS
+from src.selection_rules import SelectionRules, selected_positions
+
 
 # Optional Hard-Feature
-# TODO: Add undo handling so if ctrl z is pressed the last action is undone \
-#  (for now that could be just restoring the most recently deleted images) \
-#  maybe store those images in a directory and then delete on shutdown, if images are there when the program starts \
-#  could load to screen resuming the session (in case of bad exit)
+# TODO: Undo with ctrl z as well as the undo button
+# TODO: Load images left in the trash by a bad exit back into the view to resume the session
 
 # Features
-# TODO: Add deletion of images when delete button pressed
-#   but make sure that their is a debug mode of some sort where the images are not actually deleted
+# TODO: Add a debug mode of some sort where the images are not actually deleted when the trash is purged
 # TODO: Add slider to control image size
 # TODO: Add preview mode or detailed view mode (size, date created, etc)
 # TODO: Add clear selection button
-# TODO: Add sorting button
 # TODO: Add back button
 # TODO: Custom checkbox so it is more visible on white images
 
@@ -46,10 +45,19 @@ class ImageGroupDataView(RecycleDataViewBehavior, StackLayout):
     selected = BooleanProperty(False)  # Whether the current view is selected or not
     selectable = BooleanProperty(True)  # Whether the current view can be selected
     widgetclass = StringProperty('None')  # The type of widgets this grid contains
+    hidden = BooleanProperty(False)  # Whether the group has less than two images left and is collapsed
+
+    max_spare_widgets = 16  # Number of detached widgets kept in the pool for later, larger groups
 
     def __init__(self, **kwargs):
         super(ImageGroupDataView, self).__init__(**kwargs)
         self.selected_nodes = {}  # Dictionary of indexes to selected subwidgets
+        # Widgets rebound to the data of whichever group this view shows, the first len(children) are attached
+        # and children[i] is always _widget_pool[i]
+        self._widget_pool = []
+        self._pool_class = None
+        self._rv = None  # RecycleView whose selection index the selection of images is recorded in
+        self.group_id = None
 
     def refresh_view_attrs(self, rv, index, data):
         """
@@ -65,19 +73,54 @@ class ImageGroupDataView(RecycleDataViewBehavior, StackLayout):
         """
         # Reset the view
         self.index = index
+        self.group_id = data.get('group_id')
+        self.hidden = data.get('hidden', False)
+        self._rv = rv
         # Selection status
-        self.selected = len(data.get('selected', set())) > 0
-        self.selected_nodes[self.index] = data.get('selected', set())
-        # Widgets
-        self.clear_widgets()
-        widget_type = Factory.get(self.widgetclass)  # Dynamically get the selection status based on the widget class
-        for i, kwargs in enumerate(data.get('data', [])):
-            new_widget = widget_type(index=i, **kwargs)
-            self.add_widget(new_widget, index=i)
-            new_widget.apply_selection(i, i in self.selected_nodes[self.index])
+        if rv is not None:
+            selected_nodes = set(rv.selected_images(self.group_id))
+        else:
+            selected_nodes = data.get('selected', set())
+        self.selected = len(selected_nodes) > 0
+        self.selected_nodes[self.index] = selected_nodes
+        # Widgets, collapsed groups have none
+        self._bind_widgets([] if self.hidden else data.get('data', []))
 
         return super(ImageGroupDataView, self).refresh_view_attrs(rv, index, data)
 
+    def _bind_widgets(self, items):
+        """
+        Rebinds the pooled widgets to the images of the group, widgets are only created when the group is larger
+        than any group this view has shown and only detached when it is smaller
+
+        Args:
+            items: list of the keyword arguments of each widget
+        """
+        widget_type = Factory.get(self.widgetclass)  # Dynamically get the selection status based on the widget class
+        if widget_type is not self._pool_class:
+            self.clear_widgets()
+            self._widget_pool = []
+            self._pool_class = widget_type
+
+        pool = self._widget_pool
+        while len(pool) < len(items):
+            pool.append(widget_type(index=len(pool)))
+
+        # Attach or detach widgets from the end so children[i] stays pool[i]
+        for widget in self.children[len(items):]:
+            self.remove_widget(widget)
+        for i in range(len(self.children), len(items)):
+            self.add_widget(pool[i], index=i)
+        del pool[len(items) + self.max_spare_widgets:]
+
+        selected_nodes = self.selected_nodes[self.index]
+        for i, kwargs in enumerate(items):
+            widget = pool[i]
+            widget.index = i
+            for key, value in kwargs.items():
+                setattr(widget, key, value)
+            widget.apply_selection(i, i in selected_nodes)
+
     def select_with_touch(self, index, touch=None):
         """
         Performs selection of self and selected widget
@@ -116,8 +159,10 @@ class ImageGroupDataView(RecycleDataViewBehavior, StackLayout):
             raise ValueError(f"Invalid node index of {node} with {len(self.children)} selectable nodes")
 
         if node not in self.selected_nodes.get(self.index, set()):
-            self.selected_nodes.get(self.index, set()).add(node)
+            self.selected_nodes.setdefault(self.index, set()).add(node)
             self.children[node].apply_selection(node, True)
+            if self._rv is not None:
+                self._rv.select_image(self.group_id, node)
             return True
         else:
             return False
@@ -141,18 +186,21 @@ class ImageGroupDataView(RecycleDataViewBehavior, StackLayout):
         else:
             self.selected_nodes[self.index].remove(node)
             self.children[node].apply_selection(node, False)
+            if self._rv is not None:
+                self._rv.deselect_image(self.group_id, node)
             return True
 
     def apply_selection(self, rv, index, is_selected):
         ''' Respond to the selection of items in the view. '''
         self.selected = is_selected
-        rv.data[index]['selected'] = self.selected_nodes[index]
 
 
 class SelectableImage(RelativeLayout):
     ''' Add selection support to the Label '''
     index = NumericProperty(0)
-    source = StringProperty()
+    image_id = NumericProperty(-1)  # Id of the image in the view's image table
+    source = StringProperty()  # Path of the original image
+    thumbnail = StringProperty()  # Path of the cached thumbnail shown instead of the original, '' if there is none
     image_ratio = NumericProperty()
     selected = BooleanProperty(False)
     selectable = BooleanProperty(True)
@@ -179,39 +227,330 @@ class SelectableImage(RelativeLayout):
 class ImageGroupsRecycleView(RecycleView):
     info_selection = ObjectProperty()
     duplicate_images = ListProperty()
+    image_table = ObjectProperty(None, allownone=True)  # ImageTable (or DuplicateResultStore) to resolve image ids with
+    result_store = ObjectProperty(None, allownone=True)  # DuplicateResultStore to page groups in from
+    page_size = NumericProperty(50)  # Number of groups materialized at a time as the view is scrolled
+    window_size = NumericProperty(200)  # Most groups materialized in data at once, the rest stay packed
+    sort_key = OptionProperty('found', options=SORT_KEYS)  # Order the groups of a finished search are shown in
+    thumbnail_cache = ObjectProperty(None, allownone=True)  # ThumbnailCache the search wrote thumbnails to
+    trash = ObjectProperty(None, allownone=True)  # Trash removed images are moved to, None to delete them
+    selection_rules = ObjectProperty(None, allownone=True)  # SelectionRules used by auto_select, None for defaults
 
     def __init__(self, **kwargs):
         super(ImageGroupsRecycleView, self).__init__(**kwargs)
         self.data = []
         self.images_to_remove = []
+        self._removals = []  # Undo stack of (trash batch id, list of (group id, image id)) of each removal
+        # Group id to the index of its row in data, rows are only replaced when the window moves so the indexes
+        # stay valid, groups with less than two images left are collapsed in place instead
+        self._group_rows = {}
+        self._selection = {}  # Group id to the set of positions of its selected images, only non empty sets
+        # GroupDataAdapter the rows of a finished search are materialized from, None while groups are streamed in
+        self._adapter = None
+        self._window_start = 0  # Position in the adapter's sort order of the group in the first row
+        self._streamed_removals = set()  # Ids of the images removed from streamed rows, kept out of the adapter
+
+    def _image_data(self, image_id):
+        # Image ids are only resolved to paths here, at the edge of the UI
+        return {'image_id': image_id, 'source': self.image_table.path(image_id),
+                'thumbnail': self._thumbnail(image_id), 'image_ratio': self.image_table.ratio(image_id)}
+
+    def _thumbnail(self, image_id):
+        """
+        Returns: the path of the cached thumbnail of an image, '' to show the original
+        """
+        if self.thumbnail_cache is None:
+            return ''
+        digest = self.image_table.digest(image_id)
+        if digest is None:
+            return ''
+        return self.thumbnail_cache.get(digest) or ''
 
     def on_duplicate_images(self, *args):
-        self.data = [{'data': [{'source': image_path, 'image_ratio': image_ratio}
-                               for image_path, image_ratio in duplicate_group]}
-                     for duplicate_group in self.duplicate_images]
+        self.clear_groups()
+        if self.duplicate_images:
+            self._set_adapter(GroupDataAdapter.from_groups(self.duplicate_images, self.image_table))
+
+    def on_result_store(self, *args):
+        self.clear_groups()
+        if self.result_store is not None:
+            self.image_table = self.result_store
+            self._set_adapter(GroupDataAdapter.from_result_store(self.result_store))
+
+    def on_sort_key(self, *args):
+        # Groups streamed in during a search are shown in the order they are found
+        if self._adapter is None:
+            return
+        self._adapter.sort(self.sort_key)
+        self._show_window(0, min(self.page_size, len(self._adapter)))
+        self.scroll_y = 1
+
+    def on_scroll_y(self, *args):
+        # Slide the window over the adapter's groups once either end of the view is reached
+        if self._adapter is None:
+            return
+        if self.scroll_y <= 0.05:
+            self.load_next_page()
+        elif self.scroll_y >= 0.95:
+            self.load_previous_page()
+
+    def finish_streaming(self, duplicate_images):
+        """ Hands the groups of a finished search over to a GroupDataAdapter so they can be sorted and windowed.
+        Streamed group ids are positions in duplicate_images, so the selection is kept and images removed from the
+        streamed rows stay removed
+
+        Args:
+            duplicate_images: list of lists of image ids found by the search
+        """
+        adapter = GroupDataAdapter.from_groups(duplicate_images, self.image_table)
+        adapter.remove_images(list(self._streamed_removals))
+        self._streamed_removals = set()
+        self._set_adapter(adapter)
+
+    def _set_adapter(self, adapter):
+        # Only the first page is materialized, so the first paint does not depend on the number of groups
+        self._adapter = adapter
+        adapter.sort(self.sort_key)
+        self._show_window(0, min(self.page_size, len(adapter)))
+
+    def _show_window(self, start, stop):
+        """ Materializes the groups at positions [start, stop) of the adapter's sort order as the rows of the view
+        """
+        self._window_start = start
+        self.data = self._adapter.rows(start, stop, self._image_data)
+        self._group_rows = {group['group_id']: row for row, group in enumerate(self.data)}
+        # The selection of images is kept by group id, row selections would point at other groups
+        if self.layout_manager is not None:
+            self.layout_manager.clear_selection()
+
+    def _move_window(self, start, stop):
+        """ Moves the window while keeping the group at the top of the viewport where it is on screen
+        """
+        lm = self.layout_manager
+        anchor = None
+        # Only once the current rows have been laid out
+        if lm is not None and self.data and len(lm.view_opts) == len(self.data):
+            left, bottom, width, height = self.get_viewport()
+            row = lm.get_view_index_at((left, bottom + height - 1))
+            row_top = lm.view_opts[row]['pos'][1] + lm.view_opts[row]['size'][1]
+            anchor = (self._window_start + row, row_top - (bottom + height))
+
+        self._show_window(start, stop)
+        if anchor is None or not start <= anchor[0] < stop:
+            return
+        # Lay the new rows out now so the scroll position is corrected before the next frame is drawn
+        self.refresh_views()
+        row = anchor[0] - start
+        row_top = lm.view_opts[row]['pos'][1] + lm.view_opts[row]['size'][1]
+        scrollable_height = lm.height - self.height
+        if scrollable_height > 0:
+            self.scroll_y = min(1, max(0, (row_top - anchor[1] - self.height) / scrollable_height))
+
+    def load_next_page(self):
+        """ Materializes the next page_size groups below the window, dropping groups above it beyond window_size
+
+        Returns:
+            True if any groups were added
+        """
+        if self._adapter is None:
+            return False
+        window_stop = self._window_start + len(self.data)
+        if window_stop >= len(self._adapter):
+            return False
+
+        stop = min(window_stop + self.page_size, len(self._adapter))
+        self._move_window(max(self._window_start, stop - self.window_size), stop)
+        return True
+
+    def load_previous_page(self):
+        """ Materializes the previous page_size groups above the window, dropping groups below it beyond window_size
+
+        Returns:
+            True if any groups were added
+        """
+        if self._adapter is None or self._window_start == 0:
+            return False
+
+        start = max(self._window_start - self.page_size, 0)
+        self._move_window(start, min(self._window_start + len(self.data), start + self.window_size))
+        return True
+
+    def clear_groups(self):
+        """ Removes all of the groups from the view, used before streaming in the groups of a new search
+        """
+        self.data = []
+        self._group_rows = {}
+        self._selection = {}
+        self._removals = []
+        self._adapter = None
+        self._window_start = 0
+        self._streamed_removals = set()
+
+    def has_groups(self):
+        """
+        Returns: True if any group has been added to the view
+        """
+        return bool(self._group_rows) or (self._adapter is not None and len(self._adapter) > 0)
+
+    def select_image(self, group_id, position):
+        """ Records the selection of an image in the selection index
+
+        Args:
+            group_id: id of the image's group
+            position: position of the image in the group's data
+        """
+        self._selection.setdefault(group_id, set()).add(position)
+
+    def deselect_image(self, group_id, position):
+        """ Removes an image from the selection index
+
+        Args:
+            group_id: id of the image's group
+            position: position of the image in the group's data
+        """
+        positions = self._selection.get(group_id)
+        if positions is None:
+            return
+        positions.discard(position)
+        if not positions:
+            del self._selection[group_id]
+
+    def selected_images(self, group_id):
+        """
+        Returns: the set of positions of the selected images of a group
+        """
+        return self._selection.get(group_id, set())
+
+    def add_group(self, group_id, images):
+        """
+        Appends a newly found duplicate group to the view
+
+        Args:
+            group_id: id of the group used by later calls to grow_group
+            images: list of image ids in the group
+        """
+        # Events queued before the search finished are already part of the adapter's groups
+        if self._adapter is not None:
+            return
+        self._group_rows[group_id] = len(self.data)
+        self.data.append({'group_id': group_id, 'data': [self._image_data(image_id) for image_id in images]})
+
+    def grow_group(self, group_id, image):
+        """
+        Adds an image to an already added group, only the group's row is refreshed
+
+        Args:
+            group_id: id of the group given to add_group
+            image: image id to add
+        """
+        row = self._group_rows.get(group_id)
+        if row is None or self._adapter is not None:
+            return
+        group = self.data[row]
+        group_data = group['data'] + [self._image_data(image)]
+        # A group reduced below two images by a removal is shown again once it is a group again
+        self.data[row] = dict(group, data=group_data, hidden=len(group_data) < 2)
+
+    def auto_select(self, rules=None):
+        """ Replaces the selection with every image but the one each group keeps by the selection rules
+
+        Args:
+            rules: SelectionRules to apply, None for selection_rules
+
+        Returns:
+            the number of images selected
+        """
+        rules = rules or self.selection_rules or SelectionRules()
+        if self._adapter is not None:
+            # Every group of the adapter is resolved, not only the materialized ones
+            image_ids, group_offsets = self._adapter.packed()
+            self._selection = selected_positions(rules.select(image_ids, group_offsets, self.image_table),
+                                                 group_offsets)
+            self.refresh_from_data()
+            return sum(len(positions) for positions in self._selection.values())
+
+        rows = [row for row, group in enumerate(self.data) if not group.get('hidden')]
+        groups = [[elem['image_id'] for elem in self.data[row]['data']] for row in rows]
+        selection = rules.select_groups(groups, self.image_table)
+
+        self._selection = {self.data[rows[group]]['group_id']: positions for group, positions in selection.items()}
+        self.refresh_from_data()
+        return sum(len(positions) for positions in self._selection.values())
 
     def remove_selected(self):
-        # Set data to data without selection
-        new_data = []
-        for i, group in enumerate(self.data):
-            unselected_data = [elem for i, elem in enumerate(group['data']) if i not in group.get('selected', set())]
-            selected_data = [elem for i, elem in enumerate(group['data']) if i in group.get('selected', set())]
-
-            for data in selected_data:
-                image_path, ratio = data.values()
-                self.images_to_remove.append(image_path)
-
-            if len(unselected_data) > 1:
-                new_group = {'data': unselected_data}
-                new_data.append(new_group)
-
-        # Clear layout managers selection
-        selected = self.layout_manager.selected_nodes[:]
-        for select in selected:
-            self.layout_manager.deselect_node(select)
-
-        self.data = new_data
-        Clock.schedule_once(self.remove_images)
+        """ Removes the selected images from their groups, only the rows of groups with a selection are updated
+        """
+        selection, self._selection = self._selection, {}
+        rows = []
+        removed = []
+        for group_id, positions in selection.items():
+            row = self._group_rows.get(group_id)
+            if self._adapter is not None:
+                # Only the ids are kept, data dicts are built for the rows in the window alone
+                removed.extend((group_id, image_id) for image_id in self._adapter.remove(group_id, positions))
+                if row is not None:
+                    rows.append(row)
+                    self.data[row] = self._adapter.row(group_id, self._image_data)
+                continue
+            if row is None:
+                continue
+            rows.append(row)
+            group = self.data[row]
+            removed.extend((group_id, elem['image_id']) for i, elem in enumerate(group['data']) if i in positions)
+            self._streamed_removals.update(elem['image_id'] for i, elem in enumerate(group['data']) if i in positions)
+            unselected_data = [elem for i, elem in enumerate(group['data']) if i not in positions]
+            self.data[row] = dict(group, data=unselected_data, hidden=len(unselected_data) < 2)
+
+        # Clear layout managers selection of the updated rows
+        if self.layout_manager is not None:
+            selected_rows = set(self.layout_manager.selected_nodes)
+            for row in rows:
+                if row in selected_rows:
+                    self.layout_manager.deselect_node(row)
+
+        if not removed:
+            return
+        paths = [self.image_table.path(image_id) for _, image_id in removed]
+        if self.trash is not None:
+            # Moved to the trash in the background, the UI stays responsive however many images there are
+            batch_id = self.trash.trash(paths)
+            self._removals.append((batch_id, removed))
+        else:
+            self.images_to_remove.extend(paths)
+            Clock.schedule_once(self.remove_images)
+
+    def undo_remove(self):
+        """ Restores the most recently removed images from the trash and puts them back in their groups
+
+        Returns:
+            True if any images were restored
+        """
+        while self._removals:
+            batch_id, removed = self._removals.pop()
+            # Batches purged from the trash can no longer be undone
+            if self.trash is not None and self.trash.undo(batch_id):
+                break
+        else:
+            return False
+
+        restored = {}
+        for group_id, image_id in removed:
+            restored.setdefault(group_id, []).append(image_id)
+        for group_id, image_ids in restored.items():
+            row = self._group_rows.get(group_id)
+            if self._adapter is not None:
+                # Restored to their original places in the group
+                self._adapter.restore(group_id, image_ids)
+                if row is not None:
+                    self.data[row] = self._adapter.row(group_id, self._image_data)
+                continue
+            if row is None:
+                continue
+            group = self.data[row]
+            self._streamed_removals.difference_update(image_ids)
+            group_data = group['data'] + [self._image_data(image_id) for image_id in image_ids]
+            self.data[row] = dict(group, data=group_data, hidden=len(group_data) < 2)
+        return True
 
     def remove_images(self, dt):
         for image_path in self.images_to_remove:
@@ -1,10 +1,51 @@
-from kivy.properties import ListProperty
+from kivy.properties import ListProperty, ObjectProperty, StringProperty
 from kivy.uix.screenmanager import Screen
 from src.duplicate_manager import ImageGroupsRecycleView
 
 
 class DuplicateManagerScreen(Screen):
     duplicate_images = ListProperty()
+    image_table = ObjectProperty(None, allownone=True)
+    result_store = ObjectProperty(None, allownone=True)
+    thumbnail_cache = ObjectProperty(None, allownone=True)
+    frame_monitor = ObjectProperty(None, allownone=True)  # FrameTimeMonitor timing frames while the screen is shown
+    trash = ObjectProperty(None, allownone=True)  # Trash removed images are moved to
+    trash_status = StringProperty('')  # Progress of the trash's current job
+
+    _trash_actions = {'trash': 'Moved to the trash', 'restore': 'Restored', 'purge': 'Deleted'}
+
+    def on_trash(self, instance, trash):
+        if trash is not None:
+            trash.bind(on_progress=self._trash_progress)
+
+    def _trash_progress(self, trash, action, done, total):
+        self.trash_status = f"{self._trash_actions[action]} {done}/{total} images"
+
+    def on_enter(self, *args):
+        if self.frame_monitor is not None:
+            self.frame_monitor.start()
+
+    def on_leave(self, *args):
+        if self.frame_monitor is not None:
+            self.frame_monitor.stop()
+            self.frame_monitor.log_stats()
+
+    def clear_groups(self):
+        self.duplicate_images = []
+        self.result_store = None
+        self.ids._recycle_view.clear_groups()
+
+    def has_groups(self):
+        return self.ids._recycle_view.has_groups()
+
+    def add_group(self, group_id, images):
+        self.ids._recycle_view.add_group(group_id, images)
+
+    def grow_group(self, group_id, image):
+        self.ids._recycle_view.grow_group(group_id, image)
+
+    def finish_streaming(self, duplicate_images):
+        self.ids._recycle_view.finish_streaming(duplicate_images)
 
 
 if __name__ == "__main__":
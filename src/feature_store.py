@@ -0,0 +1,259 @@
+import os
+import tempfile
+
+import numpy as np
+
+# TODO: Add an index (ANN / spatial tree) on top of the store so similar_pairs doesn't have to compare every pair
+
+QUANTIZE_SCALE = 127  # Unit length vectors are stored as round(vector * QUANTIZE_SCALE) when quantized
+
+
+class FeatureStore:
+    """
+    Stores unit length feature vectors (one per image) in a single contiguous, growable matrix.
+
+    Vectors are stored as float32, or as int8 when ``quantize`` is set, which cuts the memory per vector by 4 and
+    turns similarity into an integer dot product. Once the matrix would grow past ``ram_budget`` bytes it is moved
+    into a memory-mapped file in ``spill_directory`` so very large searches are bounded by disk instead of RAM.
+
+    Usage:
+    >>> store = FeatureStore(dim=2)
+    >>> store.add(10, [1.0, 0.0])
+    0
+    >>> store.add(11, [0.8, 0.6])
+    1
+    >>> [(int(store.ids[i]), int(store.ids[j])) for rows_i, rows_j, _ in store.similar_pairs(0.7)
+    ...  for i, j in zip(rows_i, rows_j)]
+    [(10, 11)]
+    """
+    def __init__(self, dim, capacity=1024, quantize=False, ram_budget=None, spill_directory=None):
+        """
+
+        Args:
+            dim: length of the vectors
+            capacity: number of vectors to preallocate room for
+            quantize: store vectors as int8 instead of float32
+            ram_budget: maximum number of bytes of vectors to keep in memory, None for no limit
+            spill_directory: directory for the memory-mapped file, None for the system temp directory
+        """
+        if dim <= 0:
+            raise ValueError("Cannot create a feature store with vectors of 0 or less values")
+        if capacity <= 0:
+            raise ValueError("Cannot create a feature store with a capacity of 0 or less")
+
+        self.dim = dim
+        self.quantize = quantize
+        self.ram_budget = ram_budget
+        self.spill_directory = spill_directory
+        self.dtype = np.dtype(np.int8) if quantize else np.dtype(np.float32)
+        self._count = 0
+        self._spill_path = None
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._matrix = self._allocate(capacity)
+
+    def __len__(self):
+        return self._count
+
+    def __del__(self):
+        self._remove_spill_file()
+
+    @property
+    def capacity(self):
+        return len(self._ids)
+
+    @property
+    def spilled(self):
+        """
+        Returns: True if the vectors have been moved into a memory-mapped file
+        """
+        return self._spill_path is not None
+
+    @property
+    def ids(self):
+        """
+        Returns: array of the image id for each row
+        """
+        return self._ids[:self._count]
+
+    @property
+    def matrix(self):
+        """
+        Returns: the (len, dim) matrix of stored vectors in the storage dtype
+        """
+        return self._matrix[:self._count]
+
+    @property
+    def scale(self):
+        """
+        Returns: the factor the dot product of two stored rows must be divided by to get the vectors dot product
+        """
+        return QUANTIZE_SCALE ** 2 if self.quantize else 1
+
+    def add(self, image_id, vector):
+        """
+        Appends a vector to the store, growing the matrix if it is full
+
+        Args:
+            image_id: id of the image the vector belongs to
+            vector: array of length dim
+
+        Returns:
+            the row the vector was stored at
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if len(vector) != self.dim:
+            raise ValueError(f"Invalid vector of length {len(vector)} for store of dimension {self.dim}")
+
+        if self._count == self.capacity:
+            self._grow(2 * self.capacity)
+
+        row = self._count
+        self._ids[row] = image_id
+        self._matrix[row] = self._encode(vector)
+        self._count += 1
+        return row
+
+    def vector(self, row):
+        """
+        Args:
+            row: row of the vector
+
+        Returns:
+            the float32 vector stored at row
+        """
+        return self._matrix[row].astype(np.float32) / (QUANTIZE_SCALE if self.quantize else 1)
+
+    def similarities(self, rows_a, rows_b):
+        """
+        Dot products between the vectors at rows_a and the vectors at rows_b
+
+        Args:
+            rows_a: slice or array of rows
+            rows_b: slice or array of rows
+
+        Returns:
+            (len(rows_a), len(rows_b)) float32 matrix of similarities
+        """
+        return self._dot(self._matrix[rows_a], self._matrix[rows_b]) / np.float32(self.scale)
+
+    def pair_similarities(self, rows_a, rows_b):
+        """
+        Dot products between the vectors of row pairs
+
+        Args:
+            rows_a: array of rows
+            rows_b: array of rows of the same length
+
+        Returns:
+            float32 array of the similarity of each pair
+        """
+        a = self._matrix[rows_a].astype(np.int32 if self.quantize else np.float32)
+        b = self._matrix[rows_b].astype(np.int32 if self.quantize else np.float32)
+        return np.einsum('ij,ij->i', a, b).astype(np.float32) / np.float32(self.scale)
+
+    def similar_pairs(self, threshold, block_size=1024, rows=None, other_rows=None):
+        """
+        Compares pairs of rows tile by tile, a tile of block_size x block_size similarities is the most
+        which is ever held in memory
+
+        Args:
+            threshold: similarity a pair must be greater than to be returned
+            block_size: number of rows in a tile
+            rows: array of the rows to compare, None for every row
+            other_rows: array of rows to compare each of rows against, None to compare each pair within rows once
+
+        Yields:
+            (rows_i, rows_j, num_compared) for each tile, where (rows_i[k], rows_j[k]) are the similar pairs
+            and num_compared is the number of pairs the tile compared
+        """
+        if rows is None:
+            # Contiguous rows can be sliced instead of gathered
+            rows = _RowRange(self._count)
+        same = other_rows is None
+        if same:
+            other_rows = rows
+
+        for start_i in range(0, len(rows), block_size):
+            stop_i = min(start_i + block_size, len(rows))
+            for start_j in range(start_i if same else 0, len(other_rows), block_size):
+                stop_j = min(start_j + block_size, len(other_rows))
+                tile_i, tile_j = rows[start_i:stop_i], other_rows[start_j:stop_j]
+                sims = self.similarities(tile_i, tile_j)
+
+                hits = sims > threshold
+                if same and start_i == start_j:
+                    # Only compare each pair once on diagonal tiles, masked instead of zeroed so a negative
+                    # threshold does not pass the self and lower triangle pairs
+                    hits &= np.triu(np.ones(hits.shape, dtype=bool), k=1)
+                    num_compared = (stop_i - start_i) * (stop_i - start_i - 1) // 2
+                else:
+                    num_compared = (stop_i - start_i) * (stop_j - start_j)
+
+                hits_i, hits_j = np.nonzero(hits)
+                yield _take(tile_i, hits_i), _take(tile_j, hits_j), num_compared
+
+    def _dot(self, a, b):
+        if not self.quantize:
+            return a @ b.T
+        # Products of int8 values summed over dim stay exact in float32 while below 2^24,
+        # which lets the integer dot product use the float matrix multiply
+        if self.dim * QUANTIZE_SCALE ** 2 < 2 ** 24:
+            return a.astype(np.float32) @ b.astype(np.float32).T
+        return a.astype(np.int32) @ b.astype(np.int32).T
+
+    def _encode(self, vector):
+        if self.quantize:
+            return np.clip(np.rint(vector * QUANTIZE_SCALE), -QUANTIZE_SCALE, QUANTIZE_SCALE)
+        return vector
+
+    def _allocate(self, capacity):
+        num_bytes = capacity * self.dim * self.dtype.itemsize
+        if self.ram_budget is None or num_bytes <= self.ram_budget:
+            return np.zeros((capacity, self.dim), dtype=self.dtype)
+
+        # Over budget, keep the vectors in a memory-mapped file instead
+        fd, path = tempfile.mkstemp(suffix='.features', dir=self.spill_directory)
+        os.close(fd)
+        self._spill_path = path
+        return np.memmap(path, dtype=self.dtype, mode='w+', shape=(capacity, self.dim))
+
+    def _grow(self, capacity):
+        old_matrix, old_spill_path = self._matrix, self._spill_path
+
+        self._matrix = self._allocate(capacity)
+        self._matrix[:self._count] = old_matrix[:self._count]
+        self._ids = np.concatenate([self._ids, np.zeros(capacity - len(self._ids), dtype=np.int64)])
+
+        # Release the old memory map before removing its file
+        del old_matrix
+        if old_spill_path is not None and old_spill_path != self._spill_path:
+            os.remove(old_spill_path)
+
+    def _remove_spill_file(self):
+        if getattr(self, '_spill_path', None) is not None:
+            self._matrix = None
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
+            self._spill_path = None
+
+
+class _RowRange:
+    """
+    Stand in for np.arange(count) whose slices are python slices, so tiles of contiguous rows are views
+    """
+    def __init__(self, count):
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, item):
+        return item
+
+
+def _take(tile, hits):
+    if isinstance(tile, slice):
+        return hits + tile.start
+    return tile[hits]
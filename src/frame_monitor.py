@@ -0,0 +1,99 @@
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+from src.running_average import RunningAverage
+
+SLOW_FRAME_TIME = 1 / 30  # Frames taking longer than this are counted as stutters
+
+
+class FrameTimeMonitor:
+    """
+    Measures the time between frames with the kivy Clock, used to find where the UI stutters (e.g. while scrolling
+    the duplicate groups).
+
+    Frame times can also be given to ``record`` directly, which is how benchmarks without a window use it.
+
+    Usage:
+    >>> monitor = FrameTimeMonitor(k_points=2)
+    >>> for frame_time in (0.01, 0.02, 0.05):
+    ...     monitor.record(frame_time)
+    >>> monitor.frames, monitor.slow_frames, round(monitor.average.average, 3), monitor.worst
+    (3, 1, 0.035, 0.05)
+    """
+    def __init__(self, k_points=120, slow_frame_time=SLOW_FRAME_TIME, name='Frames'):
+        """
+
+        Args:
+            k_points: number of recent frames the average frame time is over
+            slow_frame_time: frames taking longer than this many seconds are counted as slow
+            name: name the stats are logged under
+        """
+        self.k_points = k_points
+        self.slow_frame_time = slow_frame_time
+        self.name = name
+        self._event = None
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the recorded frames
+        """
+        self.average = RunningAverage(self.k_points)
+        self.frames = 0
+        self.slow_frames = 0
+        self.worst = 0.0
+        self.total_time = 0.0
+
+    @property
+    def running(self):
+        return self._event is not None
+
+    def start(self):
+        """
+        Starts recording the time of every frame, resetting the stats
+        """
+        if self.running:
+            return
+        self.reset()
+        self._event = Clock.schedule_interval(self._on_frame, 0)
+
+    def stop(self):
+        """
+        Stops recording frames, the stats are kept until the next start
+        """
+        if not self.running:
+            return
+        self._event.cancel()
+        self._event = None
+
+    def _on_frame(self, dt):
+        self.record(dt)
+
+    def record(self, frame_time):
+        """
+        Adds the time of one frame to the stats
+
+        Args:
+            frame_time: seconds the frame took
+        """
+        self.average.add(float(frame_time))
+        self.frames += 1
+        self.total_time += frame_time
+        self.worst = max(self.worst, frame_time)
+        if frame_time > self.slow_frame_time:
+            self.slow_frames += 1
+
+    def summary(self):
+        """
+        Returns: a one line description of the recorded frames
+        """
+        fps = self.frames / self.total_time if self.total_time else 0
+        return (f"{self.name}: {self.frames} frames at {fps:.1f} fps, recent average "
+                f"{self.average.average * 1000:.1f}ms, worst {self.worst * 1000:.1f}ms, "
+                f"{self.slow_frames} slower than {self.slow_frame_time * 1000:.0f}ms")
+
+    def log_stats(self):
+        """
+        Logs the summary of the recorded frames
+        """
+        Logger.info(self.summary())
@@ -0,0 +1,178 @@
+import numpy as np
+
+from src.selection_rules import flatten_groups
+
+# Orders the groups can be shown in: the order they were found, most images first or most bytes freed by keeping
+# only the largest file first
+SORT_KEYS = ('found', 'size', 'reclaimable')
+
+
+class GroupDataAdapter:
+    """
+    Lazy source of the RecycleView rows of a large set of duplicate groups.
+
+    The groups are kept packed like DuplicateResultStore keeps them (one image id array and group offsets) and only
+    the rows the view asks for are turned into data dicts, so memory does not depend on how many groups there are.
+    Removed images are masked out instead of repacking the arrays, and the groups are sorted by argsorting one
+    per group key array.
+
+    Positions index the groups in the current sort order, group ids index them in the order they were found.
+
+    Usage:
+    >>> from src.image_table import ImageTable
+    >>> adapter = GroupDataAdapter.from_groups([[0, 1], [2, 3, 4]], ImageTable(list('abcde')))
+    >>> adapter.sort('size')
+    >>> [row['group_id'] for row in adapter.rows(0, 2, lambda image_id: image_id)]
+    [1, 0]
+    """
+    def __init__(self, image_ids, group_offsets, table):
+        """
+
+        Args:
+            image_ids: int array of the image ids of every group packed together
+            group_offsets: int array of offsets, group i is image_ids[group_offsets[i]:group_offsets[i + 1]]
+            table: ImageTable (or DuplicateResultStore) the image ids index into
+        """
+        self.image_ids = np.asarray(image_ids, dtype=np.int64)
+        self.group_offsets = np.asarray(group_offsets, dtype=np.int64)
+        self.table = table
+        self.removed = np.zeros(len(self.image_ids), dtype=bool)  # Members removed from their group
+        self.sort_key = 'found'
+        self.order = np.arange(len(self))  # Group id at each position
+
+    @classmethod
+    def from_groups(cls, groups, table):
+        """
+        Args:
+            groups: list of lists of image ids
+            table: ImageTable the image ids index into
+        """
+        return cls(*flatten_groups(groups), table)
+
+    @classmethod
+    def from_result_store(cls, result_store):
+        """
+        Args:
+            result_store: DuplicateResultStore, its path ids are used as the image ids
+        """
+        return cls(result_store.path_ids, result_store.group_offsets, result_store)
+
+    def __len__(self):
+        return len(self.group_offsets) - 1
+
+    # Per group keys #
+    def _kept_sums(self, values):
+        # Sums values over the members of each group which are not removed
+        sums = np.concatenate([[0], np.cumsum(np.where(self.removed, 0, values))])
+        return sums[self.group_offsets[1:]] - sums[self.group_offsets[:-1]]
+
+    def group_sizes(self):
+        """
+        Returns: int array of the number of images left in each group
+        """
+        return self._kept_sums(np.ones(len(self.image_ids), dtype=np.int64))
+
+    def reclaimable_bytes(self):
+        """
+        Returns: int array of the bytes removing every image but the largest of each group would free, images of
+            unknown size count as 0 bytes
+        """
+        sizes = np.where(self.removed, 0, np.maximum(self.table.sizes[self.image_ids], 0))
+        reclaimable = self._kept_sums(sizes)
+        nonempty = np.diff(self.group_offsets) > 0
+        reclaimable[nonempty] -= np.maximum.reduceat(sizes, self.group_offsets[:-1][nonempty])
+        return reclaimable
+
+    def sort(self, sort_key='found'):
+        """
+        Orders the groups, ties keep the order the groups were found in
+
+        Args:
+            sort_key: one of SORT_KEYS
+        """
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f"Invalid sort key {sort_key}, expected one of {list(SORT_KEYS)}")
+
+        if sort_key == 'found':
+            self.order = np.arange(len(self))
+        else:
+            keys = self.group_sizes() if sort_key == 'size' else self.reclaimable_bytes()
+            self.order = np.argsort(-keys, kind='stable')
+        self.sort_key = sort_key
+
+    # Rows #
+    def _members(self, group_id):
+        # Indexes into image_ids of the images left in a group, in their original order
+        start, stop = self.group_offsets[group_id], self.group_offsets[group_id + 1]
+        return start + np.flatnonzero(~self.removed[start:stop])
+
+    def group_image_ids(self, group_id):
+        """
+        Returns: list of the ids of the images left in a group
+        """
+        return self.image_ids[self._members(group_id)].tolist()
+
+    def row(self, group_id, image_data):
+        """
+        Materializes the data dict of a group's row
+
+        Args:
+            group_id: id of the group
+            image_data: function creating the data dict of an image from its id
+
+        Returns:
+            the row's data dict, groups with less than two images left are hidden
+        """
+        image_ids = self.group_image_ids(group_id)
+        return {'group_id': group_id, 'data': [image_data(image_id) for image_id in image_ids],
+                'hidden': len(image_ids) < 2}
+
+    def rows(self, start, stop, image_data):
+        """
+        Materializes the rows of the groups at positions [start, stop) of the sort order
+        """
+        return [self.row(group_id, image_data) for group_id in self.order[start:stop].tolist()]
+
+    # Removal #
+    def remove(self, group_id, positions):
+        """
+        Removes images from a group
+
+        Args:
+            group_id: id of the group
+            positions: positions of the images among the images left in the group
+
+        Returns:
+            list of the ids of the removed images
+        """
+        members = self._members(group_id)[sorted(positions)]
+        self.removed[members] = True
+        return self.image_ids[members].tolist()
+
+    def restore(self, group_id, image_ids):
+        """
+        Puts removed images back in their place in a group
+
+        Args:
+            group_id: id of the group
+            image_ids: ids of the images to restore
+        """
+        start, stop = self.group_offsets[group_id], self.group_offsets[group_id + 1]
+        self.removed[start:stop] &= ~np.isin(self.image_ids[start:stop], image_ids)
+
+    def remove_images(self, image_ids):
+        """
+        Removes images from whichever groups they are in
+
+        Args:
+            image_ids: ids of the images to remove
+        """
+        self.removed |= np.isin(self.image_ids, image_ids)
+
+    def packed(self):
+        """
+        Returns: (image_ids, group_offsets) of the images left in every group, indexed by group id
+        """
+        kept = ~self.removed
+        group_offsets = np.concatenate([[0], np.cumsum(kept)])[self.group_offsets]
+        return self.image_ids[kept], group_offsets
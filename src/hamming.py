@@ -0,0 +1,163 @@
+import numpy as np
+
+# Number of set bits in every 16 bit value, used when numpy has no bitwise_count (numpy < 2.0),
+# at 64KB it still fits in cache and needs half the lookups of a byte table
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(2 ** 16)], dtype=np.uint8)
+
+
+def _popcount_table(words):
+    """
+    Counts the set bits of each uint64 with a 16 bit lookup table
+    """
+    words = np.ascontiguousarray(words, dtype=np.uint64)
+    counts = _POPCOUNT_TABLE[words.view(np.uint16).reshape(words.shape + (4,))]
+    return counts[..., 0] + counts[..., 1] + counts[..., 2] + counts[..., 3]
+
+
+def _popcount_native(words):
+    """
+    Counts the set bits of each uint64 with numpy's vectorized popcount
+    """
+    return np.bitwise_count(np.asarray(words, dtype=np.uint64))
+
+
+_popcount = _popcount_native if hasattr(np, 'bitwise_count') else _popcount_table
+
+
+def popcount(words):
+    """
+    Counts the set bits of each element of a uint64 array
+
+    Args:
+        words: uint64 array
+
+    Returns:
+        uint8 array of the same shape with the number of set bits in each element
+    """
+    return _popcount(words)
+
+
+def _as_hash_matrix(hashes):
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    if hashes.ndim == 1:
+        hashes = hashes[:, None]
+    return hashes
+
+
+def hamming_distances(queries, database, block_size=1024):
+    """
+    Hamming distance between every query hash and every database hash
+
+    Args:
+        queries: (q, words) uint64 matrix of packed hashes (a 1d array is treated as one word hashes)
+        database: (n, words) uint64 matrix of packed hashes
+        block_size: number of database hashes XORed against the queries at a time
+
+    Returns:
+        (q, n) uint16 matrix of distances
+    """
+    queries, database = _as_hash_matrix(queries), _as_hash_matrix(database)
+    distances = np.empty((len(queries), len(database)), dtype=np.uint16)
+    for start in range(0, len(database), block_size):
+        block = database[start:start + block_size]
+        # Accumulate word by word, a reduction over the short word axis is much slower than whole array adds
+        block_distances = _popcount(queries[:, None, 0] ^ block[None, :, 0]).astype(np.uint16)
+        for word in range(1, queries.shape[1]):
+            block_distances += _popcount(queries[:, None, word] ^ block[None, :, word])
+        distances[:, start:start + len(block)] = block_distances
+    return distances
+
+
+def top_k(queries, database, k, block_size=1024):
+    """
+    Finds the k nearest database hashes of every query, keeping only k candidates per query between blocks
+
+    Args:
+        queries: (q, words) uint64 matrix of packed hashes
+        database: (n, words) uint64 matrix of packed hashes
+        k: number of neighbours to return, clipped to n
+        block_size: number of database hashes compared at a time
+
+    Returns:
+        (indices, distances), (q, k) matrices of the database index and distance of each neighbour,
+        nearest first
+    """
+    queries, database = _as_hash_matrix(queries), _as_hash_matrix(database)
+    k = min(k, len(database))
+    best_indices = np.zeros((len(queries), 0), dtype=np.int64)
+    best_distances = np.zeros((len(queries), 0), dtype=np.uint16)
+
+    for start in range(0, len(database), block_size):
+        block_distances = hamming_distances(queries, database[start:start + block_size], block_size)
+        block_indices = np.broadcast_to(np.arange(start, start + block_distances.shape[1]), block_distances.shape)
+
+        candidate_distances = np.concatenate([best_distances, block_distances], axis=1)
+        candidate_indices = np.concatenate([best_indices, block_indices], axis=1)
+        if candidate_distances.shape[1] > k:
+            keep = np.argpartition(candidate_distances, k - 1, axis=1)[:, :k]
+            candidate_distances = np.take_along_axis(candidate_distances, keep, axis=1)
+            candidate_indices = np.take_along_axis(candidate_indices, keep, axis=1)
+        best_distances, best_indices = candidate_distances, candidate_indices
+
+    order = np.lexsort((best_indices, best_distances))
+    return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_distances, order, axis=1)
+
+
+def radius_search(queries, database, radius, block_size=1024):
+    """
+    Finds every database hash within radius of each query
+
+    Args:
+        queries: (q, words) uint64 matrix of packed hashes
+        database: (n, words) uint64 matrix of packed hashes
+        radius: largest distance to return
+        block_size: number of database hashes compared at a time
+
+    Returns:
+        (query_indices, database_indices, distances) arrays of every match
+    """
+    queries, database = _as_hash_matrix(queries), _as_hash_matrix(database)
+    query_indices, database_indices, distances = [], [], []
+    for start in range(0, len(database), block_size):
+        block_distances = hamming_distances(queries, database[start:start + block_size], block_size)
+        rows, columns = np.nonzero(block_distances <= radius)
+        query_indices.append(rows)
+        database_indices.append(columns + start)
+        distances.append(block_distances[rows, columns])
+
+    if not query_indices:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint16)
+    return np.concatenate(query_indices), np.concatenate(database_indices), np.concatenate(distances)
+
+
+def pairs_within(database, radius, block_size=1024):
+    """
+    Finds every pair of database hashes within radius of each other, comparing the database against itself a
+    tile at a time
+
+    Args:
+        database: (n, words) uint64 matrix of packed hashes
+        radius: largest distance to return
+        block_size: number of hashes in a tile
+
+    Yields:
+        (rows_i, rows_j, num_compared) for each tile, where rows_i[k] < rows_j[k] are the pairs within radius and
+        num_compared is the number of pairs the tile compared
+    """
+    database = _as_hash_matrix(database)
+    count = len(database)
+    for start_i in range(0, count, block_size):
+        stop_i = min(start_i + block_size, count)
+        for start_j in range(start_i, count, block_size):
+            stop_j = min(start_j + block_size, count)
+            within = hamming_distances(database[start_i:stop_i], database[start_j:stop_j], block_size) <= radius
+
+            if start_i == start_j:
+                # Only compare each pair once on diagonal tiles
+                within = np.triu(within, k=1)
+                num_compared = (stop_i - start_i) * (stop_i - start_i - 1) // 2
+            else:
+                num_compared = (stop_i - start_i) * (stop_j - start_j)
+
+            rows_i, rows_j = np.nonzero(within)
+            yield rows_i + start_i, rows_j + start_j, num_compared
@@ -0,0 +1,152 @@
+import itertools
+
+import numpy as np
+
+from src import image_hashing
+from src.union_find import UnionFind
+
+
+class HashGrouper:
+    """
+    Groups images with equal hashes by sorting instead of with a dictionary of lists.
+
+    Hashes are packed into a growable (n, words) uint64 matrix next to an int64 array of image ids, which costs
+    8 * (words + 1) bytes per image (40 bytes for hash_size=16) instead of a python int, list and dict entry.
+    Groups are found once all hashes are added with one sort and a pass over the runs of equal hashes.
+
+    Usage:
+    >>> grouper = HashGrouper(hash_size=8)
+    >>> for image_id, hash_val in enumerate([5, 7, 5, 9, 7, 5]):
+    ...     grouper.add(hash_val, image_id)
+    >>> [group.tolist() for group in grouper.groups()]
+    [[0, 2, 5], [1, 4]]
+    """
+    def __init__(self, hash_size=8, capacity=1024):
+        """
+
+        Args:
+            hash_size: the hash_size the hashes are computed with
+            capacity: number of hashes to preallocate room for
+        """
+        if capacity <= 0:
+            raise ValueError("Cannot create a hash grouper with a capacity of 0 or less")
+
+        self.hash_size = hash_size
+        self.num_words = image_hashing.num_hash_words(hash_size)
+        self._count = 0
+        self._hashes = np.zeros((capacity, self.num_words), dtype=np.uint64)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def hashes(self):
+        """
+        Returns: the (len, num_words) matrix of packed hashes
+        """
+        return self._hashes[:self._count]
+
+    @property
+    def ids(self):
+        """
+        Returns: array of the image id for each hash
+        """
+        return self._ids[:self._count]
+
+    def add(self, hash_val, image_id):
+        """
+        Adds the hash of an image
+
+        Args:
+            hash_val: integer hash of the image
+            image_id: id of the image
+        """
+        if self._count == len(self._ids):
+            # Double the capacity
+            self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+            self._ids = np.concatenate([self._ids, np.zeros_like(self._ids)])
+
+        self._hashes[self._count] = image_hashing.hash_to_words(hash_val, self.hash_size)
+        self._ids[self._count] = image_id
+        self._count += 1
+
+    def labels(self):
+        """
+        Labels each hash by its run of equal hashes
+
+        Returns:
+            int64 array with a label per added hash, equal hashes get equal labels
+        """
+        hashes = self.hashes
+        if not len(hashes):
+            return np.zeros(0, dtype=np.int64)
+
+        order = np.lexsort(tuple(hashes[:, k] for k in range(self.num_words)))
+        sorted_hashes = hashes[order]
+        run_starts = np.concatenate([[True], np.any(sorted_hashes[1:] != sorted_hashes[:-1], axis=1)])
+        labels = np.empty(len(order), dtype=np.int64)
+        labels[order] = np.cumsum(run_starts) - 1
+        return labels
+
+    def groups(self, min_size=2):
+        """
+        Finds the runs of equal hashes
+
+        Args:
+            min_size: smallest group to return
+
+        Returns:
+            list of int64 arrays of the image ids with the same hash, ordered by their smallest image id
+        """
+        hashes, ids = self.hashes, self.ids
+        if not len(ids):
+            return []
+
+        # Sort by hash, ties by image id so each group comes out ascending
+        order = np.lexsort((ids,) + tuple(hashes[:, k] for k in range(self.num_words)))
+        sorted_hashes = hashes[order]
+
+        # A run starts wherever the hash differs from the previous one
+        run_starts = np.flatnonzero(np.concatenate([[True], np.any(sorted_hashes[1:] != sorted_hashes[:-1], axis=1)]))
+        run_ends = np.append(run_starts[1:], len(order))
+        keep = run_ends - run_starts >= min_size
+        run_starts, run_ends = run_starts[keep], run_ends[keep]
+
+        sorted_ids = ids[order]
+        by_smallest = np.argsort(sorted_ids[run_starts], kind='stable')
+        return [sorted_ids[run_starts[i]:run_ends[i]] for i in by_smallest]
+
+
+def vote_groups(groupers, votes, min_size=2):
+    """
+    Groups images whose hashes are equal under at least ``votes`` of the groupers, transitively
+
+    Every grouper must have had the same image ids added in the same order. A pair agreeing under ``votes`` or more
+    groupers agrees on every label of some combination of ``votes`` groupers, so each combination is grouped with a
+    sort over its label columns and the runs are merged with a union find.
+
+    Args:
+        groupers: list of HashGrouper, one per hash algorithm
+        votes: number of groupers which must agree for a pair to match
+        min_size: smallest group to return
+
+    Returns:
+        list of int64 arrays of the image ids in each group, ordered by their smallest image id
+    """
+    if not 1 <= votes <= len(groupers):
+        raise ValueError(f"Invalid votes {votes}, expected between 1 and {len(groupers)}")
+    if not len(groupers[0]):
+        return []
+
+    ids = groupers[0].ids
+    labels = [grouper.labels() for grouper in groupers]
+    union_find = UnionFind(len(ids))
+    for combination in itertools.combinations(labels, votes):
+        order = np.lexsort(combination)
+        same_as_previous = np.all([column[order[1:]] == column[order[:-1]] for column in combination], axis=0)
+        # Joining each row to the previous one of its run connects the whole run
+        union_find.union_many(np.stack([order[1:][same_as_previous], order[:-1][same_as_previous]], axis=1))
+
+    groups = [np.sort(ids[rows]) for rows in union_find.components(min_size=min_size)]
+    return sorted(groups, key=lambda group: group[0])
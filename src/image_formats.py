@@ -0,0 +1,74 @@
+import os
+
+# Formats an image can be stored in, the index of the format is its code in ImageTable.formats, 0 is unknown
+IMAGE_FORMATS = ('', 'jpeg', 'png', 'bmp', 'tiff', 'webp', 'gif', 'jp2', 'pnm', 'exr', 'hdr')
+_FORMAT_NAMES = {'jpg': 'jpeg', 'jpe': 'jpeg', 'jfif': 'jpeg', 'tif': 'tiff', 'dib': 'bmp', 'pbm': 'pnm',
+                 'pgm': 'pnm', 'ppm': 'pnm', 'pxm': 'pnm', 'j2k': 'jp2', 'jpf': 'jp2', 'pic': 'hdr'}
+_FORMAT_CODES = {image_format: code for code, image_format in enumerate(IMAGE_FORMATS) if image_format}
+
+# Leading bytes of each format, (offset, magic bytes) pairs which must all match
+_SIGNATURES = (
+    ('jpeg', ((0, b'\xff\xd8\xff'),)),
+    ('png', ((0, b'\x89PNG\r\n\x1a\n'),)),
+    ('bmp', ((0, b'BM'),)),
+    ('tiff', ((0, b'II*\x00'),)),
+    ('tiff', ((0, b'MM\x00*'),)),
+    ('webp', ((0, b'RIFF'), (8, b'WEBP'))),
+    ('gif', ((0, b'GIF87a'),)),
+    ('gif', ((0, b'GIF89a'),)),
+    ('jp2', ((0, b'\x00\x00\x00\x0cjP  '),)),
+    ('jp2', ((0, b'\xffO\xffQ'),)),
+    ('exr', ((0, b'v/1\x01'),)),
+    ('hdr', ((0, b'#?RADIANCE'),)),
+    ('hdr', ((0, b'#?RGBE'),)),
+)
+HEADER_SIZE = 16  # Number of leading bytes sniff_format needs
+
+
+def format_code(name):
+    """
+    Args:
+        name: name of a format or a file extension (with or without the dot), case insensitive
+
+    Returns: the code of the format in IMAGE_FORMATS, 0 if it is unknown
+    """
+    name = name.lower().lstrip('.')
+    return _FORMAT_CODES.get(_FORMAT_NAMES.get(name, name), 0)
+
+
+def path_format_code(path):
+    """
+    Returns: the code of the format the file extension of path claims, 0 if it is unknown
+    """
+    extension = path[path.rfind('.') + 1:] if path.rfind('.') > path.rfind(os.sep) else ''
+    return format_code(extension)
+
+
+def sniff_format(header):
+    """
+    Identifies the format of an image from its contents, regardless of its extension
+
+    Args:
+        header: the first HEADER_SIZE (or more) bytes of the file
+
+    Returns: the code of the format in IMAGE_FORMATS, 0 if it is unknown
+    """
+    header = bytes(header[:HEADER_SIZE])
+    for image_format, signature in _SIGNATURES:
+        if all(header[offset:offset + len(magic)] == magic for offset, magic in signature):
+            return _FORMAT_CODES[image_format]
+    # Netpbm has a P and the type digit followed by whitespace
+    if len(header) > 2 and header[0:1] == b'P' and header[1:2] in b'1234567' and header[2:3].isspace():
+        return _FORMAT_CODES['pnm']
+    return 0
+
+
+def read_format(path):
+    """
+    Returns: the code of the format of the image file at path from its contents, 0 if it is unknown or unreadable
+    """
+    try:
+        with open(path, 'rb') as f:
+            return sniff_format(f.read(HEADER_SIZE))
+    except OSError:
+        return 0
@@ -1,5 +1,9 @@
 import cv2
 import numpy as np
+from kivy.logger import Logger
+
+from src import image_table, verification
+from src.thumbnail_cache import open_image
 
 # TODO: Add to unit tests
 
@@ -20,6 +24,10 @@ def normalize(v):
 
 def calculate_horizontal_gradient(image, image_size=8):
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return _gray_horizontal_gradient(gray, image_size)
+
+
+def _gray_horizontal_gradient(gray, image_size):
     resized = cv2.resize(gray, (image_size + 1, image_size))
     # compute the (relative) horizontal gradient between adjacent
     # column pixels
@@ -44,18 +52,39 @@ def calculate_gradient_vector(image, vector_size=8):
     return normalize(flatten)
 
 
-def async_open_and_gradient(image_path, **kwargs):
-    # load the input image and compute the hash
-    image = cv2.imread(image_path)
-    image_ratio = image.shape[1] / image.shape[0]
+def calculate_gradient_vectors(image, vector_sizes=(8, 32)):
+    """
+    Calculates the normalized gradient vector of an image at several sizes, the image is only converted to
+    grayscale once and each size is resized from it
+    Args:
+        image: An opened cv2 image to find the gradient vectors
+        vector_sizes: the sizes of the vectors to output
+
+    Returns:
+        list of numpy arrays of length 1, one for each vector size
+    """
+    return _gray_gradient_vectors(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), vector_sizes)
+
+
+def _gray_gradient_vectors(gray, vector_sizes):
+    return [normalize(_gray_horizontal_gradient(gray, vector_size).flatten()) for vector_size in vector_sizes]
+
+
+def async_open_and_gradients(image_id, vector_sizes=(8, 32), verify_size=None, thumbnail_cache=None):
+    # load the input image once and compute the gradient at every size (and the verification thumbnail)
+    image_path = image_table.worker_path(image_id)
+    image, digest, header = open_image(image_path, thumbnail_cache)
+    if image is None:
+        Logger.warning(f"Failed to load image {image_path}")
+        return None
     try:
-        gradient_vector = calculate_gradient_vector(image, **kwargs)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gradient_vectors = _gray_gradient_vectors(gray, vector_sizes)
+        image_thumbnail = verification.thumbnail(gray, verify_size) if verify_size else None
     except cv2.error:
         raise RuntimeError(f'Failed to calculate image gradient: {image}')
 
-    # grab all image paths with that hash, add the current image
-    # path to it, and store the list back in the hashes dictionary
-    return gradient_vector, image_path, image_ratio
+    return gradient_vectors, image_id, image_table.stat_record(image_path, image, digest, header), image_thumbnail
 
 
 def gradient_similarity(image1_gradient, image2_gradient):
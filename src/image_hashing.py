@@ -1,36 +1,151 @@
 import cv2
+import numpy as np
 from kivy.logger import Logger
 
-
-# TODO: Add to unit tests
+from src import image_table, verification
+from src.thumbnail_cache import open_image
 
 
 def dhash(image, hash_size=8):
-    # convert the image to grayscale and resize the grayscale image,
-    # adding a single column (width) so we can compute the horizontal
-    # gradient
+    # convert the image to grayscale and hash it
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return _dhash_gray(gray, hash_size)
+
+
+def _bits_to_int(bits):
+    """
+    Converts a boolean array to an integer hash, bit i of the hash is element i of the flattened array
+    """
+    return int.from_bytes(np.packbits(bits.ravel(), bitorder='little').tobytes(), 'little')
+
+
+def _dhash_gray(gray, hash_size=8):
+    # resize the grayscale image, adding a single column (width) so we can compute the horizontal gradient
     resized = cv2.resize(gray, (hash_size + 1, hash_size))
     # compute the (relative) horizontal gradient between adjacent
     # column pixels
     diff = resized[:, 1:] > resized[:, :-1]
     # convert the difference image to a hash and return it
-    return sum([2 ** i for (i, v) in enumerate(diff.flatten()) if v])
+    return _bits_to_int(diff)
+
+
+def _shrink(gray, hash_size=8):
+    """
+    Averages a grayscale image down to 4 * hash_size square, the shared input of the ahash, phash and bhash
+    algorithms. Area interpolation over the full image is by far their most expensive step so it is done once.
+    """
+    return cv2.resize(gray, (4 * hash_size, 4 * hash_size), interpolation=cv2.INTER_AREA)
+
+
+def _ahash_small(small, hash_size=8):
+    # average hash: which pixels of the shrunk image are brighter than its mean
+    resized = cv2.resize(small, (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(resized > resized.mean())
+
+
+def _phash_small(small, hash_size=8):
+    # perceptual hash: which of the lowest frequency DCT coefficients are above their median
+    low_frequencies = cv2.dct(small.astype(np.float32))[:hash_size, :hash_size]
+    return _bits_to_int(low_frequencies > np.median(low_frequencies))
+
+
+def _bhash_small(small, hash_size=8):
+    # block mean hash: which blocks of a hash_size x hash_size grid are brighter than the median block
+    blocks = cv2.resize(small.astype(np.float32), (hash_size, hash_size), interpolation=cv2.INTER_AREA)
+    return _bits_to_int(blocks > np.median(blocks))
+
+
+# Hash algorithms by name, each returns a hash_size * hash_size bit hash. dhash takes the grayscale image,
+# the others take it shrunk by _shrink
+HASH_ALGORITHMS = {'dhash': _dhash_gray, 'ahash': _ahash_small, 'phash': _phash_small, 'bhash': _bhash_small}
+
+
+def ahash(image, hash_size=8):
+    return _ahash_small(_shrink(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), hash_size), hash_size)
+
+
+def phash(image, hash_size=8):
+    return _phash_small(_shrink(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), hash_size), hash_size)
+
+
+def bhash(image, hash_size=8):
+    return _bhash_small(_shrink(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), hash_size), hash_size)
+
+
+def _dihedral(square):
+    """
+    Yields the eight rotations and mirror images of a square image
+    """
+    for rotation in range(4):
+        rotated = np.rot90(square, rotation)
+        yield np.ascontiguousarray(rotated)
+        yield np.ascontiguousarray(rotated[:, ::-1])
+
+
+def compute_hashes(image, hash_size=8, algorithms=('dhash',), invariant=False):
+    """
+    Computes several hashes of an image, converting it to grayscale and shrinking it only once
+    Args:
+        image: BGR image from cv2.imread
+        hash_size: each hash has hash_size * hash_size bits
+        algorithms: names of the algorithms in HASH_ALGORITHMS to compute
+        invariant: hash all eight rotations and mirror images of a square thumbnail and keep the smallest,
+            so rotated and mirrored copies of an image get the same hash
+
+    Returns:
+        tuple of the integer hash of each algorithm, in the order of algorithms
+    """
+    return _gray_hashes(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), hash_size, algorithms, invariant)
+
+
+def _gray_hashes(gray, hash_size=8, algorithms=('dhash',), invariant=False):
+    small = _shrink(gray, hash_size) if any(algorithm != 'dhash' for algorithm in algorithms) else None
+    if not invariant:
+        return tuple(HASH_ALGORITHMS[algorithm](gray if algorithm == 'dhash' else small, hash_size)
+                     for algorithm in algorithms)
+
+    # dhash needs a square thumbnail to rotate, only the thumbnails are transformed so the decode is still shared
+    thumbnail = cv2.resize(gray, (hash_size + 1, hash_size + 1)) if 'dhash' in algorithms else None
+    return tuple(min(HASH_ALGORITHMS[algorithm](oriented, hash_size)
+                     for oriented in _dihedral(thumbnail if algorithm == 'dhash' else small))
+                 for algorithm in algorithms)
+
+
+def num_hash_words(hash_size=8):
+    """
+    Returns: the number of uint64 words needed to hold a hash of hash_size * hash_size bits
+    """
+    return max(1, -(-hash_size * hash_size // 64))
+
+
+def hash_to_words(hash_val, hash_size=8):
+    """
+    Packs a hash into uint64 words, word k holds bits 64k to 64k + 63
+    Args:
+        hash_val: integer hash from one of the hash functions
+        hash_size: the hash_size the hash was computed with
+
+    Returns:
+        uint64 array of num_hash_words(hash_size) words
+    """
+    return np.array([(hash_val >> (64 * k)) & 0xFFFFFFFFFFFFFFFF for k in range(num_hash_words(hash_size))],
+                    dtype=np.uint64)
 
 
-def async_open_and_hash(image_path, hash_size=8):
-    # load the input image and compute the hash
-    image = cv2.imread(image_path)
+def async_open_and_hashes(image_id, hash_size=8, algorithms=('dhash',), invariant=False, verify_size=None,
+                          thumbnail_cache=None):
+    # load the input image once and compute every hash (and the verification thumbnail) from the same decode
+    image_path = image_table.worker_path(image_id)
+    image, digest, header = open_image(image_path, thumbnail_cache)
     if image is None:
         Logger.warning(f"Failed to load image {image_path}")
         return None
-    image_ratio = image.shape[1] / image.shape[0]
     try:
-        hash_val = dhash(image, hash_size)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        hashes = _gray_hashes(gray, hash_size, algorithms, invariant)
+        image_thumbnail = verification.thumbnail(gray, verify_size) if verify_size else None
     except cv2.error:
-        Logger.warning(f'Failed to hash image: {image}')
+        Logger.warning(f'Failed to hash image: {image_path}')
         return None
 
-    # grab all image paths with that hash, add the current image
-    # path to it, and store the list back in the hashes dictionary
-    return hash_val, image_path, image_ratio
+    return hashes, image_id, image_table.stat_record(image_path, image, digest, header), image_thumbnail
@@ -0,0 +1,100 @@
+import cv2
+import numpy as np
+from kivy.logger import Logger
+
+from src import image_table, verification
+from src.thumbnail_cache import open_image
+from src.image_gradient import normalize
+
+HOG_CELL_SIZE = 8  # Pixels per side of a HOG cell, blocks are 2x2 cells moved one cell at a time
+HOG_BINS = 9  # Number of orientation bins per cell
+
+_descriptors = dict()  # Thumbnail size to the HOGDescriptor for it, built once per process
+
+
+def check_thumbnail_size(thumbnail_size):
+    """
+    Raises a ValueError unless thumbnail_size is a multiple of HOG_CELL_SIZE of at least 2 cells
+    """
+    if thumbnail_size % HOG_CELL_SIZE or thumbnail_size < 2 * HOG_CELL_SIZE:
+        raise ValueError(f"Invalid thumbnail size {thumbnail_size}, expected a multiple of {HOG_CELL_SIZE} "
+                         f"of at least {2 * HOG_CELL_SIZE}")
+
+
+def hog_descriptor(thumbnail_size=64):
+    """
+    Returns the (cached) HOGDescriptor for square thumbnails of thumbnail_size
+    Args:
+        thumbnail_size: side of the thumbnail in pixels, see check_thumbnail_size
+
+    Returns:
+        cv2.HOGDescriptor
+    """
+    check_thumbnail_size(thumbnail_size)
+    descriptor = _descriptors.get(thumbnail_size)
+    if descriptor is None:
+        cell = (HOG_CELL_SIZE, HOG_CELL_SIZE)
+        block = (2 * HOG_CELL_SIZE, 2 * HOG_CELL_SIZE)
+        descriptor = _descriptors[thumbnail_size] = cv2.HOGDescriptor((thumbnail_size, thumbnail_size), block, cell,
+                                                                      cell, HOG_BINS)
+    return descriptor
+
+
+def hog_size(thumbnail_size=64):
+    """
+    Returns: the length of the HOG vector of a thumbnail_size thumbnail
+    """
+    return int(hog_descriptor(thumbnail_size).getDescriptorSize())
+
+
+def _gray_hog(gray, thumbnail_size):
+    # squash the image into a square thumbnail and stretch its contrast so exposure changes don't matter
+    thumbnail = cv2.resize(gray, (thumbnail_size, thumbnail_size), interpolation=cv2.INTER_AREA)
+    thumbnail = cv2.normalize(thumbnail, None, 0, 255, cv2.NORM_MINMAX)
+    return normalize(hog_descriptor(thumbnail_size).compute(thumbnail).ravel())
+
+
+def calculate_hog_vector(image, thumbnail_size=64):
+    """
+    Calculates the normalized HOG vector of an image
+    Args:
+        image: An opened cv2 image
+        thumbnail_size: side of the square thumbnail the HOG is computed on
+
+    Returns:
+        float32 numpy array of hog_size(thumbnail_size) and length 1
+    """
+    return _gray_hog(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), thumbnail_size)
+
+
+def calculate_hog_vectors(image, thumbnail_sizes=(32, 64)):
+    """
+    Calculates the normalized HOG vector of an image at several thumbnail sizes, the image is only converted to
+    grayscale once
+    Args:
+        image: An opened cv2 image
+        thumbnail_sizes: sides of the square thumbnails
+
+    Returns:
+        list of numpy arrays of length 1, one for each thumbnail size
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return [_gray_hog(gray, thumbnail_size) for thumbnail_size in thumbnail_sizes]
+
+
+def async_open_and_hogs(image_id, thumbnail_sizes=(32, 64), verify_size=None, thumbnail_cache=None):
+    # load the input image once and compute the HOG at every thumbnail size (and the verification thumbnail)
+    image_path = image_table.worker_path(image_id)
+    image, digest, header = open_image(image_path, thumbnail_cache)
+    if image is None:
+        Logger.warning(f"Failed to load image {image_path}")
+        return None
+    try:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        hog_vectors = [_gray_hog(gray, size) for size in thumbnail_sizes]
+        image_thumbnail = verification.thumbnail(gray, verify_size) if verify_size else None
+    except cv2.error:
+        Logger.warning(f'Failed to calculate HOG: {image_path}')
+        return None
+
+    return hog_vectors, image_id, image_table.stat_record(image_path, image, digest, header), image_thumbnail
@@ -0,0 +1,139 @@
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from src.image_formats import path_format_code, read_format, sniff_format
+from src.thumbnail_cache import DIGEST_SIZE
+
+# Per image information computed by the workers alongside the image features, digest is the digest of the file
+# contents when a thumbnail cache is used, width and height are the decoded pixel dimensions and format is the
+# IMAGE_FORMATS code of the file's contents (0 if unknown)
+ImageRecord = namedtuple('ImageRecord', ['ratio', 'size', 'mtime', 'digest', 'width', 'height', 'format'],
+                         defaults=(None, -1, -1, 0))
+
+
+class ImageTable:
+    """
+    Central table of every image in a search, the rest of the pipeline refers to images by their integer id
+    (the row in this table) and only resolves the path when it needs to show or touch the file.
+
+    Columns:
+        paths: list of image paths
+        ratios: float32 width / height of the image, nan until recorded
+        sizes: int64 file size in bytes, -1 until recorded
+        mtimes: float64 modification time of the file, nan until recorded
+        digests: (n, DIGEST_SIZE) uint8 digest of the file contents addressing its cached thumbnail, 0 if unknown
+        widths: int32 width of the decoded image in pixels, -1 until recorded
+        heights: int32 height of the decoded image in pixels, -1 until recorded
+        depths: int16 number of directories in the path
+        formats: uint8 code of the image format in IMAGE_FORMATS, from the file extension until the contents are
+            recorded
+    """
+    def __init__(self, image_paths):
+        self.paths = list(image_paths)
+        self.ratios = np.full(len(self.paths), np.nan, dtype=np.float32)
+        self.sizes = np.full(len(self.paths), -1, dtype=np.int64)
+        self.mtimes = np.full(len(self.paths), np.nan, dtype=np.float64)
+        self.digests = np.zeros((len(self.paths), DIGEST_SIZE), dtype=np.uint8)
+        self.widths = np.full(len(self.paths), -1, dtype=np.int32)
+        self.heights = np.full(len(self.paths), -1, dtype=np.int32)
+        # Derived from the paths once here so rules over them are array operations
+        self.depths = np.fromiter((path.count(os.sep) for path in self.paths), dtype=np.int16,
+                                  count=len(self.paths))
+        self.formats = np.fromiter(map(path_format_code, self.paths), dtype=np.uint8, count=len(self.paths))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def path(self, image_id):
+        """
+        Args:
+            image_id: id of the image
+
+        Returns: the path of the image
+        """
+        return self.paths[image_id]
+
+    def ratio(self, image_id):
+        """
+        Args:
+            image_id: id of the image
+
+        Returns: the width / height ratio of the image
+        """
+        return float(self.ratios[image_id])
+
+    def digest(self, image_id):
+        """
+        Args:
+            image_id: id of the image
+
+        Returns: the digest of the file contents as bytes, None if it was not computed
+        """
+        digest = self.digests[image_id]
+        return digest.tobytes() if digest.any() else None
+
+    def record(self, image_id, image_record):
+        """
+        Stores the information computed by a worker for an image
+
+        Args:
+            image_id: id of the image
+            image_record: ImageRecord for the image
+        """
+        self.ratios[image_id] = image_record.ratio
+        self.sizes[image_id] = image_record.size
+        self.mtimes[image_id] = image_record.mtime
+        self.widths[image_id] = image_record.width
+        self.heights[image_id] = image_record.height
+        if image_record.format:
+            self.formats[image_id] = image_record.format
+        if image_record.digest is not None:
+            self.digests[image_id] = np.frombuffer(image_record.digest, dtype=np.uint8)
+
+
+def stat_record(image_path, image, digest=None, header=None):
+    """
+    Creates the ImageRecord for an opened image
+
+    Args:
+        image_path: path the image was read from
+        image: the opened cv2 image
+        digest: digest of the file contents, None if it was not computed
+        header: first bytes of the file read with the image to sniff its format from, None to read them again
+
+    Returns:
+        ImageRecord
+    """
+    stat = os.stat(image_path)
+    height, width = image.shape[:2]
+    image_format = sniff_format(header) if header is not None else read_format(image_path)
+    return ImageRecord(ratio=width / height, size=stat.st_size, mtime=stat.st_mtime, digest=digest, width=width,
+                       height=height, format=image_format)
+
+
+# Worker side of the table, only the paths are sent to each worker once by init_worker so tasks and
+# results can be passed as image ids
+_worker_paths = []
+
+
+def init_worker(image_paths):
+    """
+    StoppablePool initializer which gives a worker process the paths of the images it will be given ids for
+
+    Args:
+        image_paths: list of image paths indexed by image id
+    """
+    global _worker_paths
+    _worker_paths = image_paths
+
+
+def worker_path(image_id):
+    """
+    Args:
+        image_id: id of the image
+
+    Returns: the path of the image in a worker initialized with init_worker
+    """
+    return _worker_paths[image_id]
@@ -1,16 +1,20 @@
 import os
 from imutils import paths
-import pickle
 
 from kivy.app import App
 from kivy.uix.widget import Widget
 from kivy.properties import StringProperty, ListProperty
 from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.clock import mainthread
 
 from src.duplicate_finder import HashDuplicateFinderController, DuplicateFinderProgressLayout, \
     DuplicateFinderEstimatingLayout, GradientDuplicateFinderController
 from src.duplicate_finder_screen import DuplicateFinderScreen
 from src.duplicate_manager_screen import DuplicateManagerScreen
+from src.frame_monitor import FrameTimeMonitor
+from src.result_store import DuplicateResultStore
+from src.thumbnail_cache import ThumbnailCache
+from src.trash import Trash, is_staged
 
 from kivy.config import Config
 from kivy import Logger
@@ -18,9 +22,10 @@ from kivy import Logger
 Config.set('graphics', 'fullscreen', '0')
 
 TESTING = False
+PROFILE_FRAMES = False  # Log the frame times of the duplicate manager when leaving it
 LARGE_IMAGE_TEST = True
-LARGE_TEST_IMAGE_FILE = "../tests/large_test_image_paths.pkl"
-SMALL_TEST_IMAGE_FILE = "../tests/small_test_image_paths.pkl"
+LARGE_TEST_IMAGE_FILE = "../tests/large_test_results.npz"
+SMALL_TEST_IMAGE_FILE = "../tests/small_test_results.npz"
 TEST_IMAGE_FILE = LARGE_TEST_IMAGE_FILE if LARGE_IMAGE_TEST else SMALL_TEST_IMAGE_FILE
 
 
@@ -55,13 +60,16 @@ class MyScreenManager(ScreenManager):
     image_paths = ListProperty()
     duplicate_images = ListProperty()
 
-    def __init__(self, **kwargs):
+    def __init__(self, thumbnail_cache=None, trash=None, **kwargs):
         super(MyScreenManager, self).__init__(**kwargs)
         self.start_screen = StartMenuScreen(name='start_menu')
-        self.loading_screen = DuplicateFinderScreen(duplicate_finder_controller=HashDuplicateFinderController(),
-                                                    duplicate_finder_layout=DuplicateFinderEstimatingLayout(),
-                                                    name='loading_screen')
-        self.manage_duplicates = DuplicateManagerScreen(name='manage_duplicates')
+        self.loading_screen = DuplicateFinderScreen(
+            duplicate_finder_controller=HashDuplicateFinderController(thumbnail_cache=thumbnail_cache),
+            duplicate_finder_layout=DuplicateFinderEstimatingLayout(),
+            name='loading_screen')
+        self.manage_duplicates = DuplicateManagerScreen(
+            name='manage_duplicates', thumbnail_cache=thumbnail_cache, trash=trash,
+            frame_monitor=FrameTimeMonitor(name='Duplicate manager frames') if PROFILE_FRAMES else None)
 
         self.add_widget(self.start_screen)
         self.add_widget(self.loading_screen)
@@ -69,10 +77,7 @@ class MyScreenManager(ScreenManager):
 
         # Set screen to start menu to start
         if TESTING:
-            with open(TEST_IMAGE_FILE, "rb") as fin:
-                test_dup_images = pickle.load(fin)
-
-            self.search_finished(test_dup_images)
+            self.results_loaded(DuplicateResultStore.load(TEST_IMAGE_FILE))
         else:
             self.current = 'start_menu'
 
@@ -82,28 +87,66 @@ class MyScreenManager(ScreenManager):
     def start_search(self, search_directory):
         Logger.info(f"Searching {search_directory} for images")
         # TODO: Add error handling
-        self.image_paths = list(paths.list_images(search_directory))
+        # Images waiting in the trash are not part of the search
+        self.image_paths = [path for path in paths.list_images(search_directory) if not is_staged(path)]
+        self.manage_duplicates.clear_groups()
         self.current = 'loading_screen'
-        self.loading_screen.start_search(self.image_paths)
+        self.manage_duplicates.image_table = self.loading_screen.start_search(self.image_paths)
+
+    def group_created(self, group_id, images):
+        self.manage_duplicates.add_group(group_id, images)
+
+    def group_grew(self, group_id, image):
+        self.manage_duplicates.grow_group(group_id, image)
+
+    def review_duplicates(self):
+        # Only leave the search once there is something to review
+        if self.manage_duplicates.has_groups():
+            self.current = 'manage_duplicates'
 
-    def search_finished(self, duplicate_images):
+    def search_finished(self, duplicate_images, image_table):
         num_duplicates = sum([len(elem) for elem in duplicate_images])
         Logger.info(f"Found {num_duplicates} duplicate images")
 
         if not TESTING and num_duplicates > 0:
             Logger.debug(f"Saving duplicate images to {TEST_IMAGE_FILE}")
-            with open(TEST_IMAGE_FILE, "wb") as fout:
-                pickle.dump(list(duplicate_images), fout)
+            DuplicateResultStore.from_groups(duplicate_images, image_table).save(TEST_IMAGE_FILE)
 
+        self._show_finished_groups(duplicate_images, image_table)
+
+    @mainthread
+    def _show_finished_groups(self, duplicate_images, image_table):
+        # on_finish is dispatched on the finder thread, running on the main thread puts this after the group events
+        # the finder queued there before it finished
         self.duplicate_images = duplicate_images
         # TODO: Add error handling
-        self.manage_duplicates.duplicate_images = self.duplicate_images
+        # Groups which were streamed in during the search are already shown (and possibly reviewed), they are handed
+        # to the adapter with their removals and selection so they can be sorted and windowed too
+        if self.manage_duplicates.has_groups():
+            self.manage_duplicates.finish_streaming(self.duplicate_images)
+        else:
+            self.manage_duplicates.image_table = image_table
+            self.manage_duplicates.duplicate_images = self.duplicate_images
+        self.current = 'manage_duplicates'
+
+    def results_loaded(self, result_store):
+        Logger.info(f"Loaded {result_store.num_images} duplicate images in {len(result_store)} groups")
+        # Groups are paged into the manager from the store as they are scrolled to
+        self.manage_duplicates.result_store = result_store
         self.current = 'manage_duplicates'
 
 
 class DuplicateImageApp(App):
     def build(self):
-        return MyScreenManager()
+        # Thumbnails the search writes so the manager never has to decode the full resolution originals
+        thumbnail_cache = ThumbnailCache(os.path.join(self.user_data_dir, 'thumbnails'))
+        # Removed images wait in the trash until the app closes so they can be restored
+        self.trash = Trash(os.path.join(self.user_data_dir, 'trash'))
+        return MyScreenManager(thumbnail_cache=thumbnail_cache, trash=self.trash)
+
+    def on_stop(self):
+        self.trash.purge()
+        self.trash.wait()
 
 
 if __name__ == '__main__':
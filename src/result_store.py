@@ -0,0 +1,210 @@
+import os
+
+import numpy as np
+
+from src.image_formats import path_format_code
+from src.thumbnail_cache import DIGEST_SIZE
+
+# TODO: Store the results next to the searched directory so a session can be resumed from the start menu
+
+# Per path metadata columns copied from the ImageTable, with their dtype and the value of an unknown entry
+METADATA_COLUMNS = {'sizes': (np.int64, -1), 'mtimes': (np.float64, np.nan), 'widths': (np.int32, -1),
+                    'heights': (np.int32, -1), 'formats': (np.uint8, 0)}
+
+
+class DuplicateResultStore:
+    """
+    Compact columnar storage for the results of a duplicate search.
+
+    Instead of a list of lists of images the groups are stored as:
+        paths: every distinct path once, utf-8 encoded into one byte blob with an offsets array
+        ratios: float32 image ratio for each path
+        digests: (paths, DIGEST_SIZE) uint8 digest of each file addressing its cached thumbnail, 0 if unknown
+        sizes, mtimes, widths, heights, formats: metadata of each path, the same columns as the ImageTable
+        depths: int16 number of directories in each path, derived from the paths
+        path_ids: int32 index into the path table for each member of each group
+        group_offsets: int64 offsets into path_ids, group i is path_ids[group_offsets[i]:group_offsets[i + 1]]
+
+    Paths are only decoded when they are requested, so loading a previous session only reads a handful of arrays.
+    The store resolves its path ids with ``path`` and ``ratio`` the same way an ImageTable resolves image ids and
+    has the same metadata columns, so it can be given to the manager and to SelectionRules in place of the table.
+
+    Usage:
+    >>> from src.image_table import ImageTable
+    >>> table = ImageTable(["a.jpg", "b.jpg", "c.jpg"])
+    >>> store = DuplicateResultStore.from_groups([[0, 2]], table)
+    >>> store.save("results.npz")
+    >>> store = DuplicateResultStore.load("results.npz")
+    >>> [store.path(path_id) for path_id in store.group_ids(0)]
+    ['a.jpg', 'c.jpg']
+    """
+    def __init__(self, path_blob, path_offsets, ratios, path_ids, group_offsets, digests=None, **metadata):
+        """
+
+        Args:
+            digests: digest column, None if the digests are unknown
+            **metadata: columns of METADATA_COLUMNS, missing columns are unknown
+        """
+        self.path_blob = path_blob
+        self.path_offsets = path_offsets
+        self.ratios = ratios
+        self.path_ids = path_ids
+        self.group_offsets = group_offsets
+        if digests is None:
+            digests = np.zeros((len(ratios), DIGEST_SIZE), dtype=np.uint8)
+        self.digests = digests
+
+        for name in metadata:
+            if name not in METADATA_COLUMNS:
+                raise ValueError(f"Invalid metadata column {name}, expected one of {list(METADATA_COLUMNS)}")
+        for name, (dtype, unknown) in METADATA_COLUMNS.items():
+            column = metadata.get(name)
+            setattr(self, name, np.full(len(ratios), unknown, dtype=dtype) if column is None else column)
+        if metadata.get('formats') is None:
+            # Fall back to the format the extensions claim
+            self.formats = np.fromiter((path_format_code(self.path(path_id)) for path_id in range(len(ratios))),
+                                       dtype=np.uint8, count=len(ratios))
+
+        # Separators counted over the blob at once, without decoding the paths
+        separators = np.concatenate([[0], np.cumsum(self.path_blob == ord(os.sep), dtype=np.int32)])
+        self.depths = (separators[self.path_offsets[1:]] - separators[self.path_offsets[:-1]]).astype(np.int16)
+
+    @classmethod
+    def from_groups(cls, duplicate_images, image_table):
+        """
+        Builds a store from the ``duplicate_images`` and ``image_table`` of a DuplicateFinderController,
+        only the images which are in a group are kept
+
+        Args:
+            duplicate_images: list of lists of image ids
+            image_table: ImageTable the image ids index into
+
+        Returns:
+            DuplicateResultStore holding the groups
+        """
+        path_index = dict()
+        encoded_paths = []
+        image_ids = []  # Image id of each path id
+        path_ids = []
+        group_offsets = [0]
+
+        for group in duplicate_images:
+            for image_id in group:
+                path_id = path_index.get(image_id)
+                if path_id is None:
+                    path_id = path_index[image_id] = len(encoded_paths)
+                    encoded_paths.append(image_table.path(image_id).encode('utf-8'))
+                    image_ids.append(image_id)
+                path_ids.append(path_id)
+            group_offsets.append(len(path_ids))
+
+        path_offsets = np.zeros(len(encoded_paths) + 1, dtype=np.int64)
+        np.cumsum([len(path) for path in encoded_paths], out=path_offsets[1:])
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+
+        return cls(path_blob=np.frombuffer(b"".join(encoded_paths), dtype=np.uint8),
+                   path_offsets=path_offsets,
+                   ratios=image_table.ratios[image_ids].astype(np.float32),
+                   path_ids=np.asarray(path_ids, dtype=np.int32),
+                   group_offsets=np.asarray(group_offsets, dtype=np.int64),
+                   digests=image_table.digests[image_ids].reshape(-1, DIGEST_SIZE),
+                   **{name: getattr(image_table, name)[image_ids].astype(dtype)
+                      for name, (dtype, _) in METADATA_COLUMNS.items()})
+
+    def save(self, file):
+        """
+        Writes the store to an uncompressed .npz file
+
+        Args:
+            file: file name or open binary file
+        """
+        np.savez(file, path_blob=self.path_blob, path_offsets=self.path_offsets, ratios=self.ratios,
+                 path_ids=self.path_ids, group_offsets=self.group_offsets, digests=self.digests,
+                 **{name: getattr(self, name) for name in METADATA_COLUMNS})
+
+    @classmethod
+    def load(cls, file):
+        """
+        Reads a store written by save, no groups are decoded until they are requested
+
+        Args:
+            file: file name or open binary file
+
+        Returns:
+            DuplicateResultStore
+        """
+        with np.load(file, allow_pickle=False) as data:
+            # Stores saved before digests (or metadata) were kept have no thumbnails (or unknown metadata)
+            digests = data['digests'] if 'digests' in data.files else None
+            metadata = {name: data[name] for name in METADATA_COLUMNS if name in data.files}
+            return cls(path_blob=data['path_blob'], path_offsets=data['path_offsets'], ratios=data['ratios'],
+                       path_ids=data['path_ids'], group_offsets=data['group_offsets'], digests=digests, **metadata)
+
+    def __len__(self):
+        return len(self.group_offsets) - 1
+
+    @property
+    def num_images(self):
+        """
+        Returns: the total number of images over all groups
+        """
+        return int(self.group_offsets[-1])
+
+    def path(self, path_id):
+        """
+        Decodes a single path from the path table
+
+        Args:
+            path_id: index into the path table
+
+        Returns:
+            the path as a string
+        """
+        start, end = self.path_offsets[path_id], self.path_offsets[path_id + 1]
+        return self.path_blob[start:end].tobytes().decode('utf-8')
+
+    def ratio(self, path_id):
+        """
+        Args:
+            path_id: index into the path table
+
+        Returns: the width / height ratio of the image
+        """
+        return float(self.ratios[path_id])
+
+    def digest(self, path_id):
+        """
+        Args:
+            path_id: index into the path table
+
+        Returns: the digest of the file contents as bytes, None if it was not computed
+        """
+        digest = self.digests[path_id]
+        return digest.tobytes() if digest.any() else None
+
+    def group_ids(self, group_id):
+        """
+        Args:
+            group_id: index of the group
+
+        Returns:
+            array of the path ids in the group
+        """
+        if group_id < 0 or group_id >= len(self):
+            raise IndexError(f"Invalid group index of {group_id} with {len(self)} groups")
+
+        return self.path_ids[self.group_offsets[group_id]:self.group_offsets[group_id + 1]]
+
+    def groups(self, start=0, stop=None):
+        """
+        Decodes a range of groups into paths
+
+        Args:
+            start: index of the first group
+            stop: index after the last group, None for all remaining groups
+
+        Returns:
+            list of lists of paths
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        return [[self.path(path_id) for path_id in self.group_ids(group_id)] for group_id in range(start, stop)]
@@ -0,0 +1,195 @@
+import itertools
+
+import numpy as np
+
+from src.image_formats import IMAGE_FORMATS, format_code
+
+# Metadata columns rules can be evaluated on, computed from an ImageTable (or anything with the same columns)
+# for the image ids being resolved, unknown values are nan
+
+
+def _resolution(table, image_ids):
+    pixels = table.widths[image_ids].astype(np.float64) * table.heights[image_ids]
+    return np.where(table.widths[image_ids] < 0, np.nan, pixels)
+
+
+def _file_size(table, image_ids):
+    sizes = table.sizes[image_ids].astype(np.float64)
+    return np.where(sizes < 0, np.nan, sizes)
+
+
+def _mtime(table, image_ids):
+    return table.mtimes[image_ids].astype(np.float64)
+
+
+def _path_depth(table, image_ids):
+    return table.depths[image_ids].astype(np.float64)
+
+
+COLUMNS = {'resolution': _resolution, 'file_size': _file_size, 'mtime': _mtime, 'path_depth': _path_depth}
+
+# Rule name to the column it compares and whether the image with the largest ('max') or smallest ('min') value is
+# kept, 'format' is the rank of the image's format in the rules' format preference
+RULES = {
+    'highest_resolution': ('resolution', 'max'),
+    'lowest_resolution': ('resolution', 'min'),
+    'largest_file': ('file_size', 'max'),
+    'smallest_file': ('file_size', 'min'),
+    'oldest': ('mtime', 'min'),
+    'newest': ('mtime', 'max'),
+    'shallowest_path': ('path_depth', 'min'),
+    'deepest_path': ('path_depth', 'max'),
+    'preferred_format': ('format', 'min'),
+}
+
+DEFAULT_RULES = ('highest_resolution', 'largest_file', 'oldest')
+# Lossless formats first, formats which are not listed rank last
+DEFAULT_FORMAT_PREFERENCE = ('png', 'tiff', 'bmp', 'webp', 'jpeg', 'gif')
+
+
+def flatten_groups(groups):
+    """
+    Packs a list of groups of image ids the way DuplicateResultStore stores them
+
+    Args:
+        groups: list of lists of image ids
+
+    Returns:
+        (image_ids, group_offsets), group i is image_ids[group_offsets[i]:group_offsets[i + 1]]
+    """
+    group_offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter(map(len, groups), dtype=np.int64, count=len(groups)), out=group_offsets[1:])
+    image_ids = np.fromiter(itertools.chain.from_iterable(groups), dtype=np.int64, count=int(group_offsets[-1]))
+    return image_ids, group_offsets
+
+
+def selected_positions(selected, group_offsets):
+    """
+    Converts a selection mask over packed groups to the positions selected in each group
+
+    Args:
+        selected: boolean array over the members of the packed groups
+        group_offsets: offsets of the groups from flatten_groups
+
+    Returns:
+        dictionary of group index to the set of positions of its selected members, groups without a selection are
+        left out
+    """
+    members = np.flatnonzero(selected)
+    groups = np.searchsorted(group_offsets, members, side='right') - 1
+    positions = members - group_offsets[groups]
+    selection = dict()
+    for group, position in zip(groups.tolist(), positions.tolist()):
+        selection.setdefault(group, set()).add(position)
+    return selection
+
+
+class SelectionRules:
+    """
+    Resolves duplicate groups in bulk by keeping one image of every group and selecting the rest for removal.
+
+    The kept image is the best by the first rule, ties are broken by the next rule and so on, remaining ties keep
+    the first image of the group. Images with unknown metadata lose to every image with known metadata. Every group
+    is resolved at once, each rule narrows the candidates of all groups with one minimum.reduceat over the packed
+    groups, so no sort is needed.
+
+    Usage:
+    >>> from src.image_table import ImageTable, ImageRecord
+    >>> table = ImageTable(['a.jpg', 'b.png', 'c.jpg'])
+    >>> for image_id, width in enumerate([100, 200, 200]):
+    ...     table.record(image_id, ImageRecord(ratio=1, size=10, mtime=image_id, width=width, height=width))
+    >>> SelectionRules(['highest_resolution', 'newest']).select([0, 1, 2], [0, 3], table).tolist()
+    [True, True, False]
+    """
+    def __init__(self, rules=DEFAULT_RULES, format_preference=DEFAULT_FORMAT_PREFERENCE):
+        """
+
+        Args:
+            rules: names of rules in RULES, most important first
+            format_preference: formats (or file extensions) for the 'preferred_format' rule, most preferred first
+        """
+        rules = tuple(rules)
+        if not rules:
+            raise ValueError("Cannot select images without any rules")
+        for rule in rules:
+            if rule not in RULES:
+                raise ValueError(f"Invalid rule {rule}, expected one of {list(RULES)}")
+
+        self.rules = rules
+        self.format_preference = tuple(format_preference)
+        # Rank of every format code, formats which are not listed (and unknown formats) rank last
+        self._format_ranks = np.full(len(IMAGE_FORMATS), len(self.format_preference), dtype=np.float64)
+        for rank, image_format in reversed(list(enumerate(self.format_preference))):
+            code = format_code(image_format)
+            if not code:
+                raise ValueError(f"Invalid format {image_format}, expected one of {list(IMAGE_FORMATS[1:])}")
+            self._format_ranks[code] = rank
+
+    def keys(self, image_ids, table):
+        """
+        Computes the sort key of every rule, smaller keys are better
+
+        Args:
+            image_ids: int array of image ids
+            table: ImageTable the image ids index into
+
+        Returns:
+            list of float64 arrays, one per rule in order of importance
+        """
+        keys = []
+        for rule in self.rules:
+            column, prefer = RULES[rule]
+            if column == 'format':
+                values = self._format_ranks[table.formats[image_ids]]
+            else:
+                values = COLUMNS[column](table, image_ids)
+            if prefer == 'max':
+                values = -values
+            keys.append(np.where(np.isnan(values), np.inf, values))
+        return keys
+
+    def select(self, image_ids, group_offsets, table):
+        """
+        Selects every image but the best one of each group
+
+        Args:
+            image_ids: int array of the image ids of every group packed together
+            group_offsets: int array of offsets, group i is image_ids[group_offsets[i]:group_offsets[i + 1]]
+            table: ImageTable the image ids index into
+
+        Returns:
+            boolean array over image_ids, True for the images selected for removal
+        """
+        image_ids = np.asarray(image_ids, dtype=np.int64)
+        group_offsets = np.asarray(group_offsets, dtype=np.int64)
+        selected = np.ones(len(image_ids), dtype=bool)
+        group_sizes = np.diff(group_offsets)
+        # reduceat needs non empty groups
+        starts = group_offsets[:-1][group_sizes > 0]
+        if not len(starts):
+            return selected
+        groups = np.repeat(np.arange(len(starts)), group_sizes[group_sizes > 0])
+
+        candidates = np.ones(len(image_ids), dtype=bool)
+        for key in self.keys(image_ids, table):
+            key = np.where(candidates, key, np.inf)
+            candidates &= key == np.minimum.reduceat(key, starts)[groups]
+
+        # Remaining ties keep the first candidate of the group
+        keepers = np.minimum.reduceat(np.where(candidates, np.arange(len(image_ids)), len(image_ids)), starts)
+        selected[keepers] = False
+        return selected
+
+    def select_groups(self, groups, table):
+        """
+        Selects every image but the best one of each group
+
+        Args:
+            groups: list of lists of image ids
+            table: ImageTable the image ids index into
+
+        Returns:
+            dictionary of group index to the set of positions of its images selected for removal
+        """
+        image_ids, group_offsets = flatten_groups(groups)
+        return selected_positions(self.select(image_ids, group_offsets, table), group_offsets)
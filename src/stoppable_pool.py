@@ -9,13 +9,18 @@ import time
 
 
 class StoppableConsumer(mp.Process):
-    def __init__(self, input_queue, result_queue, finish_flag, **kwargs):
+    def __init__(self, input_queue, result_queue, finish_flag, initializer=None, initargs=(), **kwargs):
         super().__init__(**kwargs)
         self.input_queue = input_queue
         self.result_queue = result_queue
         self.finish_flag = finish_flag
+        self.initializer = initializer
+        self.initargs = initargs
 
     def run(self) -> None:
+        if self.initializer is not None:
+            self.initializer(*self.initargs)
+
         while True:
             try:
                 task = self.input_queue.get(timeout=0.1)
@@ -39,8 +44,11 @@ class StoppablePool:
     >>> data = [(1,2), (3,4), (4,5), (5,6)]
     >>> for result in StoppablePool(add, data):
     ...     print(result)
+
+    Data shared by every task can be handed to each worker once with ``initializer(*initargs)``,
+    which is called at the start of each worker process, instead of being pickled into every task.
     """
-    def __init__(self, fn, args, num_workers=4):
+    def __init__(self, fn, args, num_workers=4, initializer=None, initargs=()):
         # Create all the tasks
         self._tasks = [partial(fn, *elem) for elem in args]
         self._processes = []
@@ -53,6 +61,9 @@ class StoppablePool:
         self._num_output_data_received = 0
         # Set the number of workers
         self._num_workers = min(num_workers, len(args))
+        # Set the worker initialization
+        self._initializer = initializer
+        self._initargs = initargs
 
     def __iter__(self):
         if not self._processes:
@@ -60,8 +71,9 @@ class StoppablePool:
             [self._input_queue.put(elem) for elem in self._tasks[:self._num_workers]]
             self._num_input_data_given = self._num_workers
             # Create the processes
-            self._processes = [StoppableConsumer(self._input_queue, self._output_queue, finish_flag=self._finish_flag) for
-                               i in range(self._num_workers)]
+            self._processes = [StoppableConsumer(self._input_queue, self._output_queue, finish_flag=self._finish_flag,
+                                                 initializer=self._initializer, initargs=self._initargs)
+                               for i in range(self._num_workers)]
             # Start the processes
             [process.start() for process in self._processes]
 
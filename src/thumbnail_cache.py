@@ -0,0 +1,199 @@
+import hashlib
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from kivy.logger import Logger
+
+from src.image_formats import HEADER_SIZE
+
+DIGEST_SIZE = 16  # Bytes of the blake2b digest of an image file which address its thumbnail
+
+
+def file_digest(data):
+    """
+    Args:
+        data: bytes (or uint8 array) of an image file
+
+    Returns:
+        the DIGEST_SIZE byte blake2b digest of the file contents
+    """
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def open_image(image_path, thumbnail_cache=None):
+    """
+    Reads an image, when a cache is given the file contents are also hashed and a thumbnail is written for them,
+    reusing the decode the caller needs anyway
+
+    Args:
+        image_path: path of the image
+        thumbnail_cache: ThumbnailCache to write the thumbnail into, None to only read the image
+
+    Returns:
+        (image, digest, header), image is None if the file could not be read or decoded, digest is None without a
+        cache and header is the first HEADER_SIZE bytes of the file to sniff its format from
+    """
+    try:
+        data = np.fromfile(image_path, dtype=np.uint8)
+    except OSError:
+        return None, None, None
+    image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if image is None:
+        return None, None, None
+    header = data[:HEADER_SIZE].tobytes()
+    if thumbnail_cache is None:
+        return image, None, header
+
+    digest = file_digest(data)
+    try:
+        thumbnail_cache.put(digest, image)
+    except (OSError, cv2.error):
+        # The original is shown instead
+        Logger.warning(f"Failed to cache thumbnail of {image_path}")
+    return image, digest, header
+
+
+class ThumbnailCache:
+    """
+    On disk cache of small thumbnails addressed by the digest of the original file's contents, so renamed or
+    copied images share a thumbnail and an edited image gets a new one.
+
+    Thumbnails are written by the search workers from the image they already decoded and are shown by the manager
+    instead of the full resolution originals. The modification time of a thumbnail is its last use, ``evict``
+    removes the least recently used thumbnails once the cache is over ``max_bytes``.
+
+    Layout: ``directory/<first two hex digits>/<hex digest><extension>``
+    """
+    def __init__(self, directory, max_bytes=256 * 2 ** 20, height=256, extension='.jpg', quality=85):
+        """
+
+        Args:
+            directory: directory holding the cache, created if it does not exist
+            max_bytes: size the cache is evicted down to
+            height: height of the thumbnails, smaller images are not enlarged
+            extension: '.jpg' or '.webp'
+            quality: encoder quality from 0 to 100
+        """
+        if extension not in ('.jpg', '.webp'):
+            raise ValueError(f"Invalid thumbnail extension {extension}, expected '.jpg' or '.webp'")
+        if max_bytes < 0:
+            raise ValueError("Cannot create a thumbnail cache with a negative size")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.height = height
+        self.extension = extension
+        self.quality = quality
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest):
+        """
+        Args:
+            digest: digest of the original file from file_digest
+
+        Returns:
+            the path the thumbnail of the file is stored at
+        """
+        hex_digest = digest.hex()
+        return os.path.join(self.directory, hex_digest[:2], hex_digest + self.extension)
+
+    def get(self, digest):
+        """
+        Looks up a thumbnail and marks it as used
+
+        Args:
+            digest: digest of the original file
+
+        Returns:
+            the path of the thumbnail, None if it is not cached
+        """
+        path = self.path(digest)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, digest, image):
+        """
+        Writes the thumbnail of a decoded image unless it is already cached, safe to call from several processes
+
+        Args:
+            digest: digest of the original file
+            image: the decoded BGR image
+
+        Returns:
+            the path of the thumbnail
+
+        Raises:
+            OSError: if the thumbnail could not be encoded or written, nothing is cached then
+        """
+        path = self.get(digest)
+        if path is not None:
+            return path
+
+        path = self.path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        height, width = image.shape[:2]
+        # Keep panoramas legible by bounding the width as well
+        scale = min(self.height / height, 4 * self.height / width, 1)
+        thumbnail = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        quality_flag = cv2.IMWRITE_JPEG_QUALITY if self.extension == '.jpg' else cv2.IMWRITE_WEBP_QUALITY
+
+        # Write to a temporary file and rename it so readers never see a partial thumbnail
+        fd, temporary_path = tempfile.mkstemp(suffix=self.extension, dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            # imwrite reports encoder failures by returning False, caching the empty file would show a blank thumbnail
+            if not cv2.imwrite(temporary_path, thumbnail, [quality_flag, self.quality]):
+                raise OSError(f"Failed to encode thumbnail {path}")
+            os.replace(temporary_path, path)
+        except (OSError, cv2.error):
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise
+        return path
+
+    def _entries(self):
+        """
+        Returns: list of (last use, size, path) of every file in the cache
+        """
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """
+        Returns: the number of bytes of thumbnails in the cache
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        Removes the least recently used thumbnails until the cache is at most max_bytes
+
+        Returns:
+            the number of bytes removed
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total - removed <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            removed += size
+        return removed
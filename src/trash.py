@@ -0,0 +1,271 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from kivy.clock import mainthread
+from kivy.event import EventDispatcher
+from kivy.logger import Logger
+
+TRASH_DIRECTORY_NAME = '.duplicate_trash'  # Staging directory created next to trashed images
+
+# Images moved to the trash together, moves is a list of (original path, staged path) of the images which were moved
+TrashBatch = namedtuple('TrashBatch', ['batch_id', 'moves'])
+
+
+def staging_directory(path, batch_id):
+    """
+    Args:
+        path: path of an image
+        batch_id: id of the batch the image is trashed in
+
+    Returns:
+        the directory the image is staged in, next to the image so staging is a rename on the same filesystem
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), TRASH_DIRECTORY_NAME, batch_id)
+
+
+def is_staged(path):
+    """
+    Returns: True if the path is inside a staging directory
+    """
+    return TRASH_DIRECTORY_NAME in os.path.normpath(path).split(os.sep)
+
+
+def _remove_empty_directories(directory):
+    # Removes the batch's staging directory and the trash directory above it, the image's directory is kept
+    for path in (directory, os.path.dirname(directory)):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+
+
+class Trash(EventDispatcher):
+    """
+    Deletes images on a background thread by moving them into staging directories, so a mass cleanup never blocks
+    the UI and can be undone until the trash is purged.
+
+    Every image is renamed into ``<its directory>/.duplicate_trash/<batch id>/``, which stays on the same
+    filesystem, so even on a network share trashing is a metadata operation instead of a copy. Before a batch is
+    moved its moves are written to a journal, batches left over from a previous session are loaded from it so they
+    can still be undone or purged.
+
+    Jobs run in the order they are requested, so an undo or purge requested right after a trash waits for it.
+
+    Events (dispatched on the main thread):
+        on_progress(action, done, total): every progress_interval images and when a job finishes, action is
+            'trash', 'restore' or 'purge'
+        on_trashed(batch), on_restored(batch), on_purged(batches): when a job finishes
+    """
+    __events__ = ('on_progress', 'on_trashed', 'on_restored', 'on_purged')
+
+    def __init__(self, journal_directory, progress_interval=64, **kwargs):
+        """
+
+        Args:
+            journal_directory: directory the journal of each batch is written to, created if it does not exist
+            progress_interval: number of images between progress events
+        """
+        super(Trash, self).__init__(**kwargs)
+        self.journal_directory = journal_directory
+        self.progress_interval = progress_interval
+        os.makedirs(journal_directory, exist_ok=True)
+
+        self.batches = self._load_journal()  # Undo stack of batches, most recent last
+        if self.batches:
+            Logger.info(f"Trash: {sum(len(batch.moves) for batch in self.batches)} images left in the trash by a "
+                        f"previous session")
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._last_batch_time = 0
+
+    # Controls #
+    def trash(self, paths):
+        """ Moves images to the trash in the background
+
+        Args:
+            paths: paths of the images
+
+        Returns:
+            the id of the batch, used to undo it
+        """
+        # Ids sort in creation order
+        batch_id = str(max(time.time_ns(), self._last_batch_time + 1))
+        self._last_batch_time = int(batch_id)
+        batch = TrashBatch(batch_id, [])
+        self.batches.append(batch)
+        self._submit(self._trash_batch, batch, list(paths))
+        return batch_id
+
+    def undo(self, batch_id=None):
+        """ Restores the images of a batch to where they were in the background
+
+        Args:
+            batch_id: id of the batch to restore, None for the most recent batch
+
+        Returns:
+            True if the batch is in the trash and will be restored
+        """
+        batch = self._pop_batch(batch_id)
+        if batch is None:
+            return False
+        self._submit(self._restore_batch, batch)
+        return True
+
+    def purge(self):
+        """ Permanently deletes every image in the trash in the background
+        """
+        batches, self.batches = self.batches, []
+        self._submit(self._purge_batches, batches)
+
+    def has_batch(self, batch_id):
+        """
+        Returns: True if the batch is in the trash and can be undone
+        """
+        return any(batch.batch_id == batch_id for batch in self.batches)
+
+    def wait(self):
+        """ Blocks until every requested job is done
+        """
+        self._jobs.join()
+
+    # Worker #
+    def _submit(self, fn, *args):
+        self._jobs.put((fn, args))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            fn, args = self._jobs.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                Logger.error(f"Trash: {fn.__name__} failed: {e}")
+            finally:
+                self._jobs.task_done()
+
+    def _trash_batch(self, batch, paths):
+        # Write the plan before moving anything so an interrupted batch can still be restored
+        planned = [(path, os.path.join(staging_directory(path, batch.batch_id), os.path.basename(path)))
+                   for path in paths]
+        self._write_journal(batch.batch_id, planned)
+
+        created = set()
+        for done, (path, staged_path) in enumerate(planned, 1):
+            directory = os.path.dirname(staged_path)
+            try:
+                if directory not in created:
+                    os.makedirs(directory, exist_ok=True)
+                    created.add(directory)
+                os.rename(path, staged_path)
+                batch.moves.append((path, staged_path))
+            except OSError as e:
+                Logger.warning(f"Trash: failed to move {path} to the trash: {e}")
+            self._report_progress('trash', done, len(planned))
+
+        self._write_journal(batch.batch_id, batch.moves)
+        self._dispatch('on_trashed', batch)
+
+    def _restore_batch(self, batch):
+        for done, (path, staged_path) in enumerate(batch.moves, 1):
+            if os.path.exists(path):
+                Logger.warning(f"Trash: not restoring {path}, a file was created in its place")
+            else:
+                try:
+                    os.rename(staged_path, path)
+                except OSError as e:
+                    Logger.warning(f"Trash: failed to restore {path}: {e}")
+            self._report_progress('restore', done, len(batch.moves))
+
+        self._clean_up(batch)
+        self._dispatch('on_restored', batch)
+
+    def _purge_batches(self, batches):
+        total = sum(len(batch.moves) for batch in batches)
+        done = 0
+        for batch in batches:
+            for _, staged_path in batch.moves:
+                try:
+                    os.remove(staged_path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    Logger.warning(f"Trash: failed to delete {staged_path}: {e}")
+                done += 1
+                self._report_progress('purge', done, total)
+            self._clean_up(batch)
+        self._dispatch('on_purged', batches)
+
+    def _clean_up(self, batch):
+        for directory in {os.path.dirname(staged_path) for _, staged_path in batch.moves}:
+            _remove_empty_directories(directory)
+        try:
+            os.remove(self._journal_path(batch.batch_id))
+        except OSError:
+            pass
+
+    def _report_progress(self, action, done, total):
+        if done == total or done % self.progress_interval == 0:
+            self._dispatch('on_progress', action, done, total)
+
+    @mainthread
+    def _dispatch(self, event, *args):
+        self.dispatch(event, *args)
+
+    # Journal #
+    def _journal_path(self, batch_id):
+        return os.path.join(self.journal_directory, batch_id + '.json')
+
+    def _write_journal(self, batch_id, moves):
+        temporary_path = self._journal_path(batch_id) + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump([list(move) for move in moves], f)
+        os.replace(temporary_path, self._journal_path(batch_id))
+
+    def _load_journal(self):
+        batches = []
+        for name in sorted(os.listdir(self.journal_directory)):
+            batch_id, extension = os.path.splitext(name)
+            if extension != '.json':
+                continue
+            try:
+                with open(os.path.join(self.journal_directory, name)) as f:
+                    moves = [tuple(move) for move in json.load(f)]
+            except (OSError, ValueError):
+                Logger.warning(f"Trash: skipping unreadable journal {name}")
+                continue
+            # Only the images which made it into the trash before the session ended
+            batches.append(TrashBatch(batch_id, [move for move in moves if os.path.exists(move[1])]))
+        return batches
+
+    def _pop_batch(self, batch_id):
+        for i in range(len(self.batches) - 1, -1, -1):
+            if batch_id is None or self.batches[i].batch_id == batch_id:
+                return self.batches.pop(i)
+        return None
+
+    # Events #
+    def on_progress(self, action, done, total):
+        """ Default progress handler
+        """
+        pass
+
+    def on_trashed(self, batch):
+        """ Default trashed handler
+        """
+        pass
+
+    def on_restored(self, batch):
+        """ Default restored handler
+        """
+        pass
+
+    def on_purged(self, batches):
+        """ Default purged handler
+        """
+        pass
@@ -0,0 +1,155 @@
+import numpy as np
+
+
+class UnionFind:
+    """
+    Union find (disjoint set) over the integers [0, n) backed by numpy arrays, with path halving, union by size
+    and a bulk union of an array of edges.
+
+    Usage:
+    >>> union_find = UnionFind(5)
+    >>> union_find.union_many([(0, 1), (3, 4), (1, 4)])
+    >>> [component.tolist() for component in union_find.components(min_size=2)]
+    [[0, 1, 3, 4]]
+    """
+    def __init__(self, n):
+        """
+
+        Args:
+            n: number of elements
+        """
+        if not isinstance(n, (int, np.integer)) or n < 0:
+            raise ValueError("n must be a non-negative integer")
+        self.parent = np.arange(n, dtype=np.int64)
+        self.size = np.ones(n, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def find(self, i):
+        """ Finds the root of element i, halving the path to it on the way
+
+        Args:
+            i: element to find
+
+        Returns:
+            the root of the set containing i
+        """
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return int(i)
+
+    def union(self, a, b):
+        """ Merges the sets containing a and b, the smaller set is attached to the larger one
+
+        Args:
+            a: element of the first set
+            b: element of the second set
+
+        Returns:
+            True if the sets were merged, False if a and b were already in the same set
+        """
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return True
+
+    def connected(self, a, b):
+        """
+        Returns: True if a and b are in the same set
+        """
+        return self.find(a) == self.find(b)
+
+    def find_many(self, elements):
+        """ Finds the roots of an array of elements, compressing each element's path to point at its root
+
+        Args:
+            elements: array of elements
+
+        Returns:
+            int64 array of the root of each element
+        """
+        elements = np.asarray(elements, dtype=np.int64)
+        parent = self.parent
+        roots = parent[elements]
+        while True:
+            grandparents = parent[roots]
+            if np.array_equal(grandparents, roots):
+                return roots
+            parent[elements] = grandparents
+            roots = grandparents
+
+    def union_many(self, edges, batch_size=8192):
+        """ Merges the sets of both ends of every edge
+
+        Edges are merged batch_size at a time, most edges of a later batch are then already inside one set and
+        drop out after a single vectorized find.
+
+        Args:
+            edges: (m, 2) array of element pairs
+            batch_size: number of edges merged at a time
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        for start in range(0, len(edges), batch_size):
+            self._union_batch(edges[start:start + batch_size, 0], edges[start:start + batch_size, 1])
+
+    def _union_batch(self, a, b):
+        """ Merges the sets of a[k] and b[k] for every k
+
+        Each round hooks the root of the smaller set of each unmerged edge onto the root of the larger set, a root
+        is hooked at most once per round and never onto a root which is itself being hooked so sizes stay exact,
+        edges which lose out are retried in the next round.
+        """
+        while len(a):
+            root_a, root_b = self.find_many(a), self.find_many(b)
+            unmerged = root_a != root_b
+            a, b, root_a, root_b = a[unmerged], b[unmerged], root_a[unmerged], root_b[unmerged]
+            if not len(a):
+                return
+
+            # Orient every edge from the smaller to the larger set (ties broken by index), a strict order
+            # so the hooks of a round can never form a cycle
+            size_a, size_b = self.size[root_a], self.size[root_b]
+            a_smaller = (size_a < size_b) | ((size_a == size_b) & (root_a < root_b))
+            children = np.where(a_smaller, root_a, root_b)
+            targets = np.where(a_smaller, root_b, root_a)
+
+            # Hook each child once, onto a target which isn't a child this round
+            children, first = np.unique(children, return_index=True)
+            targets = targets[first]
+            hook = ~np.isin(targets, children)
+            children, targets = children[hook], targets[hook]
+
+            self.parent[children] = targets
+            np.add.at(self.size, targets, self.size[children])
+
+    def labels(self):
+        """
+        Returns: int64 array of the root of every element
+        """
+        return self.find_many(np.arange(len(self.parent)))
+
+    def components(self, min_size=1):
+        """ Extracts the sets by sorting the elements by their root
+
+        Args:
+            min_size: smallest set to return
+
+        Returns:
+            list of int64 arrays of the elements in each set, ordered by their smallest element
+        """
+        labels = self.labels()
+        order = np.argsort(labels, kind='stable')
+        _, starts, counts = np.unique(labels[order], return_index=True, return_counts=True)
+
+        keep = counts >= min_size
+        starts, ends = starts[keep], (starts + counts)[keep]
+        # Stable sort keeps each component ascending, so its first element is its smallest
+        by_smallest = np.argsort(order[starts], kind='stable')
+        return [order[starts[i]:ends[i]] for i in by_smallest]
@@ -0,0 +1,268 @@
+import os
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+import cv2
+import numpy as np
+from kivy.logger import Logger
+
+THUMBNAIL_SIZE = 64  # Side of the square grayscale thumbnails candidates are verified on
+DEFAULT_RAM_BUDGET = 256 * 2 ** 20  # Bytes of thumbnails kept in memory, about 65k images at 64x64
+
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+_SSIM_WINDOW = 7  # Side of the gaussian window local SSIM statistics are computed over
+_SSIM_SIGMA = 1.5
+
+
+def thumbnail(gray, size=THUMBNAIL_SIZE):
+    """
+    Averages a grayscale image down to a square thumbnail
+    Args:
+        gray: grayscale image
+        size: side of the thumbnail
+
+    Returns:
+        (size, size) uint8 thumbnail
+    """
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def ncc(thumbnails_a, thumbnails_b):
+    """
+    Normalized cross correlation between pairs of thumbnails
+    Args:
+        thumbnails_a: (m, size, size) array of thumbnails
+        thumbnails_b: (m, size, size) array of thumbnails
+
+    Returns:
+        float32 array of the correlation of each pair, 1 for identical thumbnails up to brightness and contrast
+    """
+    a = thumbnails_a.reshape(len(thumbnails_a), -1).astype(np.float32)
+    b = thumbnails_b.reshape(len(thumbnails_b), -1).astype(np.float32)
+    a -= a.mean(axis=1, keepdims=True)
+    b -= b.mean(axis=1, keepdims=True)
+    numerator = np.einsum('ij,ij->i', a, b)
+    denominator = np.sqrt(np.einsum('ij,ij->i', a, a) * np.einsum('ij,ij->i', b, b))
+    # Flat thumbnails only correlate with other flat thumbnails
+    flat = denominator == 0
+    return np.where(flat, np.all(a == b, axis=1), numerator / np.where(flat, 1, denominator)).astype(np.float32)
+
+
+def _pad_stack(stack):
+    """
+    Reflect pads each image of a (m, size, size) stack by the SSIM window radius
+    """
+    radius = _SSIM_WINDOW // 2
+    return np.pad(stack.astype(np.float32), ((0, 0), (radius, radius), (radius, radius)), mode='reflect')
+
+
+def _blur_stack(padded):
+    """
+    Gaussian blurs each image of a padded (m, side, side) stack, the stack is blurred as one tall image by a
+    single cv2 call, the padding keeps the images from bleeding into each others unpadded centers
+    """
+    blurred = cv2.GaussianBlur(padded.reshape(-1, padded.shape[2]), (_SSIM_WINDOW, _SSIM_WINDOW), _SSIM_SIGMA)
+    return blurred.reshape(padded.shape)
+
+
+def ssim(thumbnails_a, thumbnails_b):
+    """
+    Mean structural similarity between pairs of thumbnails, with a 7x7 gaussian window
+    Args:
+        thumbnails_a: (m, size, size) array of thumbnails
+        thumbnails_b: (m, size, size) array of thumbnails
+
+    Returns:
+        float32 array of the SSIM of each pair, 1 for identical thumbnails
+    """
+    # Products of reflect padded images are the reflect padded products, so the images are only padded once
+    a, b = _pad_stack(thumbnails_a), _pad_stack(thumbnails_b)
+    mu_a, mu_b = _blur_stack(a), _blur_stack(b)
+    var_a = _blur_stack(a * a) - mu_a * mu_a
+    var_b = _blur_stack(b * b) - mu_b * mu_b
+    covariance = _blur_stack(a * b) - mu_a * mu_b
+
+    ssim_map = ((2 * mu_a * mu_b + _SSIM_C1) * (2 * covariance + _SSIM_C2) /
+                ((mu_a * mu_a + mu_b * mu_b + _SSIM_C1) * (var_a + var_b + _SSIM_C2)))
+    radius = _SSIM_WINDOW // 2
+    return ssim_map[:, radius:-radius, radius:-radius].mean(axis=(1, 2))
+
+
+# Verification metrics by name and the score a pair must reach by default to be accepted
+METRICS = {'ssim': ssim, 'ncc': ncc}
+DEFAULT_THRESHOLDS = {'ssim': 0.5, 'ncc': 0.6}
+
+
+class CandidateVerifier:
+    """
+    Second stage which re-checks candidate pairs from a duplicate finder with a more expensive metric on
+    thumbnails cached during the first pass, so no image is decoded twice.
+
+    Thumbnails are kept in one (num_images, size, size) uint8 array indexed by image id (4KB per image at 64x64).
+    When the array would be larger than ram_budget it is a memory-mapped file in spill_directory instead, like
+    FeatureStore, so a search of millions of images is bounded by disk instead of RAM.
+    Candidate pairs are scored chunk_size at a time on a pool of threads, numpy and OpenCV release the GIL while
+    they work so the chunks run in parallel. The pool is started by the first scores call and kept until close.
+
+    Usage:
+    >>> verifier = CandidateVerifier(metric='ncc')
+    >>> verifier.reset(3)
+    >>> for image_id, value in enumerate([0, 0, 255]):
+    ...     verifier.add(image_id, np.eye(64, dtype=np.uint8) * value + 1)
+    >>> verifier.verify([0, 0], [1, 2]).tolist()
+    [True, False]
+    """
+    def __init__(self, metric='ssim', threshold=None, thumbnail_size=THUMBNAIL_SIZE, num_threads=4,
+                 chunk_size=32, ram_budget=DEFAULT_RAM_BUDGET, spill_directory=None):
+        """
+
+        Args:
+            metric: name of the metric in METRICS
+            threshold: score a pair must reach to be accepted, None for the metric's DEFAULT_THRESHOLDS
+            thumbnail_size: side of the square thumbnails the first pass should cache
+            num_threads: number of threads scoring chunks of pairs
+            chunk_size: number of pairs scored at a time by one thread, small chunks keep the SSIM
+                intermediates in cache
+            ram_budget: maximum number of bytes of thumbnails to keep in memory, None for no limit
+            spill_directory: directory for the memory-mapped file, None for the system temp directory
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Invalid metric {metric}, expected one of {list(METRICS)}")
+        if chunk_size <= 0:
+            raise ValueError("Cannot verify chunks of 0 or less pairs")
+
+        self.metric = metric
+        self.threshold = DEFAULT_THRESHOLDS[metric] if threshold is None else threshold
+        self.thumbnail_size = thumbnail_size
+        self.num_threads = num_threads
+        self.chunk_size = chunk_size
+        self.ram_budget = ram_budget
+        self.spill_directory = spill_directory
+        self._spill_path = None
+        self._pool = None
+        self.thumbnails = np.zeros((0, thumbnail_size, thumbnail_size), dtype=np.uint8)
+        self.has_thumbnail = np.zeros(0, dtype=bool)
+        self.stats = dict()
+        self.reset(0)
+
+    def reset(self, num_images):
+        """
+        Clears the cached thumbnails and stats for a new search
+
+        Args:
+            num_images: number of images in the search, image ids are in [0, num_images)
+        """
+        self._remove_spill_file()
+        self.thumbnails = self._allocate(num_images)
+        self.has_thumbnail = np.zeros(num_images, dtype=bool)
+        self.stats = dict(candidates=0, rejected=0, seconds=0.0)
+
+    def __del__(self):
+        self.close()
+        self._remove_spill_file()
+
+    def close(self):
+        """
+        Stops the threads scoring pairs, the next scores call starts them again
+        """
+        pool, self._pool = getattr(self, '_pool', None), None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    @property
+    def spilled(self):
+        """
+        Returns: True if the thumbnails are kept in a memory-mapped file
+        """
+        return self._spill_path is not None
+
+    def _allocate(self, num_images):
+        shape = (num_images, self.thumbnail_size, self.thumbnail_size)
+        if self.ram_budget is None or num_images * self.thumbnail_size ** 2 <= self.ram_budget:
+            return np.zeros(shape, dtype=np.uint8)
+
+        # Over budget, keep the thumbnails in a memory-mapped file instead
+        fd, path = tempfile.mkstemp(suffix='.thumbnails', dir=self.spill_directory)
+        os.close(fd)
+        self._spill_path = path
+        return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape)
+
+    def _remove_spill_file(self):
+        if getattr(self, '_spill_path', None) is not None:
+            # Release the memory map before removing its file
+            self.thumbnails = None
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
+            self._spill_path = None
+
+    def add(self, image_id, image_thumbnail):
+        """
+        Caches the thumbnail of an image
+
+        Args:
+            image_id: id of the image
+            image_thumbnail: (thumbnail_size, thumbnail_size) uint8 thumbnail from ``thumbnail``
+        """
+        self.thumbnails[image_id] = image_thumbnail
+        self.has_thumbnail[image_id] = True
+
+    def scores(self, ids_a, ids_b):
+        """
+        Scores pairs of images with the metric
+
+        Args:
+            ids_a: array of image ids
+            ids_b: array of image ids of the same length
+
+        Returns:
+            float32 array of the score of each pair
+        """
+        ids_a, ids_b = np.asarray(ids_a, dtype=np.int64), np.asarray(ids_b, dtype=np.int64)
+        metric = METRICS[self.metric]
+        starts = range(0, len(ids_a), self.chunk_size)
+
+        def score_chunk(start):
+            stop = start + self.chunk_size
+            return metric(self.thumbnails[ids_a[start:stop]], self.thumbnails[ids_b[start:stop]])
+
+        if len(starts) <= 1 or self.num_threads <= 1:
+            chunks = [score_chunk(start) for start in starts]
+        else:
+            if self._pool is None:
+                self._pool = ThreadPool(self.num_threads)
+            chunks = self._pool.map(score_chunk, starts)
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+    def verify(self, ids_a, ids_b):
+        """
+        Re-checks candidate pairs, pairs missing a thumbnail are kept since they cannot be checked
+
+        Args:
+            ids_a: array of image ids
+            ids_b: array of image ids of the same length
+
+        Returns:
+            boolean array, True for the pairs which are accepted
+        """
+        start = time.perf_counter()
+        ids_a, ids_b = np.asarray(ids_a, dtype=np.int64), np.asarray(ids_b, dtype=np.int64)
+        accepted = self.scores(ids_a, ids_b) >= self.threshold
+        accepted |= ~(self.has_thumbnail[ids_a] & self.has_thumbnail[ids_b])
+
+        self.stats['candidates'] += len(accepted)
+        self.stats['rejected'] += int(len(accepted) - accepted.sum())
+        self.stats['seconds'] += time.perf_counter() - start
+        return accepted
+
+    def log_stats(self):
+        """
+        Logs how many candidates were rejected and how long verification took
+        """
+        stats = self.stats
+        Logger.info(f"Verification: {self.metric} rejected {stats['rejected']} of {stats['candidates']} candidate "
+                    f"pairs in {stats['seconds']:.2f}s")
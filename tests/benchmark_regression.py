@@ -0,0 +1,324 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Kivy parses sys.argv when src imports it, keep it away from the benchmark's own flags
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from tests import throughput_benchmark
+from tests.duplicate_performance import (DEFAULT_TESTS, DuplicatePerformanceTestManager, PerformanceTest,
+                                         default_models)
+
+BASELINE_VERSION = 2  # Bumped whenever the layout of the baseline file or the meaning of a metric changes
+PERFORMANCE_TESTS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'performance_tests')
+DEFAULT_THROUGHPUT_SCALES = (1_000,)
+
+# Largest change of each kind of metric which is not reported: throughput, latency and memory are relative changes,
+# accuracy is an absolute change of the f1 score
+DEFAULT_TOLERANCES = {'throughput': 0.10, 'latency': 0.10, 'memory': 0.20, 'accuracy': 0.01}
+MIN_SECONDS = 0.05  # Durations shorter than this in both runs are too short to time reliably and never regress
+DEFAULT_REPEAT = 3
+
+
+def metric_kind(metric):
+    """
+    Classifies a metric by the suffix of its name, or of the nearest enclosing name with a known suffix for metrics
+    broken down by backend like 'grouping_seconds/dict'. Of the latency percentiles only the median is compared, the
+    tails of a single run are mostly noise
+
+    Args:
+        metric: '/' separated path of the metric
+
+    Returns:
+        'throughput' (higher is better), 'latency' or 'memory' (lower is better), 'accuracy' (higher is better) or
+        None for values which are not compared
+
+    >>> [metric_kind(metric) for metric in ('basic/images_per_second', 'x/p50_ms', 'grouping_seconds/dict',
+    ...                                     'basic/peak_rss_mb', 'x/p99_ms', 'basic/images')]
+    ['throughput', 'latency', 'latency', 'memory', None, None]
+    """
+    for name in reversed(metric.split('/')):
+        if name.endswith('_ms'):
+            return 'latency' if name == 'p50_ms' else None
+        if name.endswith('per_second'):
+            return 'throughput'
+        if name.endswith('seconds'):
+            return 'latency'
+        if name.endswith('rss_mb'):
+            return 'memory'
+        if name.endswith('f1'):
+            return 'accuracy'
+    return None
+
+
+def _list_item_name(index, item):
+    # Names the entries of the lists in a throughput report by what they measured instead of their position
+    if isinstance(item, dict):
+        keys = [str(item[key]) for key in ('images', 'backend', 'workers') if key in item]
+        if keys:
+            return '-'.join(keys)
+    return str(index)
+
+
+def flatten_metrics(results, prefix=''):
+    """
+    Flattens nested benchmark results into the metrics which are compared
+
+    Args:
+        results: dictionary (or list) of results, like the output of DuplicatePerformanceTestManager.run_all
+        prefix: path the metrics are put under
+
+    Returns:
+        dictionary of the '/' separated path of every numeric metric with a metric_kind to its value
+
+    >>> flatten_metrics({'basic': {'images': 5, 'models': {'DHash': {'perfect_f1': 1.0, 'seconds': 0.5}}}})
+    {'basic/models/DHash/perfect_f1': 1.0, 'basic/models/DHash/seconds': 0.5}
+    """
+    if isinstance(results, dict):
+        items = results.items()
+    else:
+        items = ((_list_item_name(index, item), item) for index, item in enumerate(results))
+
+    metrics = dict()
+    for key, value in items:
+        path = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, (dict, list)):
+            metrics.update(flatten_metrics(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and metric_kind(path) is not None:
+            metrics[path] = value
+    return metrics
+
+
+def best_of(runs):
+    """
+    Combines the metrics of repeated runs, keeping the best value of each so one slow run is not a regression
+
+    Args:
+        runs: list of flattened metrics
+
+    Returns:
+        dictionary of every metric to its best value
+    """
+    best = dict()
+    for metrics in runs:
+        for metric, value in metrics.items():
+            if metric not in best:
+                best[metric] = value
+            elif metric_kind(metric) in ('throughput', 'accuracy'):
+                best[metric] = max(best[metric], value)
+            else:
+                best[metric] = min(best[metric], value)
+    return best
+
+
+def _is_duration(metric):
+    return any(name.endswith('seconds') and not name.endswith('per_second') for name in metric.split('/'))
+
+
+def compare(baseline, current, tolerances=None, min_seconds=MIN_SECONDS):
+    """
+    Compares the metrics of a run with the baseline's
+
+    Args:
+        baseline: flattened metrics of the baseline
+        current: flattened metrics of the run
+        tolerances: dictionary of metric kind to its tolerance, missing kinds use DEFAULT_TOLERANCES
+        min_seconds: durations shorter than this in both runs are always 'ok'
+
+    Returns:
+        list of dictionaries with the 'metric', its 'kind', 'baseline' and 'current' values, the 'change' (relative
+        for throughput, latency and memory, absolute for accuracy) and the 'status': 'regression', 'improvement',
+        'ok', 'missing' from the run or 'new' in the run
+
+    >>> [change['status'] for change in compare({'a_per_second': 100, 'b_f1': 0.9, 'c_seconds': 1.0},
+    ...                                         {'a_per_second': 80, 'b_f1': 0.95, 'c_seconds': 1.05})]
+    ['regression', 'improvement', 'ok']
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or dict())}
+    changes = []
+    for metric in list(baseline) + [metric for metric in current if metric not in baseline]:
+        kind = metric_kind(metric)
+        old, new = baseline.get(metric), current.get(metric)
+        change = {'metric': metric, 'kind': kind, 'baseline': old, 'current': new, 'change': None}
+        if new is None:
+            change['status'] = 'missing'
+        elif old is None:
+            change['status'] = 'new'
+        else:
+            if kind == 'accuracy':
+                change['change'] = new - old
+            else:
+                change['change'] = (new - old) / old if old else 0.0
+            # Positive when the metric got better
+            better = -change['change'] if kind in ('latency', 'memory') else change['change']
+            if _is_duration(metric) and max(old, new) < min_seconds:
+                change['status'] = 'ok'
+            elif better < -tolerances[kind]:
+                change['status'] = 'regression'
+            elif better > tolerances[kind]:
+                change['status'] = 'improvement'
+            else:
+                change['status'] = 'ok'
+        changes.append(change)
+    return changes
+
+
+def format_report(changes, show_all=False):
+    """
+    Args:
+        changes: output of compare
+        show_all: list the metrics which did not change beyond their tolerance too
+
+    Returns:
+        text table of the changed metrics, regressions first, with a summary line
+    """
+    order = {'regression': 0, 'missing': 1, 'improvement': 2, 'new': 3, 'ok': 4}
+    shown = sorted((change for change in changes if show_all or change['status'] != 'ok'),
+                   key=lambda change: order[change['status']])
+
+    lines = []
+    for change in shown:
+        if change['change'] is None:
+            difference = ''
+        elif change['kind'] == 'accuracy':
+            difference = f"{change['change']:+.3f}"
+        else:
+            difference = f"{change['change']:+.1%}"
+        old = '' if change['baseline'] is None else f"{change['baseline']:.4g}"
+        new = '' if change['current'] is None else f"{change['current']:.4g}"
+        lines.append(f"{change['status'].upper():12} {change['metric']:60} {old:>10} {new:>10} {difference:>8}")
+
+    counts = {status: sum(change['status'] == status for change in changes) for status in order}
+    lines.append(f"{counts['regression']} regressions, {counts['improvement']} improvements, "
+                 f"{counts['missing']} missing and {counts['new']} new of {len(changes)} metrics")
+    return '\n'.join(lines)
+
+
+def machine_differences(baseline_machine, current_machine):
+    """
+    Returns: list of the machine_info keys which differ, timings are not comparable across machines
+    """
+    return [key for key in sorted(set(baseline_machine) | set(current_machine))
+            if baseline_machine.get(key) != current_machine.get(key)]
+
+
+def load_baseline(path):
+    """
+    Args:
+        path: path of a baseline written by save_baseline
+
+    Returns:
+        the baseline dictionary
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        raise ValueError(f"Baseline {path} is version {baseline.get('version')}, expected {BASELINE_VERSION}, "
+                         f"record a new one with --update")
+    if baseline.get('throughput_version') not in (None, throughput_benchmark.BENCHMARK_VERSION):
+        raise ValueError(f"Baseline {path} was recorded with throughput benchmark version "
+                         f"{baseline['throughput_version']}, expected {throughput_benchmark.BENCHMARK_VERSION}")
+    return baseline
+
+
+def save_baseline(path, metrics, machine):
+    """
+    Writes metrics as the new baseline
+
+    Args:
+        path: path the baseline is written to
+        metrics: flattened metrics
+        machine: machine_info of the machine they were measured on
+    """
+    baseline = {'version': BASELINE_VERSION, 'throughput_version': throughput_benchmark.BENCHMARK_VERSION,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'machine': machine, 'metrics': metrics}
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def run_benchmarks(manager, throughput_scales=DEFAULT_THROUGHPUT_SCALES, pool_sizes=(1,), quiet=True):
+    """
+    Runs every test of the manager and the throughput suite once
+
+    Args:
+        manager: DuplicatePerformanceTestManager with the models and tests to run
+        throughput_scales: scales of the throughput suite, empty to skip it
+        pool_sizes: numbers of workers of the throughput suite's pool benchmarks
+        quiet: hide the scores the manager prints
+
+    Returns:
+        flattened metrics, the accuracy tests under 'tests/' and the throughput suite under 'throughput/'
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+        results = {'tests': manager.run_all()}
+        if throughput_scales:
+            report = throughput_benchmark.run_suite(throughput_scales, pool_sizes)
+            results['throughput'] = {key: report[key] for key in ('scales', 'hamming')}
+    return flatten_metrics(results)
+
+
+def _test_directory(name):
+    return name if os.path.isdir(name) else os.path.join(PERFORMANCE_TESTS_DIRECTORY, name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the performance tests and throughput suite and compares them "
+                                                 "with a stored baseline, exits with 1 when anything regressed")
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="path of the baseline JSON file")
+    parser.add_argument('--update', action='store_true', help="record this run as the new baseline")
+    parser.add_argument('--tests', nargs='+', default=DEFAULT_TESTS,
+                        help="names of tests in performance_tests or directories of tests")
+    parser.add_argument('--models', nargs='+', default=None, help="names of the models to run, all by default")
+    parser.add_argument('--throughput-scales', type=int, nargs='*', default=DEFAULT_THROUGHPUT_SCALES,
+                        help="scales of the throughput suite, none to skip it")
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=(1,))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="runs to keep the best value of every metric from")
+    for kind, tolerance in DEFAULT_TOLERANCES.items():
+        parser.add_argument(f'--{kind}-tolerance', type=float, default=tolerance)
+    parser.add_argument('--min-seconds', type=float, default=MIN_SECONDS,
+                        help="durations shorter than this are not compared")
+    parser.add_argument('--report', default=None, help="path the JSON list of changes is written to")
+    parser.add_argument('--all', action='store_true', help="list unchanged metrics too")
+    parser.add_argument('--verbose', action='store_true', help="print the scores of every model")
+    args = parser.parse_args()
+
+    models = default_models()
+    if args.models is not None:
+        unknown = set(args.models) - {model.name for model in models}
+        if unknown:
+            parser.error(f"unknown models {sorted(unknown)}, expected some of {[model.name for model in models]}")
+        models = [model for model in models if model.name in args.models]
+    manager = DuplicatePerformanceTestManager(models=models,
+                                              tests=[PerformanceTest(_test_directory(name)) for name in args.tests])
+
+    runs = []
+    for _ in range(args.repeat):
+        for test in manager.tests:
+            # Every run decodes the images again instead of reading the features the previous run cached
+            test.images.clear()
+        runs.append(run_benchmarks(manager, args.throughput_scales, args.pool_sizes, quiet=not args.verbose))
+    metrics = best_of(runs)
+    machine = throughput_benchmark.machine_info()
+
+    if args.update or not os.path.exists(args.baseline):
+        save_baseline(args.baseline, metrics, machine)
+        print(f"Wrote {len(metrics)} metrics to {args.baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    differences = machine_differences(baseline['machine'], machine)
+    if differences:
+        print(f"Warning: the baseline was recorded on a different machine ({', '.join(differences)} differ), "
+              f"throughput and memory are not comparable")
+    tolerances = {kind: getattr(args, f'{kind}_tolerance') for kind in DEFAULT_TOLERANCES}
+    changes = compare(baseline['metrics'], metrics, tolerances, args.min_seconds)
+    print(f"Compared with {args.baseline} from {baseline['created']}")
+    print(format_report(changes, show_all=args.all))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(changes, f, indent=2)
+    sys.exit(1 if any(change['status'] == 'regression' for change in changes) else 0)
@@ -0,0 +1,283 @@
+import argparse
+import functools
+import glob
+import multiprocessing as mp
+import os
+import shutil
+import warnings
+
+import cv2
+import numpy as np
+
+from src.image_formats import path_format_code
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SEED_DIRECTORIES = (os.path.join(TESTS_DIRECTORY, 'images'),
+                            *sorted(glob.glob(os.path.join(TESTS_DIRECTORY, 'performance_tests', '*', 'images'))))
+BASE_SIZE = 256  # Long side of the base images every variant is made from
+
+
+# Variants of a base image, each returns the varied image (None for a byte for byte copy of the base file) and the
+# JPEG quality it is written with. Duplicates are the same picture as the base which a perfect model should match,
+# similar variants change what is shown.
+def _copy(image, rng):
+    return None, None
+
+
+def _rescale(image, rng):
+    scale = rng.uniform(0.4, 0.9)
+    return cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), None
+
+
+def _high_quality_jpeg(image, rng):
+    return image, int(rng.integers(80, 96))
+
+
+def _low_quality_jpeg(image, rng):
+    return image, int(rng.integers(15, 50))
+
+
+def _crop(image, rng):
+    height, width = image.shape[:2]
+    keep = rng.uniform(0.75, 0.95)
+    crop_height, crop_width = int(height * keep), int(width * keep)
+    top, left = rng.integers(0, height - crop_height + 1), rng.integers(0, width - crop_width + 1)
+    return image[top:top + crop_height, left:left + crop_width], None
+
+
+def _flip(image, rng):
+    return cv2.flip(image, 1), None
+
+
+def _brightness(image, rng):
+    shift = rng.integers(20, 60) * rng.choice([-1, 1])
+    return cv2.convertScaleAbs(image, alpha=1, beta=int(shift)), None
+
+
+# Variant name to (function, 'duplicate' or 'similar')
+VARIANTS = {
+    'copy': (_copy, 'duplicate'),
+    'rescale': (_rescale, 'duplicate'),
+    'jpeg_high': (_high_quality_jpeg, 'duplicate'),
+    'jpeg_low': (_low_quality_jpeg, 'similar'),
+    'crop': (_crop, 'similar'),
+    'flip': (_flip, 'similar'),
+    'brightness': (_brightness, 'similar'),
+}
+
+
+def find_seeds(paths):
+    """
+    Args:
+        paths: image files or directories of images
+
+    Returns:
+        sorted list of the paths of the readable seed images
+    """
+    seeds = []
+    for path in paths:
+        candidates = [os.path.join(path, name) for name in os.listdir(path)] if os.path.isdir(path) else [path]
+        seeds.extend(candidate for candidate in candidates if path_format_code(candidate))
+    return sorted(seeds)
+
+
+def _base_image(seed_image, rng, base_size=BASE_SIZE):
+    """
+    Cuts a distinct picture out of a seed: a random crop of a third to two thirds of each side in a random
+    orientation, scaled so its long side is base_size
+    """
+    height, width = seed_image.shape[:2]
+    crop_height, crop_width = int(height * rng.uniform(0.33, 0.66)), int(width * rng.uniform(0.33, 0.66))
+    top, left = rng.integers(0, height - crop_height + 1), rng.integers(0, width - crop_width + 1)
+    base = np.rot90(seed_image[top:top + crop_height, left:left + crop_width], k=int(rng.integers(0, 4)))
+    scale = base_size / max(base.shape[:2])
+    return cv2.resize(np.ascontiguousarray(base), None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def load_seeds(seed_paths, base_size=BASE_SIZE):
+    """
+    Decodes the seed images, shrunk so the smallest crop still covers a base image. Seeds which cannot be decoded
+    are skipped with a warning
+
+    Args:
+        seed_paths: paths of the seed images
+        base_size: long side of the base images
+
+    Returns:
+        list of the decoded seed images
+    """
+    seed_images = []
+    for path in seed_paths:
+        image = cv2.imread(path)
+        if image is None:
+            warnings.warn(f"Skipping seed image {path} which could not be read")
+            continue
+        scale = min(1.0, 4 * base_size / max(image.shape[:2]))
+        seed_images.append(cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA))
+    if not seed_images:
+        raise ValueError(f"None of the {len(seed_paths)} seed images could be read")
+    return seed_images
+
+
+_seed_images = None
+
+
+def _init_worker(seed_images):
+    global _seed_images
+    _seed_images = seed_images
+
+
+def _write_jpeg(path, image, quality):
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 95 if quality is None else quality])
+
+
+def generate_group(group_index, variants, image_directory, seed=0, base_size=BASE_SIZE):
+    """
+    Writes the base image of a group and its variants, the group's content only depends on the seed and its
+    index so groups can be generated in any order by any number of workers
+
+    Args:
+        group_index: index of the group
+        variants: names of the VARIANTS to make of the base image
+        image_directory: directory the images are written to
+        seed: seed of the corpus
+        base_size: long side of the base image
+
+    Returns:
+        list of (image name, variant name) of the group, the base image first with variant None
+    """
+    rng = np.random.default_rng([seed, group_index])
+    base = _base_image(_seed_images[rng.integers(0, len(_seed_images))], rng, base_size)
+
+    names = [(f'{group_index:06d}_base.jpg', None)]
+    _write_jpeg(os.path.join(image_directory, names[0][0]), base, None)
+    for i, variant in enumerate(variants, 1):
+        name = f'{group_index:06d}_{i}_{variant}.jpg'
+        image, quality = VARIANTS[variant][0](base, rng)
+        if image is None:
+            shutil.copyfile(os.path.join(image_directory, names[0][0]), os.path.join(image_directory, name))
+        else:
+            _write_jpeg(os.path.join(image_directory, name), image, quality)
+        names.append((name, variant))
+    return names
+
+
+def plan_groups(num_images, rng, variants=tuple(VARIANTS), max_variants=3, unique_fraction=0.5):
+    """
+    Decides which variants every group gets before anything is written
+
+    Args:
+        num_images: total number of images in the corpus
+        rng: numpy Generator
+        variants: names of the VARIANTS to draw from
+        max_variants: most variants made of one base image
+        unique_fraction: fraction of the groups which are a lone base image without variants
+
+    Returns:
+        list of the list of variant names of each group
+    """
+    groups = []
+    remaining = num_images
+    while remaining > 0:
+        num_variants = 0 if rng.random() < unique_fraction else int(rng.integers(1, max_variants + 1))
+        num_variants = min(num_variants, remaining - 1)
+        groups.append([variants[i] for i in rng.integers(0, len(variants), size=num_variants)])
+        remaining -= num_variants + 1
+    return groups
+
+
+def write_config(path, name, groups):
+    """
+    Writes a corpus in the config.txt format PerformanceTest reads
+
+    Args:
+        path: path of the config file
+        name: name of the test
+        groups: list of the (image name, variant name) lists of each group from generate_group
+    """
+    with open(path, 'w') as f:
+        f.write(f"name:\n{name}\n\nimages:\n")
+        for group in groups:
+            f.writelines(image_name + '\n' for image_name, _ in group)
+
+        f.write("\nduplicates:\n")
+        for group in groups:
+            duplicates = [image_name for image_name, variant in group
+                          if variant is None or VARIANTS[variant][1] == 'duplicate']
+            if len(duplicates) > 1:
+                f.write(' '.join(duplicates) + '\n')
+
+        # Near matches are read as cliques, so every image of a group with a similar variant is listed
+        f.write("\nsimilar:\n")
+        for group in groups:
+            if any(variant is not None and VARIANTS[variant][1] == 'similar' for _, variant in group):
+                f.write(' '.join(image_name for image_name, _ in group) + '\n')
+
+
+def generate_corpus(directory, num_images, seed_paths, seed=0, variants=tuple(VARIANTS), max_variants=3,
+                    unique_fraction=0.5, base_size=BASE_SIZE, num_workers=None, name=None):
+    """
+    Generates a labeled corpus of near duplicates, the same arguments always write the same corpus
+
+    Args:
+        directory: directory of the test, the images are written to directory/images
+        num_images: number of images in the corpus
+        seed_paths: paths of the seed images the base images are cut out of
+        seed: seed of the corpus
+        variants: names of the VARIANTS to make
+        max_variants: most variants made of one base image
+        unique_fraction: fraction of the groups which are a lone base image without variants
+        base_size: long side of the base images
+        num_workers: number of processes writing images, None for every cpu
+        name: name of the test, defaults to the name of the directory
+
+    Returns:
+        path of the written config.txt
+    """
+    if not seed_paths:
+        raise ValueError("Cannot generate a corpus without seed images")
+    for variant in variants:
+        if variant not in VARIANTS:
+            raise ValueError(f"Invalid variant {variant}, expected one of {list(VARIANTS)}")
+
+    image_directory = os.path.join(directory, 'images')
+    os.makedirs(image_directory, exist_ok=True)
+    planned = plan_groups(num_images, np.random.default_rng(seed), tuple(variants), max_variants, unique_fraction)
+
+    # Seeds are decoded once here instead of in every worker, so an unreadable seed fails before any worker starts
+    seed_images = load_seeds(seed_paths, base_size)
+    write = functools.partial(_write_group, image_directory=image_directory, seed=seed, base_size=base_size)
+    if num_workers == 1:
+        _init_worker(seed_images)
+        groups = list(map(write, enumerate(planned)))
+    else:
+        with mp.Pool(num_workers, initializer=_init_worker, initargs=(seed_images,)) as pool:
+            groups = pool.map(write, enumerate(planned), chunksize=64)
+
+    config_path = os.path.join(directory, 'config.txt')
+    write_config(config_path, name or os.path.basename(os.path.normpath(directory)), groups)
+    return config_path
+
+
+def _write_group(indexed_variants, **kwargs):
+    group_index, variants = indexed_variants
+    return generate_group(group_index, variants, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a labeled near duplicate corpus for PerformanceTest")
+    parser.add_argument('directory', help="directory the config.txt and images are written to")
+    parser.add_argument('--num-images', type=int, default=10_000)
+    parser.add_argument('--seeds', nargs='+', default=DEFAULT_SEED_DIRECTORIES,
+                        help="seed images or directories of them")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--max-variants', type=int, default=3)
+    parser.add_argument('--unique-fraction', type=float, default=0.5)
+    parser.add_argument('--base-size', type=int, default=BASE_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    config = generate_corpus(args.directory, args.num_images, find_seeds(args.seeds), args.seed, args.variants,
+                             args.max_variants, args.unique_fraction, args.base_size, args.workers)
+    print(f"Wrote {args.num_images} images and {config}")
@@ -1,10 +1,14 @@
+from collections import OrderedDict
 from enum import Enum
 import os
+import sys
 import cv2
 import numpy as np
 import itertools
+import time
 
-from src import image_hashing, image_gradient
+from src import image_hashing, image_gradient, image_hog, verification
+from src.blocking import Blocking
 
 # TODO: Create better printing system for near tests
 # TODO: Add graphing of values for near test (f1, confusion matrix)
@@ -17,6 +21,299 @@ class ModelType(Enum):
     NEAR = 1
 
 
+def upper_triangle(matrix):
+    """
+    Returns: 1d array of the entries of a square matrix above its diagonal, each pair of images once, row by row
+    """
+    n = len(matrix)
+    values = np.empty(n * (n - 1) // 2, dtype=np.asarray(matrix[:1]).dtype)
+    offset = 0
+    for i in range(n - 1):
+        values[offset:offset + n - 1 - i] = matrix[i][i + 1:]
+        offset += n - 1 - i
+    return values
+
+
+def zero_lower_triangle(matrix, block_size=1024):
+    """
+    Zeroes a square matrix on and below its diagonal in place, a block of rows at a time so no second n x n matrix
+    is allocated
+
+    Returns:
+        the matrix
+    """
+    for start in range(0, len(matrix), block_size):
+        stop = min(start + block_size, len(matrix))
+        matrix[start:stop][np.tri(stop - start, len(matrix), k=start, dtype=bool)] = 0
+    return matrix
+
+
+def group_matrix(groups, size):
+    """
+    Args:
+        groups: list of lists of image indexes which match each other
+        size: number of images
+
+    Returns:
+        boolean matrix which is True above the diagonal for every pair of images in the same group
+    """
+    matrix = np.zeros((size, size), dtype=bool)
+    for group in groups:
+        group = np.asarray(group, dtype=np.int64)
+        matrix[np.ix_(group, group)] = True
+    return zero_lower_triangle(matrix)
+
+
+class ThresholdCurve:
+    """
+    Confusion counts of a model's pair scores at any threshold from a single sort of the scores, a pair is
+    predicted similar at a threshold when its score is >= the threshold.
+
+    Usage:
+    >>> curve = ThresholdCurve([0.9, 0.8, 0.3, 0.7], [True, False, False, True])
+    >>> curve.counts(0.75)
+    (1, 1, 1, 1)
+    >>> curve.best_f1()
+    (0.8, 0.7)
+    """
+    def __init__(self, scores, actual):
+        """
+
+        Args:
+            scores: 1d array of the model's score of each pair
+            actual: 1d boolean array, True for the pairs which are actually similar
+        """
+        scores = np.asarray(scores)
+        actual = np.asarray(actual, dtype=bool)
+        self.num_pairs = len(scores)
+        self.num_actual = int(np.count_nonzero(actual))
+        self._positive_scores = np.sort(scores[actual])
+        self._sorted_scores = np.sort(scores)
+
+    def counts(self, thresholds):
+        """
+        Args:
+            thresholds: threshold or array of thresholds
+
+        Returns:
+            true_positive, false_negative, false_positive, true_negative at each threshold
+        """
+        # Searching with thresholds of another dtype would convert every score, so they are rounded up to the
+        # scores' dtype instead which keeps score >= threshold exact
+        dtype = self._sorted_scores.dtype
+        if np.issubdtype(dtype, np.floating):
+            # Compared as float64 so python floats are not compared in the scores' dtype and rounded down to it
+            exact = np.asarray(thresholds, dtype=np.float64)
+            rounded = exact.astype(dtype)
+            thresholds = np.where(rounded < exact, np.nextafter(rounded, dtype.type(np.inf)), rounded)
+        predicted = self.num_pairs - np.searchsorted(self._sorted_scores, thresholds, side='left')
+        true_positive = self.num_actual - np.searchsorted(self._positive_scores, thresholds, side='left')
+        false_positive = predicted - true_positive
+        false_negative = self.num_actual - true_positive
+        true_negative = self.num_pairs - self.num_actual - false_positive
+        if np.ndim(thresholds) == 0:
+            return int(true_positive), int(false_negative), int(false_positive), int(true_negative)
+        return true_positive, false_negative, false_positive, true_negative
+
+    def curve(self, thresholds=None):
+        """
+        Computes precision, recall and f1 at many thresholds
+
+        Args:
+            thresholds: thresholds to evaluate, None for every distinct score of an actually similar pair which are
+                the only thresholds f1 can peak at, lowering the threshold between them only adds false positives
+
+        Returns:
+            dictionary of 1d arrays over the thresholds in decreasing order: 'thresholds', 'true_positive',
+            'false_negative', 'false_positive', 'true_negative', 'precision', 'recall' and 'f1'
+        """
+        thresholds = np.unique(self._positive_scores if thresholds is None else thresholds)[::-1]
+        true_positive, false_negative, false_positive, true_negative = self.counts(thresholds)
+        ones = np.ones(len(thresholds))
+        predicted = true_positive + false_positive
+        precision = np.divide(true_positive, predicted, out=ones.copy(), where=predicted > 0)
+        recall = true_positive / self.num_actual if self.num_actual else ones.copy()
+        denominator = true_positive + 0.5 * (false_positive + false_negative)
+        f1 = np.divide(true_positive, denominator, out=ones.copy(), where=denominator > 0)
+        return {'thresholds': thresholds, 'true_positive': true_positive, 'false_negative': false_negative,
+                'false_positive': false_positive, 'true_negative': true_negative, 'precision': precision,
+                'recall': recall, 'f1': f1}
+
+    def best_f1(self):
+        """
+        Returns: (f1, threshold) of the threshold with the best f1, (1, inf) without any actually similar pairs
+        """
+        curve = self.curve()
+        if not len(curve['f1']):
+            return 1.0, float('inf')
+        best = np.argmax(curve['f1'])
+        return float(curve['f1'][best]), float(curve['thresholds'][best])
+
+
+DEFAULT_CACHE_BYTES = 256 * 2 ** 20  # Decoded images a LazyImageSource keeps in memory
+
+
+class LazyImageSource:
+    """
+    Sequence of the images of a test which are decoded when they are indexed, the most recently used images are
+    kept in an LRU bounded by max_bytes so memory does not grow with the size of the test.
+
+    Models compute their per image features through feature() instead of from the images directly. Features are
+    cached by name so models with the same features share them, and every feature registered before the first
+    feature() call is computed in the same pass so each image is decoded once for all of them.
+
+    Usage:
+    >>> source = LazyImageSource(['tests/images/wolf.jpg'])
+    >>> source.register('ratio', lambda image: image.shape[1] / image.shape[0])
+    >>> source.register('pixels', lambda image: image.shape[0] * image.shape[1])
+    >>> source.feature('ratio') == [source[0].shape[1] / source[0].shape[0]], source.decodes
+    (True, 1)
+    """
+    def __init__(self, paths, max_bytes=DEFAULT_CACHE_BYTES):
+        """
+
+        Args:
+            paths: paths of the images
+            max_bytes: most bytes of decoded images kept in memory, the last image used is always kept
+        """
+        self.paths = list(paths)
+        self.max_bytes = max_bytes
+        self.decodes = 0  # Number of images decoded so far
+        self.decode_seconds = 0.0  # Time spent decoding them
+        self.feature_seconds = dict()  # Feature name to the time spent computing it
+        self._cache = OrderedDict()  # Index to decoded image, least recently used first
+        self._cached_bytes = 0
+        self._features = dict()  # Feature name to the list of its value for every image
+        self._pending = dict()  # Feature name to the function of the features computed by the next pass
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        image = self._cache.get(index)
+        if image is not None:
+            self._cache.move_to_end(index)
+            return image
+
+        start = time.perf_counter()
+        image = cv2.imread(self.paths[index])
+        if image is None:
+            raise IOError(f"Failed to load image {self.paths[index]}")
+        self.decodes += 1
+        self.decode_seconds += time.perf_counter() - start
+        self._cache[index] = image
+        self._cached_bytes += image.nbytes
+        while self._cached_bytes > self.max_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.nbytes
+        return image
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def clear(self):
+        """
+        Drops every cached image and feature
+        """
+        self.decodes = 0
+        self.decode_seconds = 0.0
+        self.feature_seconds.clear()
+        self._cache.clear()
+        self._cached_bytes = 0
+        self._features.clear()
+        self._pending.clear()
+
+    def register(self, name, fn):
+        """
+        Queues a feature to be computed in the next pass over the images
+
+        Args:
+            name: name of the feature, features with the same name must compute the same thing
+            fn: function computing the feature of a decoded image
+        """
+        if name not in self._features:
+            self._pending[name] = fn
+
+    def feature(self, name, fn=None):
+        """
+        Args:
+            name: name of the feature
+            fn: function computing the feature of a decoded image, None if it was registered
+
+        Returns:
+            list of the feature of every image
+        """
+        if name not in self._features:
+            if fn is not None:
+                self.register(name, fn)
+            self.compute_registered()
+        return self._features[name]
+
+    def compute_registered(self):
+        """
+        Computes every registered feature which is not cached yet in one pass over the images
+        """
+        pending, self._pending = self._pending, dict()
+        if not pending:
+            return
+        values = {name: [] for name in pending}
+        seconds = dict.fromkeys(pending, 0.0)
+        for image in self:
+            for name, fn in pending.items():
+                start = time.perf_counter()
+                values[name].append(fn(image))
+                seconds[name] += time.perf_counter() - start
+        self._features.update(values)
+        self.feature_seconds.update(seconds)
+
+
+def image_features(images, name, fn):
+    """
+    Args:
+        images: LazyImageSource, or list of decoded images
+        name: name of the feature the LazyImageSource caches it under
+        fn: function computing the feature of a decoded image
+
+    Returns:
+        list of the feature of every image
+    """
+    if isinstance(images, LazyImageSource):
+        return images.feature(name, fn)
+    return [fn(image) for image in images]
+
+
+def reset_peak_rss():
+    """
+    Resets the peak resident memory of the process, only possible on Linux, elsewhere peak_rss_mb keeps reporting
+    the peak since the process started
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """
+    Returns: peak resident memory of the process in MB, None if the platform does not report it
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 1024
+
+
 class DuplicateFinderModel:
     type = ModelType.PERFECT
 
@@ -31,15 +328,23 @@ class DuplicateFinderModel:
         self._print_confusion(tp, fn, fp, tn)
         print()
         self._print_f1(tp, fn, fp)
+        return self._calculate_f1(tp, fn, fp)
 
     def score_near(self, images, actual_sims):
         raise NotImplementedError()
 
+    def feature_functions(self):
+        """
+        Returns: dictionary of the name to the function of every per image feature the model computes through
+            image_features, registered with a LazyImageSource so they are computed in one pass
+        """
+        return dict()
+
     def calculate_similarities(self, images):
         """
         Calculate the similarity between a set of images
         Args:
-            images: list of opened images from opencv
+            images: LazyImageSource or list of opened images from opencv
 
         Returns: matrix of similarities with values below diagonal = 0
                 [[0, 1, 0.5],[0,0, 1],[0,0,0.8]]
@@ -57,21 +362,13 @@ class DuplicateFinderModel:
         Returns:
             true_positive, false_negative, false_positive, true_negative
         """
-        true_positive, false_negative, false_positive, true_negative = (0, 0, 0, 0)
-
-        for i, model_row in enumerate(model_sims):
-            for j, model_sim in enumerate(model_row):
-                if j > i:
-                    actual_sim = actual_sims[i][j]
-                    if model_sim >= 1 and actual_sim >= 1:
-                        true_positive += 1
-                    elif model_sim < 1 and actual_sim >= 1:
-                        false_negative += 1
-                    elif model_sim >= 1 and actual_sim < 1:
-                        false_positive += 1
-                    else:
-                        true_negative += 1
+        predicted = upper_triangle(np.asarray(model_sims) >= 1)
+        actual = upper_triangle(np.asarray(actual_sims) >= 1)
 
+        true_positive = np.count_nonzero(predicted & actual)
+        false_negative = np.count_nonzero(actual) - true_positive
+        false_positive = np.count_nonzero(predicted) - true_positive
+        true_negative = len(predicted) - true_positive - false_negative - false_positive
         return true_positive, false_negative, false_positive, true_negative
 
     @staticmethod
@@ -100,33 +397,34 @@ class DuplicateFinderModel:
 class HashDuplicateFinderModel(DuplicateFinderModel):
     type = ModelType.PERFECT
 
-    def __init__(self, hash_size=8, name="DHash", **kwargs):
+    def __init__(self, hash_size=8, algorithm='dhash', invariant=False, name="DHash", **kwargs):
         super().__init__(name=name, **kwargs)
         self.hash_size = hash_size
+        self.algorithm = algorithm
+        self.invariant = invariant
         self.hashes = None
 
+    def _hash(self, image):
+        hash_val, = image_hashing.compute_hashes(image, self.hash_size, (self.algorithm,), self.invariant)
+        return hash_val
+
+    def _feature_name(self):
+        return f"hash_{self.algorithm}_{self.hash_size}" + ("_invariant" if self.invariant else "")
+
+    def feature_functions(self):
+        return {self._feature_name(): self._hash}
+
     def _calculate_hashes(self, images):
         self.hashes = dict()
-        for i, image in enumerate(images):
-            # Calculate image hash
-            hash_val = image_hashing.dhash(image, self.hash_size)
+        for i, hash_val in enumerate(image_features(images, self._feature_name(), self._hash)):
             # Add image to hash list
             p = self.hashes.get(hash_val, [])
             p.append(i)
             self.hashes[hash_val] = p
 
     def _calculate_similarity_matrix_from_hashes(self, size):
-        similarity_matrix = np.zeros((size, size))
-
         # set similarity to one for all the duplicate image intersections above diagonal
-        duplicate_idx_list = [duplicate_idx for duplicate_idx in self.hashes.values() if len(duplicate_idx) > 1]
-        for duplicates in duplicate_idx_list:
-            for image1_idx in duplicates:
-                for image2_idx in duplicates:
-                    if image2_idx > image1_idx:
-                        similarity_matrix[image1_idx][image2_idx] = 1
-
-        return similarity_matrix
+        return group_matrix([duplicate_idx for duplicate_idx in self.hashes.values() if len(duplicate_idx) > 1], size)
 
     def calculate_similarities(self, images):
         # Calculate hashes
@@ -147,17 +445,26 @@ class ToleranceSimilarDuplicateFinderModel(DuplicateFinderModel):
     def score_near(self, images, actual_sims):
         # Calculate similarity matrix
         sims = self.calculate_similarities(images)
-        # For each tolerance run score_perfect on "stepped" sim matrix
-        # "Stepped" meaning if similarity > tolerance the cell is set to 1 and if not 0
+        # The scores at every tolerance come from one sort of the pairs' similarities
+        curve = self.score_curve(sims, actual_sims)
         for tolerance in self.tolerances:
-            stepped_matrix = [[1 if similarity >= tolerance else 0 for similarity in row] for row in sims]
             print(f"tolerance: {tolerance:1.2f}")
-            true_positive, false_negative, false_positive, true_negative = self._calculate_score(stepped_matrix,
-                                                                                                 actual_sims)
+            true_positive, false_negative, false_positive, true_negative = curve.counts(tolerance)
             self._print_confusion(true_positive, false_negative, false_positive, true_negative)
             print()
             self._print_f1(true_positive, false_negative, false_positive)
 
+        f1, tolerance = curve.best_f1()
+        print(f"best f1: {f1:1.2f} at tolerance {tolerance:1.4f}")
+        return curve
+
+    @staticmethod
+    def score_curve(sims, actual_sims):
+        """
+        Returns: ThresholdCurve of the similarities above the diagonal of sims
+        """
+        return ThresholdCurve(upper_triangle(sims), upper_triangle(np.asarray(actual_sims) >= 1))
+
 
 class GradientDuplicateFinderModel(ToleranceSimilarDuplicateFinderModel):
     name = "Gradient"
@@ -167,31 +474,135 @@ class GradientDuplicateFinderModel(ToleranceSimilarDuplicateFinderModel):
         self.vector_size = vector_size
         self.gradients = []
 
-    def _calculate_gradients(self, images):
-        self.gradients = [image_gradient.calculate_gradient_vector(image, self.vector_size) for image in images]
+    def _gradient(self, image):
+        return image_gradient.calculate_gradient_vector(image, self.vector_size)
 
-    def _calculate_similarity_matrix_from_gradients(self):
-        similarity_matrix = np.zeros((len(self.gradients), len(self.gradients)))
+    def feature_functions(self):
+        return {f"gradient_{self.vector_size}": self._gradient}
 
-        for i, row in enumerate(similarity_matrix):
-            for j, elem in enumerate(row):
-                if j > i:
-                    # Set element equal to the image_similarity
-                    similarity_matrix[i][j] = image_gradient.gradient_similarity(self.gradients[i], self.gradients[j])
+    def _calculate_gradients(self, images):
+        self.gradients = np.stack(image_features(images, f"gradient_{self.vector_size}", self._gradient)
+                                  ).astype(np.float32)
 
-        return similarity_matrix
+    def _calculate_similarity_matrix_from_gradients(self):
+        # Every gradient_similarity with one float32 matrix product, identical gradients score exactly 1 however
+        # the product rounds
+        similarity_matrix = self.gradients @ self.gradients.T
+        np.minimum(similarity_matrix, 1.0, out=similarity_matrix)
+        similarity_matrix[similarity_matrix > 1 - 1e-6] = 1.0
+        return zero_lower_triangle(similarity_matrix)
 
     def calculate_similarities(self, images):
         # Calculate gradients
-        self.gradients = []
         self._calculate_gradients(images)
         # Use gradients to calculate similarity matrix and return it
         return self._calculate_similarity_matrix_from_gradients()
 
 
+class BlockedGradientDuplicateFinderModel(GradientDuplicateFinderModel):
+    """
+    Gradient model which only compares images in the same or neighbouring ratio bands, pairs which blocking skips
+    get a similarity of 0 so the near scoring shows the recall lost to blocking
+    """
+
+    def __init__(self, vector_size=8, ratio_tolerance=0.05, ratio_overlap=1, name="Blocked Gradient", **kwargs):
+        super().__init__(vector_size=vector_size, name=name, **kwargs)
+        self.ratio_tolerance = ratio_tolerance
+        self.ratio_overlap = ratio_overlap
+
+    @staticmethod
+    def _ratio(image):
+        return image.shape[1] / image.shape[0]
+
+    def feature_functions(self):
+        return {**super().feature_functions(), 'ratio': self._ratio}
+
+    def calculate_similarities(self, images):
+        similarity_matrix = super().calculate_similarities(images)
+
+        ratios = image_features(images, 'ratio', self._ratio)
+        blocking = Blocking(ratios, tolerance=self.ratio_tolerance, overlap=self.ratio_overlap)
+        print(f"skipped pairs: {blocking.skipped_fraction():1.2f}")
+
+        return np.where(blocking.comparable_mask(), similarity_matrix, 0)
+
+
+class VerifiedGradientDuplicateFinderModel(GradientDuplicateFinderModel):
+    """
+    Gradient model whose candidate pairs (similarity >= the lowest tolerance) are re-checked with a verification
+    metric on 64x64 thumbnails, rejected pairs get a similarity of 0
+    """
+
+    def __init__(self, vector_size=8, metric='ssim', threshold=None, name="Verified Gradient", **kwargs):
+        super().__init__(vector_size=vector_size, name=name, **kwargs)
+        self.verifier = verification.CandidateVerifier(metric=metric, threshold=threshold)
+
+    @staticmethod
+    def _thumbnail(image):
+        return verification.thumbnail(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+
+    def feature_functions(self):
+        return {**super().feature_functions(), f"thumbnail_{verification.THUMBNAIL_SIZE}": self._thumbnail}
+
+    def calculate_similarities(self, images):
+        similarity_matrix = super().calculate_similarities(images)
+
+        self.verifier.reset(len(images))
+        thumbnails = image_features(images, f"thumbnail_{verification.THUMBNAIL_SIZE}", self._thumbnail)
+        for image_id, thumbnail in enumerate(thumbnails):
+            self.verifier.add(image_id, thumbnail)
+
+        rows_i, rows_j = np.nonzero(np.triu(similarity_matrix >= min(self.tolerances), k=1))
+        accepted = self.verifier.verify(rows_i, rows_j)
+        similarity_matrix[rows_i[~accepted], rows_j[~accepted]] = 0
+
+        stats = self.verifier.stats
+        print(f"verification rejected {stats['rejected']} of {stats['candidates']} pairs in {stats['seconds']:.3f}s")
+        return similarity_matrix
+
+
+class HOGDuplicateFinderModel(ToleranceSimilarDuplicateFinderModel):
+    """
+    Compares the HOG descriptors of square thumbnails, descriptors are stacked into one matrix and every similarity
+    is computed with a single matrix product
+    """
+
+    def __init__(self, thumbnail_size=64, name="HOG", **kwargs):
+        super().__init__(name=name, **kwargs)
+        self.thumbnail_size = thumbnail_size
+        self.descriptors = None
+
+    def _descriptor(self, image):
+        return image_hog.calculate_hog_vector(image, self.thumbnail_size)
+
+    def feature_functions(self):
+        return {f"hog_{self.thumbnail_size}": self._descriptor}
+
+    def _calculate_descriptors(self, images):
+        start = time.perf_counter()
+        self.descriptors = np.stack(image_features(images, f"hog_{self.thumbnail_size}", self._descriptor))
+        elapsed = time.perf_counter() - start
+        print(f"descriptors: {len(images) / elapsed:1.1f} images/s")
+
+    def calculate_similarities(self, images):
+        self._calculate_descriptors(images)
+        start = time.perf_counter()
+        similarity_matrix = zero_lower_triangle(self.descriptors @ self.descriptors.T)
+        elapsed = time.perf_counter() - start
+        print(f"similarities: {len(images) * (len(images) - 1) / 2 / max(elapsed, 1e-9):1.0f} pairs/s")
+        return similarity_matrix
+
+
 class PerformanceTest:
-    def __init__(self, directory):
+    def __init__(self, directory, cache_bytes=DEFAULT_CACHE_BYTES):
+        """
+
+        Args:
+            directory: directory of the test's config.txt and images
+            cache_bytes: most bytes of decoded images kept in memory, see LazyImageSource
+        """
         self.directory = directory
+        self.cache_bytes = cache_bytes
         self.file = os.path.join(directory, "config.txt")
         # Create all member variables
         self.images = None
@@ -271,19 +682,10 @@ class PerformanceTest:
             similar_idxs_list: list of index list ex: [[0,1],[2,3]]
 
         Returns:
-            a matrix where 1s are placed in all the indexes where two similar indexes cross
+            a boolean matrix which is True in all the indexes where two similar indexes cross
             though not below the diagonal ex: [[0,1,0,0],[0,0,0,0],[0,0,0,1],[0,0,0,0]]
         """
-        similarity_matrix = np.zeros((len(self.image_paths), len(self.image_paths)))
-
-        # set similarity to one for all the duplicate image intersections above diagonal
-        for duplicates in similar_idxs_list:
-            for image1_idx in duplicates:
-                for image2_idx in duplicates:
-                    if image2_idx > image1_idx:
-                        similarity_matrix[image1_idx][image2_idx] = 1
-
-        return similarity_matrix
+        return group_matrix(similar_idxs_list, len(self.image_paths))
 
     def _fill_perfect_matrix(self):
         # Set matrix to created perfect matrix
@@ -297,8 +699,8 @@ class PerformanceTest:
         self.near_matrix = self._get_similarity_matrix(combined_near_perfect_idx)
 
     def _open_images(self):
-        # TODO: add error checking
-        self.images = [cv2.imread(image_path) for image_path in self.image_paths]
+        # Images are decoded when a model first needs them, so memory stays bounded however large the test is
+        self.images = LazyImageSource(self.image_paths, max_bytes=self.cache_bytes)
 
 
 class DuplicatePerformanceTestManager:
@@ -326,47 +728,96 @@ class DuplicatePerformanceTestManager:
         self.tests = []
 
     def run(self, test: PerformanceTest, spacing=30):
+        """
+        Scores every model on a test
+
+        Returns:
+            dictionary of the test's results: the images decoded per second, the peak resident memory in MB and, for
+            every model name, the seconds its features and its scoring took and its f1 scores ('near_f1' is the best
+            f1 over every tolerance)
+        """
+        reset_peak_rss()
         print("=" * spacing)
         print(test.name)
         print("=" * spacing)
+        # Every model's features are computed in one pass over the images before any model is timed, each image is
+        # decoded once. Decoding and every feature are timed apart so the metrics do not depend on which models run
+        if isinstance(test.images, LazyImageSource):
+            decode_seconds = test.images.decode_seconds
+            for model in self.models:
+                for name, fn in model.feature_functions().items():
+                    test.images.register(name, fn)
+            test.images.compute_registered()
+            decode_seconds = test.images.decode_seconds - decode_seconds
+        else:
+            decode_seconds = 0.0
+        results = {'images': len(test.images), 'models': dict()}
+        if decode_seconds > 0:
+            results['images_per_second'] = len(test.images) / decode_seconds
+
         for model in self.models:
+            feature_seconds = None
+            if isinstance(test.images, LazyImageSource):
+                feature_seconds = sum(test.images.feature_seconds.get(name, 0.0) for name in model.feature_functions())
+            start = time.perf_counter()
             if model.type == ModelType.PERFECT:
                 print(f"{model.name}" + "-" * (spacing - len(model.name)))
-                model.score_perfect(test.images, test.perfect_matrix)
+                model_results = {'perfect_f1': model.score_perfect(test.images, test.perfect_matrix)}
                 print("-" * spacing)
             else:
                 print(f"{model.name}" + "-" * (spacing - len(model.name)))
                 print("Perfect scoring:")
-                model.score_perfect(test.images, test.perfect_matrix)
+                model_results = {'perfect_f1': model.score_perfect(test.images, test.perfect_matrix)}
                 print()
                 print("Near scoring:")
-                model.score_near(test.images, test.near_matrix)
+                model_results['near_f1'], _ = model.score_near(test.images, test.near_matrix).best_f1()
                 print("-" * spacing)
+            model_results['seconds'] = time.perf_counter() - start
+            if feature_seconds is not None:
+                model_results['feature_seconds'] = feature_seconds
+            results['models'][model.name] = model_results
+
+        results['peak_rss_mb'] = peak_rss_mb()
+        return results
 
     def run_all(self, **kwargs):
-        for test in self.tests:
-            self.run(test, **kwargs)
+        """
+        Returns: dictionary of each test's name to its results from run
+        """
+        return {test.name: self.run(test, **kwargs) for test in self.tests}
+
+
+DEFAULT_TESTS = ('basic', 'highly_similar')  # Tests in performance_tests run by default
+
+
+def default_models():
+    """
+    Returns: list of the models compared by default
+    """
+    models = [HashDuplicateFinderModel()]
+    for algorithm in ('ahash', 'phash', 'bhash'):
+        models.append(HashDuplicateFinderModel(algorithm=algorithm, name=algorithm[0].upper() + "Hash"))
+    models.append(HashDuplicateFinderModel(invariant=True, name="DHash-Invariant"))
+    tolerances = [.6, .7, .75, .8, .85, .9, .95, .98, 1.0]
+    models.append(GradientDuplicateFinderModel(name="Gradient-8", tolerances=tolerances))
+    models.append(GradientDuplicateFinderModel(vector_size=32, name="Gradient-32", tolerances=tolerances))
+    models.append(BlockedGradientDuplicateFinderModel(name="Blocked-Gradient-8", tolerances=tolerances))
+    models.append(VerifiedGradientDuplicateFinderModel(name="Verified-Gradient-8", tolerances=tolerances))
+    models.append(HOGDuplicateFinderModel(name="HOG-64", tolerances=tolerances))
+    return models
+
+
+def default_tests():
+    """
+    Returns: list of the PerformanceTests run by default
+    """
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "performance_tests")
+    return [PerformanceTest(os.path.join(directory, name)) for name in DEFAULT_TESTS]
 
 
 if __name__ == "__main__":
     # Create manager
-    manager = DuplicatePerformanceTestManager()
-
-    # Create models
-    hash_model = HashDuplicateFinderModel()
-    manager.add_model(hash_model)
-    grad_8_model = GradientDuplicateFinderModel(name="Gradient-8",
-                                                tolerances=[.6, .7, .75, .8, .85, .9, .95, .98, 1.0])
-    manager.add_model(grad_8_model)
-    grad_32_model = GradientDuplicateFinderModel(name="Gradient-32",
-                                                 tolerances=[.6, .7, .75, .8, .85, .9, .95, .98, 1.0])
-    manager.add_model(grad_32_model)
-
-    # Create tests
-    p1 = PerformanceTest(os.path.join("performance_tests", "basic"))
-    manager.add_test(p1)
-    p2 = PerformanceTest(os.path.join("performance_tests", "highly_similar"))
-    manager.add_test(p2)
+    manager = DuplicatePerformanceTestManager(models=default_models(), tests=default_tests())
 
     # run tests
     manager.run_all()
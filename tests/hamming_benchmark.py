@@ -0,0 +1,79 @@
+import os
+import time
+
+import numpy as np
+
+# Kivy parses sys.argv when src imports it, keep it away from the benchmark's own flags
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from src import hamming, image_hashing
+
+
+def _random_hashes(count, hash_size, rng):
+    return rng.integers(0, 2 ** 63, size=(count, image_hashing.num_hash_words(hash_size)), dtype=np.uint64)
+
+
+def _best_time(fn, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_popcount(hash_size, count=1_000_000, rng=None):
+    rng = rng or np.random.default_rng(0)
+    words = _random_hashes(count, hash_size, rng)
+    results = {'table': _best_time(lambda: hamming._popcount_table(words))}
+    if hasattr(np, 'bitwise_count'):
+        results['native'] = _best_time(lambda: hamming._popcount_native(words))
+    return {name: words.size / seconds for name, seconds in results.items()}
+
+
+def benchmark_distances(hash_size, num_queries=256, database_size=100_000, rng=None):
+    rng = rng or np.random.default_rng(0)
+    queries = _random_hashes(num_queries, hash_size, rng)
+    database = _random_hashes(database_size, hash_size, rng)
+    seconds = _best_time(lambda: hamming.hamming_distances(queries, database))
+    return num_queries * database_size / seconds
+
+
+def benchmark_top_k(hash_size, k=10, num_queries=256, database_size=100_000, rng=None):
+    rng = rng or np.random.default_rng(0)
+    queries = _random_hashes(num_queries, hash_size, rng)
+    database = _random_hashes(database_size, hash_size, rng)
+    seconds = _best_time(lambda: hamming.top_k(queries, database, k))
+    return num_queries / seconds
+
+
+def benchmark_radius(hash_size, radius, num_queries=256, database_size=100_000, rng=None):
+    rng = rng or np.random.default_rng(0)
+    queries = _random_hashes(num_queries, hash_size, rng)
+    database = _random_hashes(database_size, hash_size, rng)
+    seconds = _best_time(lambda: hamming.radius_search(queries, database, radius))
+    return num_queries / seconds
+
+
+def benchmark_pairs_within(hash_size, radius, database_size=10_000, rng=None):
+    rng = rng or np.random.default_rng(0)
+    database = _random_hashes(database_size, hash_size, rng)
+    seconds = _best_time(lambda: sum(compared for _, _, compared in hamming.pairs_within(database, radius)), 1)
+    return database_size * (database_size - 1) / 2 / seconds
+
+
+if __name__ == "__main__":
+    spacing = 30
+    for hash_size in (8, 16):
+        bits = hash_size * hash_size
+        print("=" * spacing)
+        print(f"hash_size {hash_size} ({bits} bits)")
+        print("=" * spacing)
+        for name, words_per_second in benchmark_popcount(hash_size).items():
+            print(f"{'popcount ' + name + ':':{spacing}}", f"{words_per_second / 1e6:8.1f} M words/s")
+        print(f"{'distances:':{spacing}}", f"{benchmark_distances(hash_size) / 1e6:8.1f} M pairs/s")
+        print(f"{'top 10:':{spacing}}", f"{benchmark_top_k(hash_size):8.1f} queries/s (100k db)")
+        print(f"{'radius ' + str(bits // 10) + ':':{spacing}}",
+              f"{benchmark_radius(hash_size, bits // 10):8.1f} queries/s (100k db)")
+        print(f"{'pairs within ' + str(bits // 10) + ':':{spacing}}",
+              f"{benchmark_pairs_within(hash_size, bits // 10) / 1e6:8.1f} M pairs/s")
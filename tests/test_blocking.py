@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+import numpy as np
+
+from src.blocking import Blocking, ratio_bands, size_bands
+
+
+class TestBands(TestCase):
+    def test_ratio_bands_within_tolerance(self):
+        ratios = np.linspace(0.2, 5, 1000)
+        bands = ratio_bands(ratios, tolerance=0.05)
+        # Ratios within the tolerance of each other are at most one band apart
+        close = ratio_bands(ratios * 1.05, tolerance=0.05)
+        self.assertTrue(np.all(np.abs(close - bands) <= 1))
+
+    def test_invalid_tolerance(self):
+        self.assertRaises(ValueError, ratio_bands, [1.0], tolerance=0)
+
+    def test_size_bands(self):
+        np.testing.assert_array_equal(size_bands([0, 9, 10, 99_999, 100_000]), [0, 0, 1, 4, 5])
+
+
+class TestBlocking(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.ratios = rng.choice([0.5625, 0.75, 1.0, 1.3333, 1.7777], size=60) * rng.uniform(0.98, 1.02, size=60)
+        self.sizes = rng.integers(1_000, 10_000_000, size=60)
+
+    def compared_pairs(self, blocking):
+        pairs = set()
+        for rows, other_rows in blocking.block_pairs():
+            if other_rows is None:
+                pairs.update((min(a, b), max(a, b)) for a in rows for b in rows if a != b)
+            else:
+                pairs.update((min(a, b), max(a, b)) for a in rows for b in other_rows)
+        return pairs
+
+    def test_each_pair_once(self):
+        blocking = Blocking(self.ratios, sizes=self.sizes)
+        self.assertEqual(len(self.compared_pairs(blocking)), blocking.num_pairs())
+
+    def test_similar_ratios_compared(self):
+        blocking = Blocking(self.ratios, tolerance=0.05)
+        pairs = self.compared_pairs(blocking)
+        for i in range(len(self.ratios)):
+            for j in range(i + 1, len(self.ratios)):
+                if max(self.ratios[i], self.ratios[j]) / min(self.ratios[i], self.ratios[j]) <= 1.05:
+                    self.assertIn((i, j), pairs)
+
+    def test_skipped_fraction(self):
+        blocking = Blocking(self.ratios)
+        self.assertGreater(blocking.skipped_fraction(), 0.5)
+        self.assertEqual(Blocking(np.ones(10)).skipped_fraction(), 0)
+
+    def test_comparable_mask(self):
+        blocking = Blocking(self.ratios, sizes=self.sizes)
+        mask = blocking.comparable_mask()
+        pairs = {(i, j) for i, j in zip(*np.nonzero(np.triu(mask, k=1)))}
+        self.assertEqual(pairs, self.compared_pairs(blocking))
@@ -0,0 +1,58 @@
+import filecmp
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from tests import dataset_generator
+from tests.duplicate_performance import PerformanceTest
+
+SEED_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images')
+
+
+class TestDatasetGenerator(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.seeds = dataset_generator.find_seeds([SEED_DIRECTORY])[:2]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def generate(self, name, seeds=None, num_workers=1):
+        directory = os.path.join(self.directory, name)
+        dataset_generator.generate_corpus(directory, 12, self.seeds if seeds is None else seeds, seed=3,
+                                          base_size=48, num_workers=num_workers, name='generated')
+        return directory
+
+    def assertSameCorpus(self, first, second):
+        self.assertTrue(filecmp.cmp(os.path.join(first, 'config.txt'), os.path.join(second, 'config.txt'),
+                                    shallow=False))
+        names = sorted(os.listdir(os.path.join(first, 'images')))
+        self.assertEqual(names, sorted(os.listdir(os.path.join(second, 'images'))))
+        _, mismatch, errors = filecmp.cmpfiles(os.path.join(first, 'images'), os.path.join(second, 'images'),
+                                               names, shallow=False)
+        self.assertEqual((mismatch, errors), ([], []))
+
+    def test_deterministic(self):
+        first = self.generate('first')
+        self.assertSameCorpus(first, self.generate('second'))
+        self.assertSameCorpus(first, self.generate('pool', num_workers=2))
+
+        test = PerformanceTest(first)
+        self.assertEqual(len(test.image_paths), 12)
+        self.assertTrue(all(os.path.exists(path) for path in test.image_paths))
+
+    def test_unreadable_seed_skipped(self):
+        broken = os.path.join(self.directory, 'broken.jpg')
+        with open(broken, 'wb') as file:
+            file.write(b'not an image')
+        with self.assertWarns(UserWarning):
+            with_broken = self.generate('broken', seeds=[broken] + self.seeds)
+        self.assertSameCorpus(with_broken, self.generate('clean'))
+
+    def test_no_readable_seeds(self):
+        broken = os.path.join(self.directory, 'broken.jpg')
+        with open(broken, 'wb') as file:
+            file.write(b'not an image')
+        with self.assertWarns(UserWarning):
+            self.assertRaises(ValueError, self.generate, 'broken', seeds=[broken])
@@ -0,0 +1,281 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from kivy.lang import Builder
+
+from src.duplicate_manager import ImageGroupDataView, ImageGroupsRecycleView, SelectableImage
+from src.image_table import ImageTable, ImageRecord
+from src.selection_rules import SelectionRules
+from src.trash import Trash
+
+KV_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'src', 'duplicateimage.kv'))
+
+
+def _group(size, prefix='image', selected=None):
+    return {'data': [{'source': f'{prefix}_{i}.jpg', 'thumbnail': '', 'image_ratio': 1.0} for i in range(size)],
+            'selected': set() if selected is None else selected}
+
+
+class _ImageTable:
+    def __init__(self, directory=''):
+        self.directory = directory
+
+    def path(self, image_id):
+        return os.path.join(self.directory, f'image_{image_id}.jpg')
+
+    def ratio(self, image_id):
+        return 1.0
+
+    def digest(self, image_id):
+        return None
+
+
+class TestDuplicateManager(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if KV_FILE not in Builder.files:
+            Builder.load_file(KV_FILE)
+
+
+class TestWidgetPool(TestDuplicateManager):
+    def setUp(self):
+        self.view = ImageGroupDataView()
+
+    def test_rebinds_widgets(self):
+        self.view.refresh_view_attrs(None, 0, _group(3, 'a'))
+        widgets = list(self.view.children)
+        self.view.refresh_view_attrs(None, 1, _group(3, 'b'))
+        self.assertEqual(self.view.children, widgets)
+        self.assertEqual([child.source for child in self.view.children], ['b_0.jpg', 'b_1.jpg', 'b_2.jpg'])
+
+    def test_shrinks_and_grows(self):
+        self.view.refresh_view_attrs(None, 0, _group(5))
+        widgets = list(self.view.children)
+        self.view.refresh_view_attrs(None, 1, _group(2))
+        self.assertEqual(self.view.children, widgets[:2])
+        self.view.refresh_view_attrs(None, 2, _group(6))
+        self.assertEqual(self.view.children[:5], widgets)
+        self.assertEqual(len(self.view.children), 6)
+        self.assertTrue(all(isinstance(child, SelectableImage) for child in self.view.children))
+        self.assertEqual([child.index for child in self.view.children], list(range(6)))
+
+    def test_selection_is_rebound(self):
+        self.view.refresh_view_attrs(None, 0, _group(3, selected={1}))
+        self.assertEqual([child.selected for child in self.view.children], [False, True, False])
+        self.view.refresh_view_attrs(None, 1, _group(3))
+        self.assertEqual([child.selected for child in self.view.children], [False, False, False])
+
+    def test_select_node(self):
+        self.view.refresh_view_attrs(None, 0, _group(3))
+        self.assertTrue(self.view.select_node(2))
+        self.assertTrue(self.view.children[2].selected)
+        self.assertEqual(self.view.selected_nodes[0], {2})
+
+    def test_spare_widgets_bounded(self):
+        self.view.refresh_view_attrs(None, 0, _group(ImageGroupDataView.max_spare_widgets + 10))
+        self.view.refresh_view_attrs(None, 1, _group(2))
+        self.assertEqual(len(self.view._widget_pool), 2 + ImageGroupDataView.max_spare_widgets)
+
+
+class TestRemoveSelected(TestDuplicateManager):
+    def setUp(self):
+        self.rv = ImageGroupsRecycleView(image_table=_ImageTable())
+        self.rv.remove_images = lambda dt: None
+        # Streamed in like during a search
+        for group_id, images in enumerate([[0, 1, 2], [3, 4], [5, 6, 7]]):
+            self.rv.add_group(group_id, images)
+
+    def sources(self, row):
+        return [elem['source'] for elem in self.rv.data[row]['data']]
+
+    def test_selection_index(self):
+        self.rv.select_image(0, 1)
+        self.rv.select_image(0, 2)
+        self.rv.deselect_image(0, 1)
+        self.rv.deselect_image(1, 0)
+        self.assertEqual(self.rv.selected_images(0), {2})
+        self.assertEqual(self.rv.selected_images(1), set())
+        self.rv.deselect_image(0, 2)
+        self.assertEqual(self.rv._selection, {})
+
+    def test_only_selected_groups_updated(self):
+        untouched = self.rv.data[2]
+        self.rv.select_image(0, 1)
+        self.rv.remove_selected()
+        self.assertEqual(self.sources(0), ['image_0.jpg', 'image_2.jpg'])
+        self.assertFalse(self.rv.data[0]['hidden'])
+        self.assertIs(self.rv.data[2], untouched)
+        self.assertEqual(self.rv.images_to_remove, ['image_1.jpg'])
+        self.assertEqual(self.rv.selected_images(0), set())
+
+    def test_small_group_collapsed_in_place(self):
+        self.rv.select_image(1, 0)
+        self.rv.remove_selected()
+        self.assertEqual(len(self.rv.data), 3)
+        self.assertTrue(self.rv.data[1]['hidden'])
+        self.assertEqual(self.sources(2), ['image_5.jpg', 'image_6.jpg', 'image_7.jpg'])
+
+        # Shown again once it is a group again
+        self.rv.grow_group(1, 8)
+        self.assertFalse(self.rv.data[1]['hidden'])
+        self.assertEqual(self.sources(1), ['image_4.jpg', 'image_8.jpg'])
+
+    def test_view_reads_selection_index(self):
+        self.rv.select_image(2, 0)
+        view = ImageGroupDataView()
+        view.refresh_view_attrs(self.rv, 2, self.rv.data[2])
+        self.assertTrue(view.selected)
+        self.assertEqual([child.selected for child in view.children], [True, False, False])
+
+        view.select_node(2)
+        self.assertEqual(self.rv.selected_images(2), {0, 2})
+        view.deselect_node(0)
+        self.assertEqual(self.rv.selected_images(2), {2})
+
+    def test_hidden_view_has_no_widgets(self):
+        self.rv.select_image(1, 0)
+        self.rv.remove_selected()
+        view = ImageGroupDataView()
+        view.refresh_view_attrs(self.rv, 1, self.rv.data[1])
+        self.assertTrue(view.hidden)
+        self.assertEqual(view.children, [])
+
+
+class TestUndoRemove(TestDuplicateManager):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        root = self.temporary_directory.name
+        self.table = _ImageTable(root)
+        for image_id in range(5):
+            open(self.table.path(image_id), 'w').close()
+        self.trash = Trash(os.path.join(root, 'journal'))
+        self.rv = ImageGroupsRecycleView(image_table=self.table, trash=self.trash)
+        self.rv.duplicate_images = [[0, 1, 2], [3, 4]]
+
+    def tearDown(self):
+        self.trash.wait()
+        self.temporary_directory.cleanup()
+
+    def test_remove_and_undo(self):
+        self.rv.select_image(0, 0)
+        self.rv.select_image(1, 1)
+        self.rv.remove_selected()
+        self.trash.wait()
+        self.assertFalse(os.path.exists(self.table.path(0)))
+        self.assertFalse(os.path.exists(self.table.path(4)))
+        self.assertTrue(self.rv.data[1]['hidden'])
+
+        self.assertTrue(self.rv.undo_remove())
+        self.trash.wait()
+        self.assertTrue(os.path.exists(self.table.path(0)))
+        self.assertTrue(os.path.exists(self.table.path(4)))
+        self.assertEqual(len(self.rv.data[0]['data']), 3)
+        self.assertFalse(self.rv.data[1]['hidden'])
+        self.assertFalse(self.rv.undo_remove())
+
+    def test_purged_removal_not_undone(self):
+        self.rv.select_image(0, 0)
+        self.rv.remove_selected()
+        self.trash.purge()
+        self.trash.wait()
+        self.assertFalse(self.rv.undo_remove())
+        self.assertEqual(len(self.rv.data[0]['data']), 2)
+
+
+class TestAutoSelect(TestDuplicateManager):
+    def test_auto_select(self):
+        table = ImageTable([f'image_{image_id}.jpg' for image_id in range(5)])
+        for image_id, width in enumerate([10, 30, 20, 5, 50]):
+            table.record(image_id, ImageRecord(ratio=1, size=1, mtime=0, width=width, height=width))
+        rv = ImageGroupsRecycleView(image_table=table)
+        rv.duplicate_images = [[0, 1, 2], [3, 4]]
+        rv.select_image(1, 1)
+
+        self.assertEqual(rv.auto_select(SelectionRules(['highest_resolution'])), 3)
+        self.assertEqual(rv.selected_images(0), {0, 2})
+        self.assertEqual(rv.selected_images(1), {0})
+
+
+class TestGroupWindow(TestDuplicateManager):
+    def setUp(self):
+        table = ImageTable([f'image_{image_id}.jpg' for image_id in range(63)])
+        self.rv = ImageGroupsRecycleView(image_table=table, page_size=5, window_size=10)
+        self.rv.remove_images = lambda dt: None
+        self.rv.duplicate_images = [[2 * group_id, 2 * group_id + 1] for group_id in range(30)] + [[60, 61, 62]]
+
+    def group_ids(self):
+        return [group['group_id'] for group in self.rv.data]
+
+    def test_first_page_only(self):
+        self.assertEqual(self.group_ids(), list(range(5)))
+        self.assertTrue(self.rv.has_groups())
+
+    def test_window_slides(self):
+        for _ in range(3):
+            self.assertTrue(self.rv.load_next_page())
+        self.assertEqual(self.group_ids(), list(range(10, 20)))
+        self.assertEqual(self.rv._group_rows[10], 0)
+        self.assertTrue(self.rv.load_previous_page())
+        self.assertEqual(self.group_ids(), list(range(5, 15)))
+
+        while self.rv.load_next_page():
+            pass
+        self.assertEqual(self.group_ids(), list(range(21, 31)))
+        self.assertFalse(self.rv.load_next_page())
+
+    def test_sort(self):
+        self.rv.sort_key = 'size'
+        self.assertEqual(self.group_ids(), [30, 0, 1, 2, 3])
+
+    def test_selection_outside_window(self):
+        self.assertEqual(self.rv.auto_select(SelectionRules(['smallest_file'])), 32)
+        self.rv.remove_selected()
+        self.assertEqual(len(self.rv.images_to_remove), 32)
+        self.assertTrue(all(group['hidden'] for group in self.rv.data))
+
+        self.rv.load_next_page()
+        self.assertEqual(self.group_ids(), list(range(10)))
+        self.assertTrue(all(group['hidden'] for group in self.rv.data))
+
+    def test_removal_resolves_only_window(self):
+        built = []
+        image_data = self.rv._image_data
+        self.rv._image_data = lambda image_id: built.append(image_id) or image_data(image_id)
+        self.rv.auto_select(SelectionRules(['smallest_file']))
+        self.rv.remove_selected()
+        # Only the rows of the first page are rebuilt, not one data dict per removed image
+        self.assertEqual(len(built), 5)
+        self.assertEqual(len(self.rv.images_to_remove), 32)
+
+
+class TestFinishStreaming(TestDuplicateManager):
+    def setUp(self):
+        table = ImageTable([f'image_{image_id}.jpg' for image_id in range(8)])
+        self.rv = ImageGroupsRecycleView(image_table=table)
+        self.rv.remove_images = lambda dt: None
+        self.rv.add_group(0, [0, 1])
+        self.rv.grow_group(0, 2)
+        self.rv.add_group(1, [3, 4])
+        self.rv.select_image(0, 1)
+        self.rv.remove_selected()
+        self.rv.select_image(1, 0)
+
+    def group_images(self):
+        return [[elem['image_id'] for elem in group['data']] for group in self.rv.data]
+
+    def test_streamed_state_kept(self):
+        self.rv.finish_streaming([[0, 1, 2], [3, 4], [5, 6, 7]])
+        self.assertEqual(self.group_images(), [[0, 2], [3, 4], [5, 6, 7]])
+        self.assertEqual(self.rv.selected_images(1), {0})
+
+        self.rv.sort_key = 'size'
+        self.assertEqual([group['group_id'] for group in self.rv.data], [2, 0, 1])
+
+    def test_late_group_events_ignored(self):
+        self.rv.finish_streaming([[0, 1, 2, 5], [3, 4], [6, 7]])
+        # Queued before the search finished, already part of the finished groups
+        self.rv.grow_group(0, 5)
+        self.rv.add_group(2, [6, 7])
+        self.assertEqual(self.group_images(), [[0, 2, 5], [3, 4], [6, 7]])
+        self.assertEqual(self.rv._group_rows, {0: 0, 1: 1, 2: 2})
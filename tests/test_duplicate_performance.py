@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from tests.duplicate_performance import LazyImageSource, ThresholdCurve
+
+
+class TestThresholdCurve(TestCase):
+    def setUp(self):
+        self.scores = np.array([0.9, 0.8, 0.3, 0.7, 0.7, 0.1], dtype=np.float32)
+        self.actual = np.array([True, False, False, True, False, True])
+        self.curve = ThresholdCurve(self.scores, self.actual)
+
+    def brute_force_counts(self, threshold):
+        predicted = self.scores.astype(np.float64) >= threshold
+        return (int(np.sum(predicted & self.actual)), int(np.sum(~predicted & self.actual)),
+                int(np.sum(predicted & ~self.actual)), int(np.sum(~predicted & ~self.actual)))
+
+    def test_counts(self):
+        for threshold in (0.0, 0.1, 0.5, 0.7, 0.75, 0.9, 1.0):
+            self.assertEqual(self.curve.counts(threshold), self.brute_force_counts(threshold), threshold)
+
+    def test_counts_of_many_thresholds(self):
+        thresholds = np.array([0.0, 0.7, 1.0])
+        counts = np.stack(self.curve.counts(thresholds), axis=1)
+        self.assertEqual(counts.tolist(), [list(self.brute_force_counts(threshold)) for threshold in thresholds])
+
+    def test_threshold_rounded_to_scores(self):
+        # The float32 scores of 0.7 are just below 0.7, python floats and arrays of thresholds compare the same
+        self.assertEqual(self.curve.counts(0.7)[0], 1)
+        self.assertEqual(self.curve.counts(np.array([0.7]))[0].tolist(), [1])
+        self.assertEqual(self.curve.counts(np.float32(0.7))[0], 2)
+
+    def test_best_f1(self):
+        # At 0.1 every similar pair is found with three false positives, f1 = 3 / (3 + 0.5 * 3)
+        f1, threshold = self.curve.best_f1()
+        self.assertAlmostEqual(f1, 3 / 4.5)
+        self.assertAlmostEqual(threshold, 0.1, places=6)
+
+        f1s = [tp / (tp + 0.5 * (fp + fn)) for tp, fn, fp, _ in map(self.brute_force_counts, np.unique(self.scores))]
+        self.assertAlmostEqual(f1, max(f1s))
+
+    def test_curve(self):
+        curve = self.curve.curve([0.75, 0.1])
+        np.testing.assert_allclose(curve['thresholds'], [0.75, 0.1])
+        np.testing.assert_allclose(curve['precision'], [1 / 2, 3 / 6])
+        np.testing.assert_allclose(curve['recall'], [1 / 3, 1])
+
+    def test_no_similar_pairs(self):
+        curve = ThresholdCurve([0.5, 0.2], [False, False])
+        self.assertEqual(curve.counts(0.3), (0, 0, 1, 1))
+        self.assertEqual(curve.best_f1(), (1.0, float('inf')))
+
+
+class TestLazyImageSource(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for value in range(3):
+            path = os.path.join(self.directory, f'{value}.png')
+            cv2.imwrite(path, np.full((4, 5, 3), value, dtype=np.uint8))
+            self.paths.append(path)
+        self.image_bytes = 4 * 5 * 3
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_images(self):
+        source = LazyImageSource(self.paths)
+        self.assertEqual(len(source), 3)
+        self.assertEqual([int(image[0, 0, 0]) for image in source], [0, 1, 2])
+
+    def test_least_recently_used_evicted(self):
+        source = LazyImageSource(self.paths, max_bytes=2 * self.image_bytes)
+        for index in (0, 1, 0, 2):
+            source[index]
+        self.assertEqual(source.decodes, 3)
+        # 1 was the least recently used when 2 was decoded
+        source[0]
+        self.assertEqual(source.decodes, 3)
+        source[1]
+        self.assertEqual(source.decodes, 4)
+
+    def test_last_image_kept(self):
+        source = LazyImageSource(self.paths, max_bytes=0)
+        for _ in range(2):
+            source[1]
+        self.assertEqual(source.decodes, 1)
+
+    def test_unreadable(self):
+        source = LazyImageSource([self.paths[0] + '.missing'])
+        self.assertRaises(IOError, source.__getitem__, 0)
+
+    def test_registered_features_share_a_pass(self):
+        source = LazyImageSource(self.paths, max_bytes=0)
+        source.register('value', lambda image: int(image[0, 0, 0]))
+        source.register('width', lambda image: image.shape[1])
+        self.assertEqual(source.feature('value'), [0, 1, 2])
+        self.assertEqual(source.feature('width'), [5, 5, 5])
+        self.assertEqual(source.decodes, 3)
+        self.assertEqual(set(source.feature_seconds), {'value', 'width'})
+
+    def test_features_shared_by_name(self):
+        source = LazyImageSource(self.paths)
+        self.assertEqual(source.feature('value', lambda image: int(image[0, 0, 0])), [0, 1, 2])
+        # Another model asking for the same feature gets the cached values
+        self.assertEqual(source.feature('value', lambda image: -1), [0, 1, 2])
+        source.register('value', lambda image: -1)
+        source.compute_registered()
+        self.assertEqual(source.feature('value'), [0, 1, 2])
+
+    def test_clear(self):
+        source = LazyImageSource(self.paths)
+        source.feature('value', lambda image: int(image[0, 0, 0]))
+        source.clear()
+        self.assertEqual((source.decodes, source.decode_seconds, source.feature_seconds), (0, 0.0, dict()))
+        self.assertEqual(source.feature('value', lambda image: -1), [-1, -1, -1])
+        self.assertEqual(source.decodes, 3)
@@ -0,0 +1,85 @@
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from src.feature_store import FeatureStore
+
+
+class TestFeatureStore(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.random((50, 16))
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    def fill(self, store):
+        for image_id, vector in enumerate(self.vectors):
+            store.add(image_id + 100, vector)
+        return store
+
+    def expected_pairs(self, threshold):
+        sims = self.vectors @ self.vectors.T
+        return {(i, j) for i in range(len(sims)) for j in range(i + 1, len(sims)) if sims[i, j] > threshold}
+
+    def found_pairs(self, store, threshold, block_size):
+        return {(int(i), int(j)) for rows_i, rows_j, _ in store.similar_pairs(threshold, block_size)
+                for i, j in zip(rows_i, rows_j)}
+
+
+class TestInit(TestFeatureStore):
+    def test_invalid(self):
+        self.assertRaises(ValueError, FeatureStore, dim=0)
+        self.assertRaises(ValueError, FeatureStore, dim=4, capacity=0)
+
+
+class TestAdd(TestFeatureStore):
+    def test_grow(self):
+        store = self.fill(FeatureStore(dim=16, capacity=4))
+        self.assertEqual(len(store), 50)
+        self.assertGreaterEqual(store.capacity, 50)
+        np.testing.assert_array_equal(store.ids, np.arange(100, 150))
+        np.testing.assert_allclose(store.matrix, self.vectors, rtol=1e-6)
+
+    def test_invalid_length(self):
+        store = FeatureStore(dim=16)
+        self.assertRaises(ValueError, store.add, 0, np.zeros(8))
+
+    def test_quantized(self):
+        store = self.fill(FeatureStore(dim=16, quantize=True))
+        self.assertEqual(store.matrix.dtype, np.int8)
+        np.testing.assert_allclose(store.vector(3), self.vectors[3], atol=1 / 127)
+
+    def test_spill(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = FeatureStore(dim=16, capacity=4, ram_budget=16 * 4 * 8, spill_directory=directory)
+            self.fill(store)
+            self.assertTrue(store.spilled)
+            np.testing.assert_allclose(store.matrix, self.vectors, rtol=1e-6)
+            del store
+
+
+class TestSimilarPairs(TestFeatureStore):
+    def test_pairs(self):
+        store = self.fill(FeatureStore(dim=16))
+        self.assertEqual(self.found_pairs(store, 0.8, 7), self.expected_pairs(0.8))
+
+    def test_negative_threshold(self):
+        store = self.fill(FeatureStore(dim=16))
+        self.assertEqual(self.found_pairs(store, -1.5, 7), self.expected_pairs(-1.5))
+
+    def test_num_compared(self):
+        store = self.fill(FeatureStore(dim=16))
+        num_compared = sum(compared for _, _, compared in store.similar_pairs(0.8, 7))
+        self.assertEqual(num_compared, 50 * 49 // 2)
+
+    def test_quantized_pairs(self):
+        store = self.fill(FeatureStore(dim=16, quantize=True))
+        # Quantization moves similarities by much less than the gap between these thresholds
+        self.assertTrue(self.expected_pairs(0.85) <= self.found_pairs(store, 0.8, 16))
+        self.assertTrue(self.found_pairs(store, 0.8, 16) <= self.expected_pairs(0.75))
+
+    def test_pair_similarities(self):
+        store = self.fill(FeatureStore(dim=16, quantize=True))
+        sims = store.pair_similarities(np.array([0, 1]), np.array([2, 3]))
+        np.testing.assert_allclose(sims, [self.vectors[0] @ self.vectors[2], self.vectors[1] @ self.vectors[3]],
+                                   atol=0.02)
@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from src.frame_monitor import FrameTimeMonitor
+
+
+class TestRecord(TestCase):
+    def test_stats(self):
+        monitor = FrameTimeMonitor(k_points=2, slow_frame_time=0.03)
+        for frame_time in (0.01, 0.02, 0.05):
+            monitor.record(frame_time)
+        self.assertEqual(monitor.frames, 3)
+        self.assertEqual(monitor.slow_frames, 1)
+        self.assertAlmostEqual(monitor.worst, 0.05)
+        self.assertAlmostEqual(monitor.average.average, 0.035)
+        self.assertAlmostEqual(monitor.total_time, 0.08)
+
+    def test_reset(self):
+        monitor = FrameTimeMonitor()
+        monitor.record(1)
+        monitor.reset()
+        self.assertEqual(monitor.frames, 0)
+        self.assertEqual(monitor.worst, 0)
+        self.assertIn("0 frames", monitor.summary())
+
+    def test_start_stop(self):
+        monitor = FrameTimeMonitor()
+        monitor.start()
+        self.assertTrue(monitor.running)
+        monitor.stop()
+        self.assertFalse(monitor.running)
+        monitor.stop()
@@ -0,0 +1,60 @@
+from unittest import TestCase
+
+from src.group_adapter import GroupDataAdapter
+from src.image_table import ImageTable, ImageRecord
+from src.result_store import DuplicateResultStore
+
+
+class TestGroupDataAdapter(TestCase):
+    def setUp(self):
+        self.table = ImageTable([f'{image_id}.jpg' for image_id in range(8)])
+        for image_id, size in enumerate([10, 10, 10, 5, 50, 1, 2, 3]):
+            self.table.record(image_id, ImageRecord(ratio=1, size=size, mtime=0))
+        self.groups = [[0, 1, 2], [3, 4], [5, 6, 7]]
+        self.adapter = GroupDataAdapter.from_groups(self.groups, self.table)
+
+    def group_ids(self):
+        return [row['group_id'] for row in self.adapter.rows(0, len(self.adapter), lambda image_id: image_id)]
+
+    def test_rows(self):
+        self.assertEqual(len(self.adapter), 3)
+        rows = self.adapter.rows(1, 3, lambda image_id: {'image_id': image_id})
+        self.assertEqual([row['group_id'] for row in rows], [1, 2])
+        self.assertEqual([elem['image_id'] for elem in rows[1]['data']], [5, 6, 7])
+        self.assertFalse(rows[0]['hidden'])
+
+    def test_keys(self):
+        self.assertEqual(self.adapter.group_sizes().tolist(), [3, 2, 3])
+        self.assertEqual(self.adapter.reclaimable_bytes().tolist(), [20, 5, 3])
+
+    def test_sort(self):
+        self.adapter.sort('reclaimable')
+        self.assertEqual(self.group_ids(), [0, 1, 2])
+        self.adapter.sort('size')
+        self.assertEqual(self.group_ids(), [0, 2, 1])
+        self.adapter.sort('found')
+        self.assertEqual(self.group_ids(), [0, 1, 2])
+        self.assertRaises(ValueError, self.adapter.sort, 'name')
+
+    def test_remove_and_restore(self):
+        self.assertEqual(self.adapter.remove(0, {0, 1}), [0, 1])
+        self.assertEqual(self.adapter.group_image_ids(0), [2])
+        self.assertTrue(self.adapter.row(0, lambda image_id: image_id)['hidden'])
+        # Positions are among the images left in the group
+        self.assertEqual(self.adapter.remove(2, {1}), [6])
+        self.assertEqual(self.adapter.remove(2, {1}), [7])
+        self.assertEqual(self.adapter.group_sizes().tolist(), [1, 2, 1])
+        self.assertEqual(self.adapter.reclaimable_bytes().tolist(), [0, 5, 0])
+
+        image_ids, group_offsets = self.adapter.packed()
+        self.assertEqual(image_ids.tolist(), [2, 3, 4, 5])
+        self.assertEqual(group_offsets.tolist(), [0, 1, 3, 4])
+
+        self.adapter.restore(0, [1])
+        self.assertEqual(self.adapter.group_image_ids(0), [1, 2])
+
+    def test_result_store(self):
+        adapter = GroupDataAdapter.from_result_store(DuplicateResultStore.from_groups(self.groups, self.table))
+        adapter.sort('reclaimable')
+        self.assertEqual(adapter.reclaimable_bytes().tolist(), [20, 5, 3])
+        self.assertEqual([len(row['data']) for row in adapter.rows(0, 3, lambda path_id: path_id)], [3, 2, 3])
@@ -0,0 +1,76 @@
+from unittest import TestCase
+
+import numpy as np
+
+from src import hamming
+
+
+class TestHamming(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.queries = rng.integers(0, 2 ** 63, size=(7, 4), dtype=np.uint64)
+        self.database = rng.integers(0, 2 ** 63, size=(50, 4), dtype=np.uint64)
+        # Plant some near duplicates of the queries in the database
+        self.database[10] = self.queries[0]
+        self.database[10, 0] ^= np.uint64(0b101)
+        self.database[20] = self.queries[3]
+
+    @staticmethod
+    def reference_distance(a, b):
+        return sum(bin(int(x) ^ int(y)).count('1') for x, y in zip(a, b))
+
+    def reference_distances(self):
+        return np.array([[self.reference_distance(q, d) for d in self.database] for q in self.queries])
+
+
+class TestPopcount(TestHamming):
+    def test_table_and_native_agree(self):
+        words = self.database.ravel()
+        expected = [bin(int(word)).count('1') for word in words]
+        np.testing.assert_array_equal(hamming._popcount_table(words), expected)
+        np.testing.assert_array_equal(hamming.popcount(words), expected)
+
+    def test_all_bits(self):
+        np.testing.assert_array_equal(hamming._popcount_table(np.array([0, 2 ** 64 - 1], dtype=np.uint64)), [0, 64])
+
+
+class TestDistances(TestHamming):
+    def test_distances(self):
+        np.testing.assert_array_equal(hamming.hamming_distances(self.queries, self.database, block_size=8),
+                                      self.reference_distances())
+
+    def test_single_word(self):
+        distances = hamming.hamming_distances(np.array([0b1111], dtype=np.uint64), np.array([0, 0b1], dtype=np.uint64))
+        np.testing.assert_array_equal(distances, [[4, 3]])
+
+
+class TestSearch(TestHamming):
+    def test_top_k(self):
+        indices, distances = hamming.top_k(self.queries, self.database, k=5, block_size=8)
+        expected = self.reference_distances()
+        for q in range(len(self.queries)):
+            np.testing.assert_array_equal(distances[q], np.sort(expected[q])[:5])
+            np.testing.assert_array_equal(expected[q][indices[q]], distances[q])
+        self.assertEqual((indices[0, 0], distances[0, 0]), (10, 2))
+        self.assertEqual((indices[3, 0], distances[3, 0]), (20, 0))
+
+    def test_top_k_more_than_database(self):
+        indices, _ = hamming.top_k(self.queries, self.database[:3], k=10)
+        self.assertEqual(indices.shape, (7, 3))
+
+    def test_radius_search(self):
+        query_indices, database_indices, distances = hamming.radius_search(self.queries, self.database, 2,
+                                                                           block_size=8)
+        self.assertEqual(sorted(zip(query_indices.tolist(), database_indices.tolist(), distances.tolist())),
+                         [(0, 10, 2), (3, 20, 0)])
+
+    def test_pairs_within(self):
+        database = np.concatenate([self.database, self.queries])
+        expected = {(i, j) for i in range(len(database)) for j in range(i + 1, len(database))
+                    if self.reference_distance(database[i], database[j]) <= 2}
+        found, compared = set(), 0
+        for rows_i, rows_j, num_compared in hamming.pairs_within(database, 2, block_size=16):
+            found.update(zip(rows_i.tolist(), rows_j.tolist()))
+            compared += num_compared
+        self.assertEqual(found, expected)
+        self.assertEqual(compared, len(database) * (len(database) - 1) // 2)
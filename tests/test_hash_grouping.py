@@ -0,0 +1,93 @@
+from unittest import TestCase
+
+import numpy as np
+
+from src.hash_grouping import HashGrouper, vote_groups
+from src.union_find import UnionFind
+
+
+class TestHashGrouper(TestCase):
+    def reference_groups(self, hashes):
+        buckets = dict()
+        for image_id, hash_val in enumerate(hashes):
+            buckets.setdefault(hash_val, []).append(image_id)
+        return sorted(bucket for bucket in buckets.values() if len(bucket) > 1)
+
+    def grouped(self, hashes, hash_size):
+        grouper = HashGrouper(hash_size, capacity=3)
+        for image_id, hash_val in enumerate(hashes):
+            grouper.add(hash_val, image_id)
+        return [group.tolist() for group in grouper.groups()]
+
+
+class TestVoteGroups(TestHashGrouper):
+    def groupers(self, hash_columns, image_ids=None):
+        image_ids = range(len(hash_columns[0])) if image_ids is None else image_ids
+        groupers = [HashGrouper(8, capacity=2) for _ in hash_columns]
+        for grouper, hashes in zip(groupers, hash_columns):
+            for image_id, hash_val in zip(image_ids, hashes):
+                grouper.add(hash_val, image_id)
+        return groupers
+
+    def test_labels(self):
+        grouper = self.groupers([[5, 7, 5, 9]])[0]
+        labels = grouper.labels()
+        self.assertEqual(labels[0], labels[2])
+        self.assertEqual(len(set(labels.tolist())), 3)
+
+    def test_single_vote_is_union(self):
+        groupers = self.groupers([[1, 1, 2, 3, 4], [5, 6, 6, 7, 8]])
+        self.assertEqual([group.tolist() for group in vote_groups(groupers, 1)], [[0, 1, 2]])
+
+    def test_all_votes_is_intersection(self):
+        groupers = self.groupers([[1, 1, 1, 3], [5, 5, 6, 5]])
+        self.assertEqual([group.tolist() for group in vote_groups(groupers, 2)], [[0, 1]])
+
+    def test_majority(self):
+        groupers = self.groupers([[1, 1, 2, 2], [3, 3, 4, 5], [6, 7, 8, 9]])
+        self.assertEqual([group.tolist() for group in vote_groups(groupers, 2)], [[0, 1]])
+
+    def test_matches_reference(self):
+        rng = np.random.default_rng(3)
+        columns = [[int(h) for h in rng.integers(0, 6, size=60)] for _ in range(3)]
+        image_ids = rng.permutation(60)
+        union_find = UnionFind(60)
+        for i in range(60):
+            for j in range(i + 1, 60):
+                if sum(column[i] == column[j] for column in columns) >= 2:
+                    union_find.union(image_ids[i], image_ids[j])
+        expected = [group.tolist() for group in union_find.components(min_size=2)]
+        actual = [group.tolist() for group in vote_groups(self.groupers(columns, image_ids), 2)]
+        self.assertEqual(actual, expected)
+
+    def test_invalid_votes(self):
+        groupers = self.groupers([[1, 1], [2, 2]])
+        self.assertRaises(ValueError, vote_groups, groupers, 0)
+        self.assertRaises(ValueError, vote_groups, groupers, 3)
+
+
+class TestGroups(TestHashGrouper):
+    def test_empty(self):
+        self.assertEqual(HashGrouper(8).groups(), [])
+
+    def test_invalid_capacity(self):
+        self.assertRaises(ValueError, HashGrouper, 8, capacity=0)
+
+    def test_single_word(self):
+        rng = np.random.default_rng(0)
+        hashes = [int(h) for h in rng.integers(0, 50, size=200)]
+        self.assertEqual(self.grouped(hashes, 8), self.reference_groups(hashes))
+
+    def test_multiple_words(self):
+        rng = np.random.default_rng(1)
+        # Hashes which only differ in their high words must not be grouped together
+        bases = [int(rng.integers(0, 2 ** 62)) for _ in range(20)]
+        hashes = [bases[i % 20] << (64 * (i % 4)) for i in range(300)]
+        self.assertEqual(self.grouped(hashes, 16), self.reference_groups(hashes))
+
+    def test_min_size(self):
+        grouper = HashGrouper(8)
+        for image_id, hash_val in enumerate([1, 1, 2, 2, 2, 3]):
+            grouper.add(hash_val, image_id)
+        self.assertEqual([group.tolist() for group in grouper.groups(min_size=3)], [[2, 3, 4]])
+        self.assertEqual(len(grouper.groups(min_size=1)), 3)
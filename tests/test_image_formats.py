@@ -0,0 +1,53 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from src.image_formats import IMAGE_FORMATS, format_code, path_format_code, sniff_format
+from src.image_table import ImageTable, stat_record
+
+
+class TestFormatCode(TestCase):
+    def test_names_and_extensions(self):
+        self.assertEqual(IMAGE_FORMATS[format_code('jpeg')], 'jpeg')
+        self.assertEqual(format_code('.JPG'), format_code('jpeg'))
+        self.assertEqual(format_code('tif'), format_code('tiff'))
+        self.assertEqual(format_code('docx'), 0)
+
+    def test_path_format_code(self):
+        self.assertEqual(path_format_code(os.path.join('a.b', 'c.PNG')), format_code('png'))
+        self.assertEqual(path_format_code(os.path.join('a.jpg', 'c')), 0)
+
+
+class TestSniffFormat(TestCase):
+    def test_encoded_images(self):
+        image = np.zeros((8, 8, 3), dtype=np.uint8)
+        for extension in ('.jpg', '.png', '.bmp', '.tiff', '.webp', '.ppm'):
+            encoded = cv2.imencode(extension, image)[1].tobytes()
+            self.assertEqual(sniff_format(encoded), format_code(extension), extension)
+
+    def test_unknown(self):
+        self.assertEqual(sniff_format(b''), 0)
+        self.assertEqual(sniff_format(b'not an image'), 0)
+
+    def test_stat_record_uses_contents(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A png saved with the wrong extension
+            path = os.path.join(directory, 'image.jpg')
+            image = np.zeros((6, 9, 3), dtype=np.uint8)
+            with open(path, 'wb') as f:
+                f.write(cv2.imencode('.png', image)[1].tobytes())
+
+            record = stat_record(path, image)
+            self.assertEqual((record.width, record.height, record.format), (9, 6, format_code('png')))
+            # The header read with the image is sniffed instead of the file
+            header = cv2.imencode('.bmp', image)[1].tobytes()
+            self.assertEqual(stat_record(path, image, header=header).format, format_code('bmp'))
+            self.assertEqual(record.size, os.path.getsize(path))
+
+            table = ImageTable([path])
+            self.assertEqual(table.formats[0], format_code('jpeg'))
+            table.record(0, record)
+            self.assertEqual(table.formats[0], format_code('png'))
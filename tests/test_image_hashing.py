@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from src import image_hashing
+
+
+class TestWords(TestCase):
+    def test_num_words(self):
+        self.assertEqual(image_hashing.num_hash_words(4), 1)
+        self.assertEqual(image_hashing.num_hash_words(8), 1)
+        self.assertEqual(image_hashing.num_hash_words(16), 4)
+
+    def test_hash_to_words(self):
+        hash_val = (3 << 192) | (2 << 64) | 1
+        np.testing.assert_array_equal(image_hashing.hash_to_words(hash_val, 16), [1, 2, 0, 3])
+
+
+class TestComputeHashes(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.image = rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+
+    def test_dhash_unchanged(self):
+        # Reference implementation dhash was written with
+        resized = cv2.resize(cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY), (17, 16))
+        diff = resized[:, 1:] > resized[:, :-1]
+        expected = sum([2 ** i for (i, v) in enumerate(diff.flatten()) if v])
+        self.assertEqual(image_hashing.dhash(self.image, 16), expected)
+
+    def test_matches_single_algorithms(self):
+        hashes = image_hashing.compute_hashes(self.image, 8, ('dhash', 'ahash', 'phash', 'bhash'))
+        self.assertEqual(hashes, (image_hashing.dhash(self.image), image_hashing.ahash(self.image),
+                                  image_hashing.phash(self.image), image_hashing.bhash(self.image)))
+
+    def test_hash_bits(self):
+        for algorithm in image_hashing.HASH_ALGORITHMS:
+            hash_val, = image_hashing.compute_hashes(self.image, 16, (algorithm,))
+            self.assertLess(hash_val, 2 ** 256)
+
+
+class TestInvariantHashes(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        noise = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+        self.image = cv2.GaussianBlur(noise, (15, 15), 5)
+        self.algorithms = tuple(image_hashing.HASH_ALGORITHMS)
+
+    def orientations(self):
+        return [cv2.rotate(self.image, cv2.ROTATE_90_CLOCKWISE), cv2.rotate(self.image, cv2.ROTATE_180),
+                cv2.rotate(self.image, cv2.ROTATE_90_COUNTERCLOCKWISE), cv2.flip(self.image, 1),
+                cv2.flip(self.image, 0), cv2.transpose(self.image)]
+
+    def test_rotated_and_mirrored_match(self):
+        expected = image_hashing.compute_hashes(self.image, 8, self.algorithms, invariant=True)
+        for oriented in self.orientations():
+            self.assertEqual(image_hashing.compute_hashes(oriented, 8, self.algorithms, invariant=True), expected)
+
+    def test_plain_hashes_differ(self):
+        expected = image_hashing.compute_hashes(self.image, 8, self.algorithms)
+        for oriented in self.orientations():
+            self.assertNotEqual(image_hashing.compute_hashes(oriented, 8, self.algorithms), expected)
+
+    def test_canonical_is_minimum(self):
+        gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+        oriented = [np.rot90(small, k) for k in range(4)] + [np.rot90(small, k)[:, ::-1] for k in range(4)]
+        expected = min(image_hashing.HASH_ALGORITHMS['phash'](np.ascontiguousarray(o), 16) for o in oriented)
+        self.assertEqual(image_hashing.compute_hashes(self.image, 16, ('phash',), invariant=True), (expected,))
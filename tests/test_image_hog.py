@@ -0,0 +1,56 @@
+from unittest import TestCase, skipUnless
+
+import cv2
+import numpy as np
+
+from src import image_hog
+
+# Only the tests computing descriptors need HOG, the size checks run on every OpenCV build
+requires_hog = skipUnless(hasattr(cv2, 'HOGDescriptor'), "OpenCV build has no HOGDescriptor")
+
+
+class TestImageHOG(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        noise = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+        self.image = cv2.GaussianBlur(noise, (9, 9), 3)
+
+
+class TestThumbnailSize(TestImageHOG):
+    def test_invalid_sizes(self):
+        for thumbnail_size in (0, 8, 30, 65):
+            self.assertRaises(ValueError, image_hog.check_thumbnail_size, thumbnail_size)
+
+    @requires_hog
+    def test_hog_size(self):
+        # (blocks per side) ^ 2 * 4 cells per block * 9 bins
+        self.assertEqual(image_hog.hog_size(16), 36)
+        self.assertEqual(image_hog.hog_size(64), 7 * 7 * 36)
+
+    @requires_hog
+    def test_descriptor_cached(self):
+        self.assertIs(image_hog.hog_descriptor(32), image_hog.hog_descriptor(32))
+
+
+@requires_hog
+class TestVectors(TestImageHOG):
+    def test_unit_length(self):
+        vector = image_hog.calculate_hog_vector(self.image, 64)
+        self.assertEqual(vector.shape, (image_hog.hog_size(64),))
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1, places=5)
+
+    def test_multiple_sizes(self):
+        vectors = image_hog.calculate_hog_vectors(self.image, (32, 64))
+        np.testing.assert_allclose(vectors[0], image_hog.calculate_hog_vector(self.image, 32))
+        np.testing.assert_allclose(vectors[1], image_hog.calculate_hog_vector(self.image, 64))
+
+    def test_resized_copy_similar(self):
+        resized = cv2.resize(self.image, (80, 60), interpolation=cv2.INTER_AREA)
+        brighter = cv2.convertScaleAbs(self.image, alpha=0.8, beta=40)
+        other = cv2.GaussianBlur(np.random.default_rng(1).integers(0, 256, size=(120, 160, 3), dtype=np.uint8),
+                                 (9, 9), 3)
+
+        vector = image_hog.calculate_hog_vector(self.image)
+        self.assertGreater(vector @ image_hog.calculate_hog_vector(resized), .85)
+        self.assertGreater(vector @ image_hog.calculate_hog_vector(brighter), .85)
+        self.assertLess(vector @ image_hog.calculate_hog_vector(other), vector @ image_hog.calculate_hog_vector(resized))
@@ -0,0 +1,104 @@
+import io
+from unittest import TestCase
+
+import numpy as np
+from src.image_table import ImageTable, ImageRecord
+from src.result_store import DuplicateResultStore
+
+
+class TestDuplicateResultStore(TestCase):
+    paths = ["a.jpg", "b.jpg", "c.jpg", "d.jpg", "e.jpg", "f/ü.png", "unique.jpg"]
+    groups = [[0, 1], [2, 3, 4], [1, 5]]
+
+    def setUp(self):
+        self.table = ImageTable(self.paths)
+        for image_id in range(len(self.paths)):
+            digest = bytes([image_id + 1] * 16) if image_id != 4 else None
+            self.table.record(image_id, ImageRecord(ratio=0.5 * (image_id + 1), size=10 * image_id, mtime=image_id,
+                                                    digest=digest, width=image_id, height=2, format=2))
+
+    def expected_paths(self, groups):
+        return [[self.paths[image_id] for image_id in group] for group in groups]
+
+
+class TestFromGroups(TestDuplicateResultStore):
+    def test_empty(self):
+        store = DuplicateResultStore.from_groups([], self.table)
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.num_images, 0)
+        self.assertEqual(store.groups(), [])
+
+    def test_interned_paths(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        self.assertEqual(len(store), 3)
+        self.assertEqual(store.num_images, 7)
+        # b.jpg is shared by two groups but only stored once and unique.jpg is not in a group
+        self.assertEqual(len(store.ratios), 6)
+
+    def test_groups(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        self.assertEqual(store.groups(), self.expected_paths(self.groups))
+        self.assertEqual(store.groups(1, 2), self.expected_paths(self.groups[1:2]))
+
+    def test_ratios(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        ratios = [store.ratio(path_id) for path_id in store.group_ids(1)]
+        self.assertEqual(ratios, [1.5, 2.0, 2.5])
+
+    def test_digests(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        digests = [store.digest(path_id) for path_id in store.group_ids(1)]
+        self.assertEqual(digests, [bytes([3] * 16), bytes([4] * 16), None])
+
+    def test_metadata(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        path_ids = store.group_ids(2)
+        self.assertEqual(store.sizes[path_ids].tolist(), [10, 50])
+        self.assertEqual(store.mtimes[path_ids].tolist(), [1, 5])
+        self.assertEqual(store.widths[path_ids].tolist(), [1, 5])
+        self.assertEqual(store.heights[path_ids].tolist(), [2, 2])
+        self.assertEqual(store.formats[path_ids].tolist(), [2, 2])
+        self.assertEqual(store.depths[path_ids].tolist(), [0, 1])
+
+    def test_invalid_group(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        self.assertRaises(IndexError, store.group_ids, 3)
+        self.assertRaises(IndexError, store.group_ids, -1)
+
+
+class TestSaveLoad(TestDuplicateResultStore):
+    def test_round_trip(self):
+        buffer = io.BytesIO()
+        DuplicateResultStore.from_groups(self.groups, self.table).save(buffer)
+        buffer.seek(0)
+        store = DuplicateResultStore.load(buffer)
+        self.assertEqual(store.groups(), self.expected_paths(self.groups))
+
+    def test_digests_round_trip(self):
+        buffer = io.BytesIO()
+        DuplicateResultStore.from_groups(self.groups, self.table).save(buffer)
+        buffer.seek(0)
+        store = DuplicateResultStore.load(buffer)
+        self.assertEqual(store.digest(store.group_ids(0)[1]), bytes([2] * 16))
+
+    def test_load_without_digests(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        buffer = io.BytesIO()
+        np.savez(buffer, path_blob=store.path_blob, path_offsets=store.path_offsets, ratios=store.ratios,
+                 path_ids=store.path_ids, group_offsets=store.group_offsets)
+        buffer.seek(0)
+        store = DuplicateResultStore.load(buffer)
+        self.assertIsNone(store.digest(0))
+        self.assertEqual(store.groups(), self.expected_paths(self.groups))
+        # Unknown metadata, the format is taken from the extension
+        self.assertTrue(np.all(store.sizes == -1))
+        self.assertTrue(np.all(np.isnan(store.mtimes)))
+        self.assertEqual(store.formats[store.group_ids(2)].tolist(), [1, 2])
+
+    def test_metadata_round_trip(self):
+        buffer = io.BytesIO()
+        DuplicateResultStore.from_groups(self.groups, self.table).save(buffer)
+        buffer.seek(0)
+        store = DuplicateResultStore.load(buffer)
+        self.assertEqual(store.widths[store.group_ids(1)].tolist(), [2, 3, 4])
+        self.assertEqual(store.formats.tolist(), [2] * 6)
@@ -0,0 +1,92 @@
+import os
+from unittest import TestCase
+
+import numpy as np
+
+from src.image_table import ImageTable, ImageRecord
+from src.result_store import DuplicateResultStore
+from src.selection_rules import SelectionRules, flatten_groups, selected_positions
+
+
+class TestSelectionRules(TestCase):
+    def setUp(self):
+        paths = [os.path.join('a', 'b', '0.jpg'), os.path.join('a', '1.png'), os.path.join('a', 'b', 'c', '2.gif'),
+                 os.path.join('a', '3.jpg'), os.path.join('a', '4.jpg'), os.path.join('a', '5.jpg')]
+        self.table = ImageTable(paths)
+        #                 width, size, mtime
+        records = [(100, 300, 5),
+                   (200, 100, 9),
+                   (200, 200, 1),
+                   (50, 100, 2),
+                   (50, 100, 1),
+                   (50, 500, 3)]
+        for image_id, (width, size, mtime) in enumerate(records):
+            self.table.record(image_id, ImageRecord(ratio=1, size=size, mtime=mtime, width=width, height=width))
+        self.groups = [[0, 1, 2], [3, 4, 5]]
+
+    def kept(self, rules, **kwargs):
+        selection = SelectionRules(rules, **kwargs).select_groups(self.groups, self.table)
+        return [[image_id for position, image_id in enumerate(group) if position not in selection.get(i, set())]
+                for i, group in enumerate(self.groups)]
+
+    def test_single_rule(self):
+        self.assertEqual(self.kept(['largest_file']), [[0], [5]])
+        self.assertEqual(self.kept(['smallest_file']), [[1], [3]])
+        self.assertEqual(self.kept(['oldest']), [[2], [4]])
+        self.assertEqual(self.kept(['newest']), [[1], [5]])
+        self.assertEqual(self.kept(['shallowest_path']), [[1], [3]])
+        self.assertEqual(self.kept(['deepest_path']), [[2], [3]])
+
+    def test_ties_broken_by_next_rule(self):
+        self.assertEqual(self.kept(['highest_resolution', 'oldest']), [[2], [4]])
+        self.assertEqual(self.kept(['highest_resolution', 'newest']), [[1], [5]])
+
+    def test_ties_keep_first(self):
+        self.assertEqual(self.kept(['lowest_resolution']), [[0], [3]])
+
+    def test_preferred_format(self):
+        self.assertEqual(self.kept(['preferred_format']), [[1], [3]])
+        self.assertEqual(self.kept(['preferred_format'], format_preference=['.GIF', 'jpg']), [[2], [3]])
+
+    def test_unknown_metadata_loses(self):
+        self.table.sizes[5] = -1
+        self.table.mtimes[4] = np.nan
+        self.assertEqual(self.kept(['largest_file']), [[0], [3]])
+        self.assertEqual(self.kept(['smallest_file']), [[1], [3]])
+        self.assertEqual(self.kept(['oldest']), [[2], [3]])
+
+    def test_one_image_kept_per_group(self):
+        rng = np.random.default_rng(0)
+        table = ImageTable([f'{i}.jpg' for i in range(1000)])
+        table.widths[:] = rng.integers(1, 5, size=1000)
+        table.heights[:] = 1
+        table.sizes[:] = rng.integers(1, 5, size=1000)
+        group_offsets = np.concatenate([[0], np.sort(rng.choice(np.arange(1, 1000), 99, replace=False)), [1000]])
+        selected = SelectionRules(['highest_resolution', 'largest_file']).select(
+            rng.permutation(1000), group_offsets, table)
+        kept_per_group = np.add.reduceat(~selected, group_offsets[:-1])
+        self.assertTrue(np.all(kept_per_group == 1))
+
+    def test_result_store(self):
+        store = DuplicateResultStore.from_groups(self.groups, self.table)
+        rules = SelectionRules(['highest_resolution', 'oldest'])
+        selected = rules.select(store.path_ids, store.group_offsets, store)
+        self.assertEqual(selected.tolist(), [True, True, False, True, False, True])
+        self.assertEqual(rules.select(store.path_ids, store.group_offsets, store).tolist(),
+                         rules.select(np.concatenate(self.groups), store.group_offsets, self.table).tolist())
+
+    def test_invalid_rules(self):
+        self.assertRaises(ValueError, SelectionRules, [])
+        self.assertRaises(ValueError, SelectionRules, ['biggest'])
+        self.assertRaises(ValueError, SelectionRules, ['preferred_format'], format_preference=['png', 'docx'])
+
+
+class TestPacking(TestCase):
+    def test_flatten_groups(self):
+        image_ids, group_offsets = flatten_groups([[4, 2], [], [7, 1, 0]])
+        self.assertEqual(image_ids.tolist(), [4, 2, 7, 1, 0])
+        self.assertEqual(group_offsets.tolist(), [0, 2, 2, 5])
+
+    def test_selected_positions(self):
+        selected = np.array([False, True, True, False, True])
+        self.assertEqual(selected_positions(selected, np.array([0, 2, 2, 5])), {0: {1}, 2: {0, 2}})
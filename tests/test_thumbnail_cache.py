@@ -0,0 +1,155 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase, mock
+
+import cv2
+import numpy as np
+
+from src import thumbnail_cache
+from src.duplicate_finder import THUMBNAIL_EVICT_INTERVAL, HashDuplicateFinderController
+from src.image_formats import format_code, sniff_format
+from src.image_table import ImageRecord, ImageTable
+from src.thumbnail_cache import ThumbnailCache
+
+
+class TestThumbnailCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ThumbnailCache(os.path.join(self.directory, 'cache'), height=32)
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_image(self, name, image):
+        path = os.path.join(self.directory, name)
+        cv2.imwrite(path, image)
+        return path
+
+
+class TestInit(TestThumbnailCache):
+    def test_invalid(self):
+        self.assertRaises(ValueError, ThumbnailCache, self.directory, extension='.png')
+        self.assertRaises(ValueError, ThumbnailCache, self.directory, max_bytes=-1)
+
+    def test_creates_directory(self):
+        self.assertTrue(os.path.isdir(self.cache.directory))
+
+
+class TestPutGet(TestThumbnailCache):
+    def test_missing(self):
+        self.assertIsNone(self.cache.get(b'\x01' * 16))
+
+    def test_put(self):
+        path = self.cache.put(b'\x01' * 16, self.image)
+        self.assertEqual(self.cache.get(b'\x01' * 16), path)
+        self.assertEqual(cv2.imread(path).shape, (32, 43, 3))
+
+    def test_small_images_not_enlarged(self):
+        path = self.cache.put(b'\x02' * 16, self.image[:10, :20])
+        self.assertEqual(cv2.imread(path).shape, (10, 20, 3))
+
+    def test_panorama_width_bounded(self):
+        path = self.cache.put(b'\x03' * 16, np.zeros((40, 1000, 3), dtype=np.uint8))
+        self.assertEqual(cv2.imread(path).shape[1], 4 * 32)
+
+    def test_failed_write_not_cached(self):
+        with mock.patch.object(thumbnail_cache.cv2, 'imwrite', return_value=False):
+            self.assertRaises(OSError, self.cache.put, b'\x05' * 16, self.image)
+        self.assertIsNone(self.cache.get(b'\x05' * 16))
+        self.assertEqual(self.cache.size(), 0)
+
+        # Written on the next try
+        path = self.cache.put(b'\x05' * 16, self.image)
+        self.assertIsNotNone(cv2.imread(path))
+
+    def test_webp(self):
+        cache = ThumbnailCache(os.path.join(self.directory, 'webp'), extension='.webp')
+        path = cache.put(b'\x04' * 16, self.image)
+        self.assertTrue(path.endswith('.webp'))
+        self.assertIsNotNone(cv2.imread(path))
+
+
+class TestOpenImage(TestThumbnailCache):
+    def test_without_cache(self):
+        path = self.write_image('a.png', self.image)
+        image, digest, header = thumbnail_cache.open_image(path)
+        np.testing.assert_array_equal(image, self.image)
+        self.assertIsNone(digest)
+        self.assertEqual(sniff_format(header), format_code('png'))
+
+    def test_content_addressed(self):
+        first = self.write_image('a.png', self.image)
+        copy = self.write_image('copy.png', self.image)
+        other = self.write_image('b.png', 255 - self.image)
+
+        image, digest, _ = thumbnail_cache.open_image(first, self.cache)
+        np.testing.assert_array_equal(image, self.image)
+        self.assertEqual(thumbnail_cache.open_image(copy, self.cache)[1], digest)
+        self.assertNotEqual(thumbnail_cache.open_image(other, self.cache)[1], digest)
+        self.assertIsNotNone(self.cache.get(digest))
+
+    def test_unreadable(self):
+        path = os.path.join(self.directory, 'broken.jpg')
+        with open(path, 'wb') as file:
+            file.write(b'not an image')
+        self.assertEqual(thumbnail_cache.open_image(path, self.cache), (None, None, None))
+        self.assertEqual(thumbnail_cache.open_image(path + '.missing', self.cache), (None, None, None))
+
+
+class TestEvict(TestThumbnailCache):
+    def test_least_recently_used_evicted(self):
+        digests = [bytes([i + 1] * 16) for i in range(4)]
+        for i, digest in enumerate(digests):
+            path = self.cache.put(digest, self.image)
+            # Distinct last use times, oldest first
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+        self.cache.get(digests[0])
+
+        sizes = [os.path.getsize(self.cache.path(digest)) for digest in digests]
+        self.cache.max_bytes = sum(sizes) - sizes[1] - sizes[2] + 1
+        self.assertEqual(self.cache.evict(), sizes[1] + sizes[2])
+        self.assertEqual([self.cache.get(digest) is not None for digest in digests], [True, False, False, True])
+
+    def test_under_budget(self):
+        self.cache.put(b'\x01' * 16, self.image)
+        self.assertEqual(self.cache.evict(), 0)
+        self.assertGreater(self.cache.size(), 0)
+
+    def test_grouped_thumbnails_kept(self):
+        controller = HashDuplicateFinderController(thumbnail_cache=self.cache)
+        controller.image_table = ImageTable([f'{image_id}.png' for image_id in range(6)])
+        sizes = []
+        for image_id in range(6):
+            digest = bytes([image_id + 1] * 16)
+            controller.image_table.record(image_id, ImageRecord(ratio=1, size=1, mtime=0, digest=digest, width=1,
+                                                                height=1))
+            path = self.cache.put(digest, self.image)
+            # The grouped images are the least recently written
+            os.utime(path, (time.time() - 100 + image_id, time.time() - 100 + image_id))
+            sizes.append(os.path.getsize(path))
+
+        controller.duplicate_images = [[0, 1]]
+        self.cache.max_bytes = sizes[0] + sizes[1]
+        controller._evict_thumbnails()
+        self.assertEqual([self.cache.get(bytes([image_id + 1] * 16)) is not None for image_id in range(6)],
+                         [True, True, False, False, False, False])
+
+    def test_evicted_during_search(self):
+        controller = HashDuplicateFinderController(thumbnail_cache=self.cache)
+        controller.image_table = ImageTable([f'{image_id}.png' for image_id in range(THUMBNAIL_EVICT_INTERVAL)])
+        digests = [image_id.to_bytes(16, 'big') for image_id in range(THUMBNAIL_EVICT_INTERVAL)]
+        for digest in digests[:2]:
+            self.cache.put(digest, self.image)
+        size = os.path.getsize(self.cache.path(digests[0]))
+        self.cache.max_bytes = size
+
+        for image_id, digest in enumerate(digests):
+            # Only the first two images wrote thumbnails, the cache is over budget until the interval is reached
+            self.assertEqual(self.cache.size(), 2 * size)
+            controller._record_image(image_id, ImageRecord(ratio=1, size=1, mtime=0, digest=digest, width=1,
+                                                           height=1), None)
+        self.assertEqual(self.cache.size(), size)
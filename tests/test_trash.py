@@ -0,0 +1,90 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from kivy.clock import Clock
+
+from src.trash import Trash, is_staged, staging_directory, TRASH_DIRECTORY_NAME
+
+
+class TestTrash(TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.root = self.temporary_directory.name
+        self.journal = os.path.join(self.root, 'journal')
+        self.paths = []
+        for directory in ('a', 'b'):
+            os.makedirs(os.path.join(self.root, directory))
+            for name in ('1.jpg', '2.jpg'):
+                path = os.path.join(self.root, directory, name)
+                with open(path, 'w') as f:
+                    f.write(path)
+                self.paths.append(path)
+        self.trash = Trash(self.journal, progress_interval=1)
+
+    def tearDown(self):
+        self.trash.wait()
+        self.temporary_directory.cleanup()
+
+    def test_trash(self):
+        batch_id = self.trash.trash(self.paths[:3])
+        self.trash.wait()
+        for path in self.paths[:3]:
+            self.assertFalse(os.path.exists(path))
+            self.assertTrue(os.path.exists(os.path.join(staging_directory(path, batch_id), os.path.basename(path))))
+        self.assertTrue(os.path.exists(self.paths[3]))
+        self.assertEqual(len(self.trash.batches[0].moves), 3)
+
+    def test_undo(self):
+        batch_id = self.trash.trash(self.paths)
+        self.assertTrue(self.trash.undo(batch_id))
+        self.trash.wait()
+        for path in self.paths:
+            with open(path) as f:
+                self.assertEqual(f.read(), path)
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'a', TRASH_DIRECTORY_NAME)))
+        self.assertEqual(os.listdir(self.journal), [])
+        self.assertFalse(self.trash.undo(batch_id))
+
+    def test_undo_most_recent(self):
+        self.trash.trash(self.paths[:1])
+        self.trash.trash(self.paths[1:2])
+        self.trash.undo()
+        self.trash.wait()
+        self.assertFalse(os.path.exists(self.paths[0]))
+        self.assertTrue(os.path.exists(self.paths[1]))
+
+    def test_purge(self):
+        self.trash.trash(self.paths[:2])
+        self.trash.purge()
+        self.trash.wait()
+        self.assertEqual(self.trash.batches, [])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'a')), [])
+        self.assertEqual(os.listdir(self.journal), [])
+
+    def test_missing_image_skipped(self):
+        missing = os.path.join(self.root, 'a', 'missing.jpg')
+        self.trash.trash([missing, self.paths[0]])
+        self.trash.wait()
+        self.assertEqual([original for original, _ in self.trash.batches[0].moves], [self.paths[0]])
+
+    def test_journal_reloaded(self):
+        batch_id = self.trash.trash(self.paths[:2])
+        self.trash.wait()
+        trash = Trash(self.journal)
+        self.assertTrue(trash.has_batch(batch_id))
+        trash.undo()
+        trash.wait()
+        self.assertTrue(os.path.exists(self.paths[0]))
+
+    def test_progress_events(self):
+        progress = []
+        self.trash.bind(on_progress=lambda trash, action, done, total: progress.append((action, done, total)))
+        self.trash.trash(self.paths[:2])
+        self.trash.wait()
+        Clock.tick()
+        self.assertEqual(progress, [('trash', 1, 2), ('trash', 2, 2)])
+
+    def test_is_staged(self):
+        self.assertTrue(is_staged(staging_directory(self.paths[0], '1') + '/1.jpg'))
+        self.assertFalse(is_staged(self.paths[0]))
@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import numpy as np
+
+from src.union_find import UnionFind
+
+
+def reference_components(n, edges):
+    """ Components found by a plain graph search, used to check the union find """
+    neighbours = [[] for _ in range(n)]
+    for a, b in edges:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+
+    seen = set()
+    components = []
+    for start in range(n):
+        if start in seen:
+            continue
+        seen.add(start)
+        stack, component = [start], []
+        while stack:
+            node = stack.pop()
+            component.append(node)
+            for neighbour in neighbours[node]:
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        components.append(sorted(component))
+    return components
+
+
+class TestUnionFind(TestCase):
+    pass
+
+
+class TestInit(TestUnionFind):
+    def test_singletons(self):
+        union_find = UnionFind(3)
+        self.assertEqual([c.tolist() for c in union_find.components()], [[0], [1], [2]])
+        self.assertEqual(union_find.components(min_size=2), [])
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, UnionFind, -1)
+        self.assertRaises(ValueError, UnionFind, "s")
+
+
+class TestUnion(TestUnionFind):
+    def test_union(self):
+        union_find = UnionFind(4)
+        self.assertTrue(union_find.union(0, 1))
+        self.assertFalse(union_find.union(1, 0))
+        self.assertTrue(union_find.union(2, 1))
+        self.assertTrue(union_find.connected(0, 2))
+        self.assertFalse(union_find.connected(0, 3))
+        self.assertEqual(union_find.size[union_find.find(0)], 3)
+
+    def test_union_many_matches_reference(self):
+        rng = np.random.default_rng(0)
+        for n, m in [(10, 5), (100, 80), (1000, 1500)]:
+            edges = rng.integers(0, n, size=(m, 2))
+            union_find = UnionFind(n)
+            union_find.union_many(edges)
+            self.assertEqual([c.tolist() for c in union_find.components()], reference_components(n, edges))
+
+    def test_union_many_sizes(self):
+        rng = np.random.default_rng(1)
+        union_find = UnionFind(500)
+        union_find.union_many(rng.integers(0, 500, size=(400, 2)))
+        labels = union_find.labels()
+        roots, counts = np.unique(labels, return_counts=True)
+        np.testing.assert_array_equal(union_find.size[roots], counts)
+
+    def test_union_many_empty(self):
+        union_find = UnionFind(3)
+        union_find.union_many(np.zeros((0, 2), dtype=np.int64))
+        self.assertEqual(len(union_find.components()), 3)
+
+    def test_chain(self):
+        # A long chain is the worst case for the number of hooking rounds
+        union_find = UnionFind(1000)
+        union_find.union_many([(i, i + 1) for i in range(999)])
+        self.assertEqual(len(union_find.components()), 1)
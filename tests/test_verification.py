@@ -0,0 +1,152 @@
+import os
+from unittest import TestCase
+
+import cv2
+import numpy as np
+
+from src import verification
+from src.duplicate_finder import ALL_PAIRS_GROUP_SIZE, HashDuplicateFinderController
+from src.image_table import ImageTable
+from src.verification import CandidateVerifier
+
+
+class TestVerification(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        noise = rng.integers(0, 256, size=(6, 64, 64), dtype=np.uint8)
+        self.thumbnails = np.stack([cv2.GaussianBlur(image, (5, 5), 2) for image in noise])
+
+
+class TestMetrics(TestVerification):
+    def reference_ssim(self, a, b):
+        a, b = a.astype(np.float32), b.astype(np.float32)
+
+        def blur(image):
+            return cv2.GaussianBlur(image, (7, 7), 1.5)
+
+        mu_a, mu_b = blur(a), blur(b)
+        var_a, var_b = blur(a * a) - mu_a * mu_a, blur(b * b) - mu_b * mu_b
+        covariance = blur(a * b) - mu_a * mu_b
+        c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+        return np.mean((2 * mu_a * mu_b + c1) * (2 * covariance + c2) /
+                       ((mu_a * mu_a + mu_b * mu_b + c1) * (var_a + var_b + c2)))
+
+    def test_ssim_matches_reference(self):
+        a, b = self.thumbnails[:3], self.thumbnails[3:]
+        expected = [self.reference_ssim(a[i], b[i]) for i in range(3)]
+        np.testing.assert_allclose(verification.ssim(a, b), expected, atol=1e-5)
+
+    def test_identical(self):
+        np.testing.assert_allclose(verification.ssim(self.thumbnails, self.thumbnails), 1, atol=1e-5)
+        np.testing.assert_allclose(verification.ncc(self.thumbnails, self.thumbnails), 1, atol=1e-5)
+
+    def test_ncc_ignores_brightness_and_contrast(self):
+        adjusted = cv2.convertScaleAbs(self.thumbnails, alpha=0.5, beta=60)
+        np.testing.assert_allclose(verification.ncc(self.thumbnails, adjusted), 1, atol=1e-2)
+
+    def test_unrelated_low(self):
+        self.assertTrue(np.all(verification.ssim(self.thumbnails[:3], self.thumbnails[3:]) < 0.5))
+        self.assertTrue(np.all(verification.ncc(self.thumbnails[:3], self.thumbnails[3:]) < 0.5))
+
+    def test_flat(self):
+        flat = np.full((2, 64, 64), 7, dtype=np.uint8)
+        other = np.stack([np.full((64, 64), 200, dtype=np.uint8), self.thumbnails[0]])
+        np.testing.assert_array_equal(verification.ncc(flat, other), [1, 0])
+
+
+class TestCandidateVerifier(TestVerification):
+    def verifier(self, **kwargs):
+        verifier = CandidateVerifier(**kwargs)
+        verifier.reset(len(self.thumbnails) + 1)
+        for image_id, thumbnail in enumerate(self.thumbnails):
+            verifier.add(image_id, thumbnail)
+        return verifier
+
+    def test_invalid(self):
+        self.assertRaises(ValueError, CandidateVerifier, metric='mse')
+        self.assertRaises(ValueError, CandidateVerifier, chunk_size=0)
+
+    def test_default_threshold(self):
+        self.assertEqual(CandidateVerifier('ncc').threshold, verification.DEFAULT_THRESHOLDS['ncc'])
+        self.assertEqual(CandidateVerifier('ncc', threshold=0.3).threshold, 0.3)
+
+    def test_verify(self):
+        verifier = self.verifier()
+        verifier.add(5, cv2.GaussianBlur(self.thumbnails[0], (3, 3), 1))
+        accepted = verifier.verify([0, 0, 1, 2], [5, 1, 2, 3])
+        self.assertEqual(accepted.tolist(), [True, False, False, False])
+        self.assertEqual(verifier.stats['candidates'], 4)
+        self.assertEqual(verifier.stats['rejected'], 3)
+        self.assertGreaterEqual(verifier.stats['seconds'], 0)
+
+    def test_missing_thumbnail_kept(self):
+        verifier = self.verifier()
+        self.assertEqual(verifier.verify([0], [6]).tolist(), [True])
+
+    def test_chunks_and_threads(self):
+        rng = np.random.default_rng(1)
+        ids_a, ids_b = rng.integers(0, 6, size=100), rng.integers(0, 6, size=100)
+        expected = self.verifier(num_threads=1, chunk_size=1000).scores(ids_a, ids_b)
+        np.testing.assert_allclose(self.verifier(num_threads=3, chunk_size=7).scores(ids_a, ids_b), expected)
+
+    def test_empty(self):
+        self.assertEqual(len(self.verifier().verify([], [])), 0)
+
+    def test_pool_reused_until_closed(self):
+        verifier = self.verifier(num_threads=2, chunk_size=1)
+        expected = verifier.scores([0, 1, 2], [1, 2, 3])
+        pool = verifier._pool
+        self.assertIsNotNone(pool)
+        np.testing.assert_allclose(verifier.scores([0, 1, 2], [1, 2, 3]), expected)
+        self.assertIs(verifier._pool, pool)
+
+        verifier.close()
+        self.assertIsNone(verifier._pool)
+        np.testing.assert_allclose(verifier.scores([0, 1, 2], [1, 2, 3]), expected)
+        verifier.close()
+
+    def test_reset(self):
+        verifier = self.verifier()
+        verifier.verify([0], [1])
+        verifier.reset(2)
+        self.assertEqual(verifier.stats['candidates'], 0)
+        self.assertFalse(verifier.has_thumbnail.any())
+
+    def test_spill(self):
+        expected = self.verifier().scores([0, 1, 2], [1, 2, 3])
+        verifier = self.verifier(ram_budget=64 * 64)
+        self.assertTrue(verifier.spilled)
+        spill_path = verifier._spill_path
+        np.testing.assert_allclose(verifier.scores([0, 1, 2], [1, 2, 3]), expected)
+
+        verifier.reset(1)
+        self.assertFalse(verifier.spilled)
+        self.assertFalse(os.path.exists(spill_path))
+
+
+class TestVerifyGroups(TestVerification):
+    def controller(self, thumbnails):
+        verifier = CandidateVerifier()
+        verifier.reset(len(thumbnails))
+        for image_id, thumbnail in enumerate(thumbnails):
+            verifier.add(image_id, thumbnail)
+        controller = HashDuplicateFinderController(verifier=verifier)
+        controller.image_table = ImageTable([f'{image_id}.jpg' for image_id in range(len(thumbnails))])
+        return controller
+
+    def test_small_group_all_pairs(self):
+        # 0 and 2 only match through each other's copies, every pair is checked
+        thumbnails = [self.thumbnails[1], self.thumbnails[0], self.thumbnails[1], self.thumbnails[0]]
+        controller = self.controller(thumbnails)
+        self.assertEqual(controller._verify_groups([[0, 1, 2, 3]]), [[0, 2], [1, 3]])
+        self.assertEqual(controller.verifier.stats['candidates'], 6)
+
+    def test_large_group_against_representatives(self):
+        blank = np.full((64, 64), 128, dtype=np.uint8)
+        size = 4 * ALL_PAIRS_GROUP_SIZE
+        thumbnails = [blank] * (size - 3) + [self.thumbnails[0], self.thumbnails[0], self.thumbnails[1]]
+        controller = self.controller(thumbnails)
+        groups = controller._verify_groups([list(range(size))])
+        self.assertEqual(sorted(groups), [list(range(size - 3)), [size - 3, size - 2]])
+        # One check per member, then the 3 the blank representative rejected among themselves
+        self.assertEqual(controller.verifier.stats['candidates'], size - 1 + 2)
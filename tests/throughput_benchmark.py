@@ -0,0 +1,246 @@
+import argparse
+import functools
+import json
+import os
+import platform
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+# Kivy parses sys.argv when src imports it, keep it away from the benchmark's own flags
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+
+from src import image_gradient, image_hashing, image_table
+from src.feature_store import FeatureStore
+from src.hash_grouping import HashGrouper
+from src.stoppable_pool import StoppablePool
+from tests import hamming_benchmark
+
+BENCHMARK_VERSION = 2  # Bumped whenever the meaning of a reported number changes
+DEFAULT_SCALES = (1_000, 10_000, 100_000)
+DEFAULT_POOL_SIZES = (1, 2, 4)
+PERCENTILES = (50, 90, 99)
+
+HASH_SIZE = 16
+VECTOR_SIZES = (8, 32)
+
+
+def synthetic_images(directory, count, rng, size=(320, 240)):
+    """
+    Writes smooth random color images, different enough that none of them are duplicates
+
+    Returns:
+        list of the paths of the images
+    """
+    paths = []
+    for i in range(count):
+        # A few random control points upscaled into gradients, with noise on top like a photo
+        image = cv2.resize(rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8), size,
+                           interpolation=cv2.INTER_CUBIC)
+        image = cv2.add(image, rng.integers(0, 16, size=image.shape, dtype=np.uint8))
+        path = os.path.join(directory, f'{i}.jpg')
+        cv2.imwrite(path, image)
+        paths.append(path)
+    return paths
+
+
+def _latencies(seconds):
+    """
+    Summarizes the time each image took in one stage
+
+    Args:
+        seconds: array of per image times
+
+    Returns:
+        dictionary of images per second and latency percentiles in milliseconds
+    """
+    seconds = np.asarray(seconds)
+    summary = {'images_per_second': len(seconds) / seconds.sum()}
+    for percentile, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = value * 1e3
+    summary['max_ms'] = seconds.max() * 1e3
+    return summary
+
+
+def benchmark_stages(paths):
+    """
+    Times every per image stage of a search separately, each stage is fed by the output of the previous one.
+    resize is the grayscale conversion and the area shrink shared by the hashes, hash computes every algorithm in
+    HASH_ALGORITHMS from the shrunk image (dhash from the grayscale image) so the shrink is only timed once
+
+    Returns:
+        dictionary of stage name to its _latencies
+    """
+    stages = ('read', 'decode', 'resize', 'hash', 'gradient')
+    times = {stage: np.zeros(len(paths)) for stage in stages}
+    for i, path in enumerate(paths):
+        start = time.perf_counter()
+        data = np.fromfile(path, dtype=np.uint8)
+        read = time.perf_counter()
+        image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        decoded = time.perf_counter()
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        small = image_hashing._shrink(gray, HASH_SIZE)
+        resized = time.perf_counter()
+        for algorithm, hash_function in image_hashing.HASH_ALGORITHMS.items():
+            hash_function(gray if algorithm == 'dhash' else small, HASH_SIZE)
+        hashed = time.perf_counter()
+        image_gradient._gray_gradient_vectors(gray, VECTOR_SIZES)
+        stop = time.perf_counter()
+
+        for stage, seconds in zip(stages, (read - start, decoded - read, resized - decoded, hashed - resized,
+                                           stop - hashed)):
+            times[stage][i] = seconds
+    return {stage: _latencies(seconds) for stage, seconds in times.items()}
+
+
+WORKER_FUNCTIONS = {
+    'hash': functools.partial(image_hashing.async_open_and_hashes, hash_size=HASH_SIZE),
+    'gradient': functools.partial(image_gradient.async_open_and_gradients, vector_sizes=VECTOR_SIZES),
+}
+
+
+def benchmark_pool(paths, backend, num_workers):
+    """
+    Runs the worker function of a search over every image with a StoppablePool the way the controllers do
+
+    Returns:
+        images per second
+    """
+    start = time.perf_counter()
+    pool = StoppablePool(fn=WORKER_FUNCTIONS[backend], args=[(image_id,) for image_id in range(len(paths))],
+                         num_workers=num_workers, initializer=image_table.init_worker, initargs=(paths,))
+    for _ in pool:
+        pass
+    return len(paths) / (time.perf_counter() - start)
+
+
+def benchmark_similarity(count, rng, dim=VECTOR_SIZES[0] ** 2, num_queries=1_000, threshold=0.9):
+    """
+    Compares num_queries random unit vectors against count of them with each FeatureStore backend
+
+    Returns:
+        dictionary of backend to pairs compared per second
+    """
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = np.arange(min(num_queries, count))
+
+    results = dict()
+    for backend, quantize in (('float32', False), ('int8', True)):
+        store = FeatureStore(dim, capacity=count, quantize=quantize)
+        for image_id, vector in enumerate(vectors):
+            store.add(image_id, vector)
+        start = time.perf_counter()
+        compared = sum(num_compared for _, _, num_compared in
+                       store.similar_pairs(threshold, rows=queries, other_rows=np.arange(count)))
+        results[backend] = compared / (time.perf_counter() - start)
+    return results
+
+
+def _dict_groups(hashes):
+    # The streaming backend of HashDuplicateFinderController
+    buckets = dict()
+    for image_id, hash_val in enumerate(hashes):
+        buckets.setdefault(hash_val, []).append(image_id)
+    return [group for group in buckets.values() if len(group) > 1]
+
+
+def _sort_groups(hashes):
+    grouper = HashGrouper(HASH_SIZE, capacity=len(hashes))
+    for image_id, hash_val in enumerate(hashes):
+        grouper.add(hash_val, image_id)
+    return grouper.groups()
+
+
+def benchmark_grouping(count, rng, duplicate_fraction=0.1):
+    """
+    Groups count random hashes, duplicate_fraction of which repeat an earlier hash, with each grouping backend
+
+    Returns:
+        dictionary of backend to seconds
+    """
+    hashes = [int(value) for value in rng.integers(0, 2 ** 63, size=count)]
+    for i in rng.choice(np.arange(1, count), int(count * duplicate_fraction), replace=False):
+        hashes[i] = hashes[rng.integers(0, i)]
+
+    results = dict()
+    for backend, fn in (('dict', _dict_groups), ('sort', _sort_groups)):
+        start = time.perf_counter()
+        fn(hashes)
+        results[backend] = time.perf_counter() - start
+    return results
+
+
+def machine_info():
+    """
+    Returns: dictionary describing the machine and library versions the benchmarks ran with
+    """
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'python': platform.python_version(), 'numpy': np.__version__, 'opencv': cv2.__version__}
+
+
+def run_suite(scales=DEFAULT_SCALES, pool_sizes=DEFAULT_POOL_SIZES, unique_images=1_000, stage_sample=2_000,
+              seed=0):
+    """
+    Runs every benchmark at every scale
+
+    A scale of n images cycles through unique_images synthetic images on disk so large scales do not need
+    gigabytes of files, every stage but read is the same work for a repeated file and reads hit the page cache
+    like the second search of a folder would.
+
+    Args:
+        scales: numbers of images to run at
+        pool_sizes: numbers of workers to run the pool benchmarks with
+        unique_images: number of distinct synthetic images written to disk
+        stage_sample: most images the per image stages are timed on at each scale
+        seed: seed of the synthetic data
+
+    Returns:
+        JSON serializable dictionary of the results
+    """
+    rng = np.random.default_rng(seed)
+    report = {
+        'version': BENCHMARK_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': machine_info(),
+        'scales': [],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        unique_paths = synthetic_images(directory, unique_images, rng)
+        for scale in scales:
+            paths = [unique_paths[i % len(unique_paths)] for i in range(scale)]
+            result = {'images': scale,
+                      'stages': benchmark_stages(paths[:stage_sample]),
+                      'pool': [{'backend': backend, 'workers': num_workers,
+                                'images_per_second': benchmark_pool(paths, backend, num_workers)}
+                               for backend in WORKER_FUNCTIONS for num_workers in pool_sizes],
+                      'similarity_pairs_per_second': benchmark_similarity(scale, rng),
+                      'grouping_seconds': benchmark_grouping(scale, rng)}
+            report['scales'].append(result)
+            print(f"{scale} images: " + ", ".join(f"{stage} {summary['images_per_second']:.0f}/s"
+                                                  for stage, summary in result['stages'].items()))
+
+    report['hamming'] = {
+        'popcount_words_per_second': hamming_benchmark.benchmark_popcount(HASH_SIZE),
+        'distance_pairs_per_second': hamming_benchmark.benchmark_distances(HASH_SIZE),
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures the throughput of each stage of a duplicate search")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES)
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=DEFAULT_POOL_SIZES)
+    parser.add_argument('--unique-images', type=int, default=1_000)
+    parser.add_argument('--stage-sample', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='throughput.json', help="path the JSON report is written to")
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.pool_sizes, args.unique_images, args.stage_sample, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
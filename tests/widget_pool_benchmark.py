@@ -0,0 +1,74 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Kivy parses sys.argv when it is imported, keep it away from the benchmark's own flags
+os.environ['KIVY_NO_ARGS'] = '1'
+
+from kivy.factory import Factory
+from kivy.lang import Builder
+
+from src.duplicate_manager import ImageGroupDataView
+from src.frame_monitor import FrameTimeMonitor
+
+KV_FILE = os.path.join(os.path.dirname(__file__), os.pardir, 'src', 'duplicateimage.kv')
+
+
+class ClearingImageGroupDataView(ImageGroupDataView):
+    """
+    The view before widget pooling, every refresh clears the view and builds new widgets
+    """
+    def _bind_widgets(self, items):
+        self.clear_widgets()
+        widget_type = Factory.get(self.widgetclass)
+        for i, kwargs in enumerate(items):
+            new_widget = widget_type(index=i, **kwargs)
+            self.add_widget(new_widget, index=i)
+            new_widget.apply_selection(i, i in self.selected_nodes[self.index])
+
+
+def _random_groups(num_groups, rng, min_size=2, max_size=8):
+    sizes = rng.integers(min_size, max_size + 1, size=num_groups)
+    return [{'group_id': group_id,
+             'data': [{'source': f'image_{group_id}_{i}.jpg', 'thumbnail': '', 'image_ratio': 1.5}
+                      for i in range(size)]}
+            for group_id, size in enumerate(sizes)]
+
+
+def benchmark_scroll(view_class, groups, num_views=6, rows_per_frame=2):
+    """
+    Simulates scrolling through every group the way the RecycleView recycles rows, each frame rebinds
+    rows_per_frame views to the next groups and lays them out
+
+    Returns:
+        FrameTimeMonitor with the time of each simulated frame
+    """
+    views = [view_class() for _ in range(num_views)]
+    monitor = FrameTimeMonitor(name=view_class.__name__)
+    for start in range(0, len(groups), rows_per_frame):
+        frame_start = time.perf_counter()
+        for index in range(start, min(start + rows_per_frame, len(groups))):
+            view = views[index % num_views]
+            view.refresh_view_attrs(None, index, groups[index])
+            view.do_layout()
+        monitor.record(time.perf_counter() - frame_start)
+    return monitor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compares scrolling with and without pooled image widgets")
+    parser.add_argument('--groups', type=int, default=10_000, help="number of groups scrolled through")
+    parser.add_argument('--views', type=int, default=6, help="number of row views the groups are recycled through")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    Builder.load_file(KV_FILE)
+    groups = _random_groups(args.groups, np.random.default_rng(args.seed))
+    for view_class in (ClearingImageGroupDataView, ImageGroupDataView):
+        start = time.perf_counter()
+        monitor = benchmark_scroll(view_class, groups, num_views=args.views)
+        seconds = time.perf_counter() - start
+        print(monitor.summary())
+        print(f"{view_class.__name__}: {len(groups) / seconds:.0f} rows/s")